@@ -0,0 +1,215 @@
+"""
+Benchmark de registro de ventas con el motor sin interfaz (servicios/ventas.py).
+
+Crea una base temporal a partir de data/estructura.sql (más las
+migraciones), genera un catálogo y carritos sintéticos y registra las
+ventas con varias terminales simuladas (hilos). Reporta ventas por segundo
+y la latencia p50/p99 de cada registro (armado de la transacción + commit).
+
+Modos:
+    directo   cada terminal escribe en el archivo con ejecutar_transaccion
+    servidor  las terminales envían las ventas al servicio local
+              (servicios/servidor.py), que las confirma con group commit
+
+Uso:
+    python -m benchmarks.bench_ventas
+    python -m benchmarks.bench_ventas --ventas 5000 --terminales 1,4,16 --modo servidor
+"""
+
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from db import db
+from db.migraciones import aplicar_migraciones
+from servicios.cliente import ClienteServidor
+from servicios.servidor import ServidorVentas
+from servicios.ventas import CarritoVenta, MotorVentas
+
+ESTRUCTURA = Path(__file__).parent.parent / "data" / "estructura.sql"
+
+# Stock inicial de cada producto: suficiente para que ninguna venta falle
+STOCK_INICIAL = 10 ** 9
+
+
+def crear_base(ruta, productos, rng):
+    """
+    Crea una base con el esquema actual y un catálogo sintético.
+
+    Returns:
+        list: Filas del catálogo con el formato de la lista del punto de
+            venta (id_producto, nombre, precio, codigo_barras, sku, stock)
+    """
+    conn = sqlite3.connect(ruta)
+    conn.executescript(ESTRUCTURA.read_text(encoding="utf-8"))
+    conn.close()
+
+    db.DB_PATH = ruta
+    db.cerrar_conexiones()
+    aplicar_migraciones()
+
+    catalogo = [
+        (i, f"Producto {i:05d}", round(rng.uniform(5, 2000), 2),
+         f"750{i:010d}", f"SKU-{i:05d}", STOCK_INICIAL)
+        for i in range(1, productos + 1)
+    ]
+    db.ejecutar_transaccion([
+        ("INSERT INTO Medios_pago (clave_sat, nombre) VALUES (?, ?)", ("01", "Efectivo")),
+        ("INSERT INTO Categorias (nombre) VALUES (?)", ("Sintética",)),
+        db.Lote(
+            """
+            INSERT INTO Productos (
+                id_producto, nombre, precio_venta, costo, codigo_barras, sku,
+                stock_actual, id_categoria, fecha_creacion, estado
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, 1, datetime('now'), 1)
+            """,
+            [(i, nombre, precio, precio * 0.6, codigo, sku, stock)
+             for i, nombre, precio, codigo, sku, stock in catalogo]
+        ),
+    ])
+    return catalogo
+
+
+def generar_carritos(catalogo, ventas, max_articulos, rng):
+    """Carritos con 1..max_articulos productos y descuentos ocasionales"""
+    carritos = []
+    for _ in range(ventas):
+        carrito = CarritoVenta()
+        for producto in rng.sample(catalogo, rng.randint(1, max_articulos)):
+            carrito.agregar(producto, rng.randint(1, 5))
+            if rng.random() < 0.1:
+                carrito.aplicar_descuento(rng.choice((5, 10, 15)), producto[0])
+        if rng.random() < 0.2:
+            carrito.aplicar_descuento(rng.choice((5, 10)))
+        carritos.append(carrito)
+    return carritos
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) de una lista ordenada"""
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, round(p / 100 * (len(valores) - 1)))]
+
+
+def correr(motor, carritos, terminales):
+    """
+    Registra los carritos repartidos entre varias terminales.
+
+    Returns:
+        dict: ventas, errores, segundos, ventas_por_segundo, p50_ms, p99_ms
+    """
+    latencias = []
+    errores = []
+    candado = threading.Lock()
+
+    def terminal(propios):
+        medidas = []
+        for carrito in propios:
+            inicio = time.perf_counter()
+            try:
+                motor.registrar(carrito, id_medio_pago=1)
+            except Exception as e:
+                with candado:
+                    errores.append(e)
+                continue
+            medidas.append(time.perf_counter() - inicio)
+        with candado:
+            latencias.extend(medidas)
+
+    hilos = [
+        threading.Thread(target=terminal, args=(carritos[i::terminales],))
+        for i in range(terminales)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'ventas': len(latencias),
+        'errores': len(errores),
+        'segundos': segundos,
+        'ventas_por_segundo': len(latencias) / segundos if segundos else 0.0,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+    }
+
+
+class _ServidorEnHilo:
+    """Servicio local en un hilo propio (puerto libre en 127.0.0.1)"""
+
+    def __init__(self):
+        self.servidor = ServidorVentas(puerto=0)
+        self._loop = asyncio.new_event_loop()
+        listo = threading.Event()
+
+        def ejecutar():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.servidor.iniciar())
+            listo.set()
+            self._loop.run_forever()
+
+        self._hilo = threading.Thread(target=ejecutar, daemon=True)
+        self._hilo.start()
+        listo.wait()
+
+    @property
+    def direccion(self):
+        return f"127.0.0.1:{self.servidor.puerto}"
+
+    def detener(self):
+        asyncio.run_coroutine_threadsafe(self.servidor.detener(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._hilo.join()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark de registro de ventas")
+    parser.add_argument("--productos", type=int, default=2000, help="Tamaño del catálogo")
+    parser.add_argument("--ventas", type=int, default=2000, help="Ventas por corrida")
+    parser.add_argument("--articulos", type=int, default=8, help="Máximo de productos por venta")
+    parser.add_argument("--terminales", default="1,4,8",
+                        help="Terminales simultáneas, separadas por comas")
+    parser.add_argument("--modo", choices=("directo", "servidor", "ambos"), default="ambos")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args(argumentos)
+
+    rng = random.Random(args.semilla)
+    terminales = [int(t) for t in args.terminales.split(",") if t.strip()]
+    modos = ("directo", "servidor") if args.modo == "ambos" else (args.modo,)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        inicio = time.perf_counter()
+        catalogo = crear_base(Path(directorio) / "bench.db", args.productos, rng)
+        carritos = generar_carritos(catalogo, args.ventas, args.articulos, rng)
+        print(f"Catálogo: {len(catalogo)} productos, {len(carritos)} carritos "
+              f"({time.perf_counter() - inicio:.1f} s de preparación)")
+        print(f"{'modo':<10}{'terminales':>11}{'ventas/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'errores':>9}")
+
+        try:
+            for modo in modos:
+                servidor = _ServidorEnHilo() if modo == "servidor" else None
+                motor = MotorVentas(ClienteServidor(servidor.direccion).enviar) if servidor else MotorVentas()
+                try:
+                    for cantidad in terminales:
+                        r = correr(motor, carritos, cantidad)
+                        print(f"{modo:<10}{cantidad:>11}{r['ventas_por_segundo']:>11.0f}"
+                              f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['errores']:>9}")
+                finally:
+                    if servidor:
+                        servidor.detener()
+        finally:
+            db.cerrar_conexiones()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
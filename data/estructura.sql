@@ -1,3 +1,6 @@
+-- Esquema base (versión 0). Los índices y cambios posteriores se aplican
+-- al iniciar la aplicación mediante las migraciones de db/migraciones.py
+
 -- Tabla Categorias
 CREATE TABLE Categorias (
     id_categoria INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -0,0 +1,123 @@
+"""
+Búsqueda de productos con el índice de texto completo (FTS5).
+
+La tabla virtual Productos_fts (migración 4) indexa nombre, descripción,
+SKU y código de barras de Productos y se mantiene al día con triggers. El
+tokenizador ignora mayúsculas y acentos ("cafe" encuentra "Café") y cada
+palabra capturada se busca como prefijo de palabra ("caf 50" encuentra
+"Café soluble 500 g"); todas las palabras deben aparecer.
+
+Un texto sólo de dígitos también coincide con el id del producto.
+
+Ejemplo:
+    productos = buscar_productos("cafe 500", "p.id_producto, p.nombre",
+                                 condiciones=[("p.estado = ?", (1,))])
+"""
+
+import re
+from db.db import obtener_datos
+
+# Máximo de resultados de una búsqueda
+MAX_RESULTADOS = 100
+
+# Pesos de bm25 por columna de Productos_fts (nombre, descripcion, sku,
+# codigo_barras): una coincidencia en el nombre o en un código pesa más
+# que una en la descripción
+PESOS_BM25 = (10.0, 1.0, 5.0, 5.0)
+
+# Palabras tal como las separa el tokenizador unicode61 (letras y dígitos)
+_PALABRA = re.compile(r"[^\W_]+")
+
+
+def expresion_fts(texto):
+    """
+    Expresión MATCH de FTS5 para un texto capturado por el usuario.
+
+    Cada palabra va entre comillas (no se interpretan operadores de FTS5)
+    y con * para buscarla como prefijo.
+
+    Returns:
+        str: Expresión, o None si el texto no tiene palabras
+    """
+    palabras = _PALABRA.findall(texto or "")
+    return " ".join(f'"{p}"*' for p in palabras) or None
+
+
+def filtro_productos(texto, id_producto="p.id_producto"):
+    """
+    Condición SQL (condicion, parametros) de los productos que coinciden
+    con el texto, para combinar con otros filtros (p. ej. en
+    ConsultaPaginada). No ordena por relevancia.
+
+    Args:
+        texto (str): Texto de búsqueda
+        id_producto (str): Columna del id de producto en la consulta
+
+    Returns:
+        tuple: (condicion_sql, parametros); None si el texto está vacío
+    """
+    texto = (texto or "").strip()
+    expresion = expresion_fts(texto)
+    if expresion is None:
+        return None
+    condicion = f"{id_producto} IN (SELECT rowid FROM Productos_fts WHERE Productos_fts MATCH ?)"
+    parametros = (expresion,)
+    if texto.isdigit():
+        condicion += f" OR {id_producto} = ?"
+        parametros += (int(texto),)
+    return condicion, parametros
+
+
+def buscar_productos(texto, columnas, condiciones=(), limite=None):
+    """
+    Productos que coinciden con el texto, los más relevantes primero (bm25).
+
+    Sin texto devuelve los primeros productos por nombre. El producto cuyo
+    id es igual al texto (si lo hay) va al inicio.
+
+    Args:
+        texto (str): Texto de búsqueda
+        columnas (str): Columnas del SELECT sobre Productos p
+        condiciones (list): Tuplas (condicion_sql, parametros) adicionales
+            sobre p, unidas con AND
+        limite (int): Máximo de resultados (MAX_RESULTADOS por defecto)
+
+    Returns:
+        list: Filas con las columnas pedidas
+    """
+    limite = limite or MAX_RESULTADOS
+    texto = (texto or "").strip()
+    where = " AND ".join(f"({c})" for c, _ in condiciones)
+    parametros = tuple(p for _, params in condiciones for p in params)
+
+    expresion = expresion_fts(texto)
+    if expresion is None:
+        return obtener_datos(
+            f"SELECT {columnas} FROM Productos p {'WHERE ' + where if where else ''} "
+            f"ORDER BY p.nombre COLLATE NOCASE, p.id_producto LIMIT ?",
+            parametros + (limite,)
+        )
+
+    resultados = []
+    if texto.isdigit():
+        resultados = obtener_datos(
+            f"SELECT {columnas} FROM Productos p WHERE p.id_producto = ? "
+            f"{'AND ' + where if where else ''}",
+            (int(texto),) + parametros
+        )
+    pesos = ", ".join(str(p) for p in PESOS_BM25)
+    resultados += obtener_datos(
+        f"""
+        SELECT {columnas}
+        FROM Productos_fts
+        JOIN Productos p ON p.id_producto = Productos_fts.rowid
+        WHERE Productos_fts MATCH ? {'AND ' + where if where else ''}
+        {'AND p.id_producto <> ?' if resultados else ''}
+        ORDER BY bm25(Productos_fts, {pesos})
+        LIMIT ?
+        """,
+        (expresion,) + parametros
+        + ((int(texto),) if resultados else ()) + (limite - len(resultados),)
+    )
+    return resultados
+
@@ -0,0 +1,150 @@
+"""
+Caché de resultados para consultas de datos de referencia.
+
+Cada tabla tiene una "generación" que aumenta cada vez que se escribe en
+ella a través de ejecutar_query / ejecutar_transaccion. Un resultado guardado
+recuerda la generación de las tablas que leyó; si alguna cambió, la entrada
+deja de ser válida. Así, catálogos como Categorias o Medios_pago se
+consultan una sola vez mientras nadie los modifique.
+
+Las escrituras hechas desde otras terminales no pasan por este proceso, por
+lo que además cada entrada vence a los TTL_CACHE_SEGUNDOS.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Máximo de resultados distintos en caché (se descarta el menos usado)
+TAMANO_CACHE = 256
+
+# Vigencia máxima de una entrada; acota lo desactualizado frente a otras terminales
+TTL_CACHE_SEGUNDOS = 300
+
+_RE_TABLAS_LECTURA = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)", re.I)
+_RE_TABLA_ESCRITURA = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)"
+    r"\s+([A-Za-z_]\w*)",
+    re.I
+)
+
+
+def tablas_leidas(query):
+    """Devuelve las tablas mencionadas en FROM/JOIN de una consulta"""
+    return frozenset(t.lower() for t in _RE_TABLAS_LECTURA.findall(query))
+
+
+def tabla_escrita(query):
+    """Devuelve la tabla que modifica una sentencia INSERT/UPDATE/DELETE (o None)"""
+    coincidencia = _RE_TABLA_ESCRITURA.match(query)
+    return coincidencia.group(1).lower() if coincidencia else None
+
+
+class CacheConsultas:
+    """
+    Caché LRU de resultados invalidada por generación de tabla.
+
+    Atributos:
+        tamano (int): Máximo de entradas
+        ttl (float): Segundos de vigencia de cada entrada
+    """
+
+    def __init__(self, tamano=None, ttl=None):
+        self.tamano = tamano or TAMANO_CACHE
+        self.ttl = TTL_CACHE_SEGUNDOS if ttl is None else ttl
+        self._entradas = OrderedDict()
+        self._generaciones = {}
+        self._candado = threading.Lock()
+        self._stats = {'aciertos': 0, 'fallos': 0, 'invalidadas': 0, 'expulsadas': 0}
+
+    @staticmethod
+    def _clave(query, parameters):
+        return (query, tuple(parameters) if parameters else ())
+
+    def generaciones(self, tablas):
+        """Fotografía de la generación actual de varias tablas"""
+        with self._candado:
+            return tuple(self._generaciones.get(t, 0) for t in sorted(tablas))
+
+    def obtener(self, query, parameters=()):
+        """
+        Busca un resultado vigente.
+
+        Returns:
+            list | None: Copia de las filas en caché (el llamador puede
+                modificarla), o None si no hay una entrada válida
+        """
+        clave = self._clave(query, parameters)
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._stats['fallos'] += 1
+                return None
+
+            filas, tablas, generaciones, instante = entrada
+            actuales = tuple(self._generaciones.get(t, 0) for t in sorted(tablas))
+            if actuales != generaciones or time.monotonic() - instante > self.ttl:
+                del self._entradas[clave]
+                self._stats['invalidadas'] += 1
+                self._stats['fallos'] += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self._stats['aciertos'] += 1
+            return list(filas)
+
+    def guardar(self, query, parameters, filas, generaciones=None):
+        """
+        Guarda un resultado.
+
+        Args:
+            query (str): Consulta SELECT
+            parameters (tuple): Parámetros de la consulta
+            filas (list): Resultado de la consulta
+            generaciones (tuple): Generaciones tomadas ANTES de ejecutar la
+                consulta; si una escritura ocurrió mientras tanto la entrada
+                nace invalidada
+        """
+        tablas = tablas_leidas(query)
+        if generaciones is None:
+            generaciones = self.generaciones(tablas)
+        clave = self._clave(query, parameters)
+        with self._candado:
+            # Copia: la lista original se entrega al llamador
+            self._entradas[clave] = (list(filas), tablas, generaciones, time.monotonic())
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano:
+                self._entradas.popitem(last=False)
+                self._stats['expulsadas'] += 1
+
+    def registrar_escritura(self, query):
+        """Aumenta la generación de la tabla que modifica la sentencia"""
+        tabla = tabla_escrita(query)
+        if tabla:
+            self.invalidar_tabla(tabla)
+
+    def invalidar_tabla(self, tabla):
+        with self._candado:
+            tabla = tabla.lower()
+            self._generaciones[tabla] = self._generaciones.get(tabla, 0) + 1
+
+    def limpiar(self):
+        """Descarta todas las entradas"""
+        with self._candado:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: aciertos, fallos, invalidadas, expulsadas, entradas y tasa_aciertos
+        """
+        with self._candado:
+            stats = dict(self._stats)
+            stats['entradas'] = len(self._entradas)
+        total = stats['aciertos'] + stats['fallos']
+        stats['tasa_aciertos'] = round(stats['aciertos'] / total, 3) if total else 0.0
+        return stats
+
+
+cache = CacheConsultas()
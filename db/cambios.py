@@ -0,0 +1,84 @@
+"""
+Registro de cambios de productos para refrescar pantallas por diferencias.
+
+Triggers sobre Productos (migración 5) anotan en Cambios_productos cada
+alta, baja y modificación con un id creciente. Una pantalla guarda el
+último id que leyó y, en lugar de recargar el catálogo, pide sólo los
+productos que cambiaron después de ese id.
+
+Tipos de cambio:
+    alta   producto nuevo
+    baja   producto eliminado
+    stock  UPDATE de stock_actual (ventas, movimientos)
+    datos  UPDATE de cualquier otra columna
+
+Ejemplo:
+    ultimo = ultimo_cambio()             # antes de leer los datos
+    ...
+    ultimo, cambios = cambios_desde(ultimo)
+    if cambios is None:
+        ...                              # demasiados cambios: recargar
+"""
+
+from db.db import ejecutar_transaccion, obtener_datos
+
+# Cambios que se conservan al depurar el registro
+MAX_CAMBIOS = 100000
+
+# Máximo de cambios que devuelve cambios_desde antes de sugerir recargar
+MAX_CAMBIOS_POR_CONSULTA = 1000
+
+
+def ultimo_cambio():
+    """
+    Returns:
+        int: id del último cambio registrado (0 si no hay)
+    """
+    return obtener_datos("SELECT COALESCE(MAX(id_cambio), 0) FROM Cambios_productos")[0][0]
+
+
+def cambios_desde(id_cambio, limite=MAX_CAMBIOS_POR_CONSULTA):
+    """
+    Productos que cambiaron después de un id de cambio.
+
+    Args:
+        id_cambio (int): Último cambio que ya se aplicó
+        limite (int): Máximo de cambios a leer
+
+    Returns:
+        tuple: (ultimo, cambios) donde ultimo es el id hasta el que se leyó y
+            cambios un dict id_producto -> set de tipos. cambios es None si
+            hay más de `limite` cambios o si parte de ellos ya se depuró;
+            en ese caso hay que recargar todo y ultimo es el último cambio
+            registrado.
+    """
+    filas = obtener_datos(
+        "SELECT id_cambio, id_producto, tipo FROM Cambios_productos "
+        "WHERE id_cambio > ? ORDER BY id_cambio LIMIT ?",
+        (id_cambio, limite + 1)
+    )
+    if not filas:
+        return id_cambio, {}
+    # Un hueco antes del primer cambio leído significa que depurar_cambios
+    # ya borró cambios que esta pantalla no vio
+    if len(filas) > limite or filas[0][0] > id_cambio + 1:
+        return ultimo_cambio(), None
+
+    cambios = {}
+    for _, id_producto, tipo in filas:
+        cambios.setdefault(id_producto, set()).add(tipo)
+    return filas[-1][0], cambios
+
+
+def depurar_cambios(conservar=MAX_CAMBIOS):
+    """
+    Borra los cambios más antiguos y conserva los últimos `conservar`.
+
+    Una pantalla que quedó atrás de lo depurado recibe cambios=None de
+    cambios_desde y recarga.
+    """
+    ejecutar_transaccion([(
+        "DELETE FROM Cambios_productos WHERE id_cambio <= "
+        "(SELECT MAX(id_cambio) FROM Cambios_productos) - ?",
+        (conservar,)
+    )])
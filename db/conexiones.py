@@ -0,0 +1,182 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones SQLite reutilizables.
+
+    Cada conexión se abre una sola vez (pagando la configuración de PRAGMAs
+    en ese momento) y se devuelve al pool al terminar de usarse. Dentro de un
+    mismo hilo las llamadas anidadas comparten la conexión que ya tiene
+    prestada, de modo que una consulta ejecutada mientras otra está en curso
+    no abre una conexión adicional.
+
+    Atributos:
+        ruta (Path): Ruta del archivo de base de datos
+        tamano (int): Máximo de conexiones abiertas simultáneamente
+        pragmas (dict): PRAGMAs aplicados al abrir cada conexión
+        timeout (float): Segundos de espera cuando el pool está agotado
+    """
+
+    def __init__(self, ruta, tamano=4, pragmas=None, timeout=10.0):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.pragmas = dict(pragmas or {})
+        self.timeout = timeout
+
+        self._inactivas = []          # Pila LIFO: la conexión más reciente sigue "caliente"
+        self._abiertas = 0
+        self._cerrado = False
+        self._condicion = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            'creadas': 0,
+            'reutilizadas': 0,
+            'reentradas': 0,
+            'esperas': 0,
+            'cerradas': 0,
+        }
+
+    def _abrir(self):
+        """Abre una conexión nueva y aplica los PRAGMAs configurados"""
+        conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for nombre, valor in self.pragmas.items():
+            conn.execute(f"PRAGMA {nombre} = {valor}")
+        return conn
+
+    def tomar(self):
+        """
+        Obtiene una conexión del pool (o abre una nueva si hay cupo).
+
+        Returns:
+            sqlite3.Connection: Conexión lista para usarse
+
+        Raises:
+            RuntimeError: Si el pool está cerrado o no se liberó una
+                conexión dentro del tiempo de espera
+        """
+        with self._condicion:
+            while True:
+                if self._cerrado:
+                    raise RuntimeError("El pool de conexiones está cerrado")
+                if self._inactivas:
+                    self._stats['reutilizadas'] += 1
+                    return self._inactivas.pop()
+                if self._abiertas < self.tamano:
+                    self._abiertas += 1
+                    break
+                self._stats['esperas'] += 1
+                if not self._condicion.wait(self.timeout):
+                    raise RuntimeError(
+                        f"No hay conexiones disponibles (tamaño del pool: {self.tamano})"
+                    )
+
+        # Abrir fuera del candado para no bloquear a otros hilos
+        try:
+            conn = self._abrir()
+        except Exception:
+            with self._condicion:
+                self._abiertas -= 1
+                self._condicion.notify()
+            raise
+        with self._condicion:
+            self._stats['creadas'] += 1
+        return conn
+
+    def devolver(self, conn):
+        """
+        Regresa una conexión al pool. Si quedó una transacción abierta se
+        revierte para no contaminar al siguiente usuario.
+
+        Args:
+            conn (sqlite3.Connection): Conexión obtenida con tomar()
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._descartar(conn)
+            return
+
+        with self._condicion:
+            if self._cerrado:
+                self._descartar(conn, notificar=False)
+            else:
+                self._inactivas.append(conn)
+            self._condicion.notify()
+
+    def _descartar(self, conn, notificar=True):
+        """Cierra una conexión y libera su lugar en el pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._condicion:
+            self._abiertas -= 1
+            self._stats['cerradas'] += 1
+            if notificar:
+                self._condicion.notify()
+
+    @contextmanager
+    def conexion(self):
+        """
+        Presta una conexión durante el bloque ``with``.
+
+        Si el hilo actual ya tiene una conexión prestada se reutiliza la
+        misma; sólo la llamada más externa la devuelve al pool.
+
+        Ejemplo:
+            with pool.conexion() as conn:
+                conn.execute("SELECT 1")
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.profundidad += 1
+            with self._condicion:
+                self._stats['reentradas'] += 1
+            try:
+                yield conn
+            finally:
+                self._local.profundidad -= 1
+            return
+
+        conn = self.tomar()
+        self._local.conn = conn
+        self._local.profundidad = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.profundidad = 0
+            self.devolver(conn)
+
+    def cerrar(self):
+        """Cierra todas las conexiones inactivas y rechaza nuevos préstamos"""
+        with self._condicion:
+            self._cerrado = True
+            inactivas, self._inactivas = self._inactivas, []
+        for conn in inactivas:
+            self._descartar(conn, notificar=False)
+        with self._condicion:
+            self._condicion.notify_all()
+
+    def estadisticas(self):
+        """
+        Devuelve contadores de uso del pool.
+
+        Returns:
+            dict: creadas, reutilizadas, reentradas, esperas, cerradas,
+                abiertas, inactivas, en_uso y tamano
+        """
+        with self._condicion:
+            stats = dict(self._stats)
+            stats.update({
+                'abiertas': self._abiertas,
+                'inactivas': len(self._inactivas),
+                'en_uso': self._abiertas - len(self._inactivas),
+                'tamano': self.tamano,
+            })
+        return stats
@@ -1,61 +1,652 @@
+import os
+import random
+import re
+import shutil
 import sqlite3
+import threading
+import time
 from pathlib import Path
+from db.conexiones import PoolConexiones
+from db import instrumentacion
+from db.cache import cache, tablas_leidas
 
-DB_PATH = Path(__file__).parent.parent / "data" / "ventas.db"
+# Base inicial versionada en el repositorio; nunca se abre directamente
+BASE_INICIAL = Path(__file__).parent.parent / "data" / "ventas.db"
+
+# Base de trabajo: una copia local de BASE_INICIAL (ignorada por git) que se
+# crea en el primer uso. VENTAS_DB permite usar otro archivo, p. ej. el que
+# comparten varias terminales
+DB_PATH = Path(os.environ.get("VENTAS_DB") or BASE_INICIAL.with_name("ventas_local.db"))
+
+# Conexiones que se mantienen abiertas entre consultas
+TAMANO_POOL = 4
+
+# PRAGMAs que se aplican una sola vez al abrir cada conexión del pool
+PRAGMAS_CONEXION = {
+    'temp_store': 'MEMORY',
+    'cache_size': -8000,  # ~8 MB de caché de páginas por conexión
+}
+
+# Filas por lote para las consultas de iterar_datos
+TAMANO_LOTE = 500
+
+# Modo de almacenamiento:
+#   "wal"      -> varias terminales sobre el mismo archivo; los lectores no
+#                 bloquean al escritor ni viceversa
+#   "rollback" -> journal clásico de SQLite (una sola terminal)
+MODO_ALMACENAMIENTO = "wal"
+
+# Tiempo que SQLite espera un candado antes de reportar "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+PERFILES_ALMACENAMIENTO = {
+    'wal': {
+        'busy_timeout': BUSY_TIMEOUT_MS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'wal_autocheckpoint': 1000,          # Páginas antes del checkpoint automático
+        'journal_size_limit': 64 * 1024 * 1024,  # Trunca el WAL tras cada checkpoint
+    },
+    'rollback': {
+        'busy_timeout': BUSY_TIMEOUT_MS,
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+    },
+}
+
+# Reintentos de escritura cuando otra terminal mantiene el candado
+REINTENTOS_BLOQUEO = 5
+ESPERA_INICIAL_REINTENTO = 0.05  # Segundos; se duplica en cada intento
+
+# Checkpoint PASSIVE explícito cada N commits (además del automático)
+CHECKPOINT_CADA_COMMITS = 200
+
+_pool = None
+_commits_desde_checkpoint = 0
+_candado_checkpoint = threading.Lock()
+
+def preparar_base():
+    """
+    Crea la base de trabajo copiando BASE_INICIAL si todavía no existe.
+
+    Las migraciones y el modo WAL modifican el archivo, así que nunca se
+    aplican sobre la base versionada.
+
+    Raises:
+        ValueError: Si DB_PATH apunta a BASE_INICIAL
+    """
+    ruta = Path(DB_PATH)
+    if ruta.resolve() == BASE_INICIAL.resolve():
+        raise ValueError(f"{BASE_INICIAL} es la base inicial versionada; use una copia local")
+    if not ruta.exists():
+        # Copia a un temporal y lo enlaza con el nombre final: otra terminal
+        # que arranque al mismo tiempo nunca ve un archivo a medias ni
+        # reemplaza una copia que ya está en uso
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        shutil.copyfile(BASE_INICIAL, temporal)
+        try:
+            os.link(temporal, ruta)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporal)
+
+def obtener_pool():
+    """Devuelve el pool de conexiones, creándolo en el primer uso"""
+    global _pool
+    if _pool is None:
+        preparar_base()
+        pragmas = dict(PERFILES_ALMACENAMIENTO[MODO_ALMACENAMIENTO])
+        pragmas.update(PRAGMAS_CONEXION)
+        _pool = PoolConexiones(DB_PATH, tamano=TAMANO_POOL, pragmas=pragmas)
+    return _pool
+
+def configurar_almacenamiento(modo):
+    """
+    Cambia el modo de almacenamiento y reabre las conexiones.
+
+    Args:
+        modo (str): "wal" para varias terminales o "rollback"
+    """
+    global MODO_ALMACENAMIENTO
+    if modo not in PERFILES_ALMACENAMIENTO:
+        raise ValueError(f"Modo de almacenamiento desconocido: {modo}")
+    MODO_ALMACENAMIENTO = modo
+    cerrar_conexiones()
+
+def configurar_pool(tamano=None, pragmas=None):
+    """
+    Reconfigura el pool de conexiones cerrando las conexiones actuales.
+
+    Args:
+        tamano (int): Número máximo de conexiones abiertas
+        pragmas (dict): PRAGMAs a aplicar en cada conexión nueva
+    """
+    global TAMANO_POOL, PRAGMAS_CONEXION
+    if tamano is not None:
+        TAMANO_POOL = tamano
+    if pragmas is not None:
+        PRAGMAS_CONEXION = dict(pragmas)
+    cerrar_conexiones()
+
+def cerrar_conexiones():
+    """Cierra todas las conexiones del pool (usar al salir de la aplicación)"""
+    global _pool
+    if _pool is not None:
+        if MODO_ALMACENAMIENTO == "wal":
+            try:
+                checkpoint("TRUNCATE")
+            except sqlite3.Error:
+                pass  # Otra terminal sigue leyendo; el WAL se truncará después
+        _pool.cerrar()
+        _pool = None
+
+def checkpoint(modo="PASSIVE"):
+    """
+    Vuelca el WAL al archivo principal de la base de datos.
+
+    Args:
+        modo (str): PASSIVE (no bloquea), FULL, RESTART o TRUNCATE
+
+    Returns:
+        tuple: (ocupado, paginas_wal, paginas_copiadas) según SQLite
+    """
+    global _commits_desde_checkpoint
+    with obtener_pool().conexion() as conn:
+        resultado = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+    with _candado_checkpoint:
+        _commits_desde_checkpoint = 0
+    return tuple(resultado)
+
+def _registrar_commit():
+    """Aplica la política de checkpoint tras cada escritura confirmada"""
+    global _commits_desde_checkpoint
+    if MODO_ALMACENAMIENTO != "wal":
+        return
+    with _candado_checkpoint:
+        _commits_desde_checkpoint += 1
+        pendiente = _commits_desde_checkpoint >= CHECKPOINT_CADA_COMMITS
+    if pendiente:
+        try:
+            checkpoint("PASSIVE")
+        except sqlite3.Error:
+            pass  # Se reintentará en el siguiente ciclo
+
+def _es_bloqueo(error):
+    """Indica si un error de SQLite se debe a un candado de otra conexión"""
+    mensaje = str(error).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+def _con_reintentos(operacion):
+    """
+    Ejecuta una operación de escritura reintentando con espera exponencial
+    mientras la base de datos esté bloqueada por otra terminal.
+    """
+    espera = ESPERA_INICIAL_REINTENTO
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        try:
+            resultado = operacion()
+        except sqlite3.OperationalError as e:
+            if not _es_bloqueo(e) or intento == REINTENTOS_BLOQUEO:
+                raise
+            time.sleep(espera + random.uniform(0, espera))
+            espera *= 2
+        else:
+            _registrar_commit()
+            return resultado
+
+def estadisticas_pool():
+    """Devuelve los contadores de uso del pool de conexiones"""
+    return obtener_pool().estadisticas()
 
 def connect_db():
-    """Establece conexión con la base de datos"""
+    """
+    Establece una conexión independiente con la base de datos.
+
+    La conexión no pertenece al pool: quien la abre debe cerrarla.
+    """
+    preparar_base()
     conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row 
+    conn.row_factory = sqlite3.Row
     return conn
 
 def ejecutar_query(query, parameters=()):
     """Ejecuta una query de modificación"""
-    with connect_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, parameters)
-        conn.commit()
-        return cursor.lastrowid
+    def operacion():
+        with obtener_pool().conexion() as conn:
+            try:
+                inicio = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.execute(query, parameters)
+                conn.commit()
+                cache.registrar_escritura(query)
+                if instrumentacion.INSTRUMENTACION_ACTIVA:
+                    instrumentacion.registrar_consulta(query, parameters, cursor.rowcount, inicio)
+                return cursor.lastrowid
+            except Exception:
+                conn.rollback()
+                raise
+
+    return _con_reintentos(operacion)
 
 def obtener_datos(query, parameters=()):
     """Obtiene resultados de una consulta SELECT"""
-    with connect_db() as conn:
+    with obtener_pool().conexion() as conn:
+        inicio = time.perf_counter()
         cursor = conn.cursor()
         cursor.execute(query, parameters)
-        return cursor.fetchall()
+        filas = cursor.fetchall()
+        if instrumentacion.INSTRUMENTACION_ACTIVA:
+            instrumentacion.registrar_consulta(query, parameters, len(filas), inicio)
+        return filas
+
+def obtener_datos_cache(query, parameters=()):
+    """
+    Igual que obtener_datos, pero reutiliza el resultado mientras ninguna de
+    las tablas consultadas se haya modificado (ver db/cache.py).
+
+    Pensada para datos de referencia pequeños (Categorias, Medios_pago,
+    Proveedores) que se consultan cada vez que se abre una pantalla.
+    """
+    filas = cache.obtener(query, parameters)
+    if filas is None:
+        generaciones = cache.generaciones(tablas_leidas(query))
+        filas = obtener_datos(query, parameters)
+        cache.guardar(query, parameters, filas, generaciones)
+    return filas
+
+def invalidar_cache(tabla=None):
+    """
+    Invalida los resultados en caché de una tabla (o todos si no se indica).
+
+    Útil cuando otra terminal modificó datos de referencia.
+    """
+    if tabla is None:
+        cache.limpiar()
+    else:
+        cache.invalidar_tabla(tabla)
+
+def estadisticas_cache():
+    """Devuelve aciertos, fallos y tamaño de la caché de consultas"""
+    return cache.estadisticas()
+
+def iterar_datos(query, parameters=(), tamano_lote=None):
+    """
+    Ejecuta una consulta SELECT y entrega los resultados por lotes.
+
+    A diferencia de obtener_datos no se materializa todo el resultado: cada
+    lote se lee con fetchmany al pedirse, así que la memoria y el tiempo
+    hasta la primera fila no dependen del tamaño de la tabla. La consulta
+    usa una conexión propia del pool que se devuelve al agotar o cerrar el
+    generador.
+
+    Args:
+        query (str): Consulta SELECT
+        parameters (tuple): Parámetros de la consulta
+        tamano_lote (int): Filas por lote (TAMANO_LOTE por defecto)
+
+    Yields:
+        list: Lote de filas (sqlite3.Row)
+
+    Ejemplo:
+        for lote in iterar_datos("SELECT * FROM Movimientos", tamano_lote=200):
+            procesar(lote)
+    """
+    tamano_lote = tamano_lote or TAMANO_LOTE
+    medir = instrumentacion.INSTRUMENTACION_ACTIVA
+    pantalla = instrumentacion.pantalla_llamadora() if medir else None
+    pool = obtener_pool()
+    conn = pool.tomar()
+    segundos_sql = 0.0  # Sólo el tiempo dentro de SQLite, no el del consumidor
+    total = 0
+    try:
+        inicio = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute(query, parameters)
+        while True:
+            lote = cursor.fetchmany(tamano_lote)
+            segundos_sql += time.perf_counter() - inicio
+            if not lote:
+                break
+            total += len(lote)
+            yield lote
+            inicio = time.perf_counter()
+        cursor.close()
+    finally:
+        pool.devolver(conn)
+        if medir:
+            instrumentacion.registrar_consulta(
+                query, parameters, total, ms=segundos_sql * 1000, pantalla=pantalla
+            )
+
+class FilasNoAfectadas(Exception):
+    """
+    Una sentencia de un Lote con exigir_todas no modificó ninguna fila (p. ej.
+    un UPDATE condicional cuya condición dejó de cumplirse). La transacción
+    completa se revierte.
 
-def ejecutar_transaccion(queries):
+    Atributos:
+        query (str): Sentencia del Lote
+        indices (list): Posiciones en Lote.filas que no afectaron filas
+    """
+
+    def __init__(self, query, indices):
+        super().__init__(f"{len(indices)} sentencia(s) no afectaron filas")
+        self.query = query
+        self.indices = indices
+
+class Lote:
+    """
+    Misma sentencia ejecutada con varios juegos de parámetros (executemany).
+
+    Atributos:
+        query (str): Sentencia SQL
+        filas (list): Lista de tuplas de parámetros, una por ejecución
+        exigir_todas (bool): Si es True, cada ejecución debe afectar al
+            menos una fila; de lo contrario se revierte la transacción con
+            FilasNoAfectadas indicando todas las que fallaron
+    """
+
+    __slots__ = ('query', 'filas', 'exigir_todas')
+
+    def __init__(self, query, filas, exigir_todas=False):
+        self.query = query
+        self.filas = list(filas)
+        self.exigir_todas = exigir_todas
+
+    def __iter__(self):
+        # Permite desempaquetar como las tuplas (query, parametros)
+        return iter((self.query, self.filas))
+
+class IdGenerado:
+    """
+    Marcador para usar, como parámetro, el rowid generado por una entrada
+    anterior de la misma transacción (ver ejecutar_transaccion).
+
+    Atributos:
+        indice (int): Posición en queries de la entrada (query, parametros)
+            cuyo INSERT genera el id
+        formato (str): Plantilla opcional, p. ej. "Venta {}"
+
+    Ejemplo:
+        queries = [
+            ("INSERT INTO Transacciones ...", (...)),
+            ("INSERT INTO Movimientos (..., referencia) VALUES (..., ?)",
+             (..., IdGenerado(0, "Venta {}"))),
+        ]
+    """
+
+    __slots__ = ('indice', 'formato')
+
+    def __init__(self, indice, formato=None):
+        self.indice = indice
+        self.formato = formato
+
+    def resolver(self, ids):
+        try:
+            valor = ids[self.indice]
+        except IndexError:
+            raise ValueError(
+                f"IdGenerado({self.indice}) hace referencia a una entrada que aún no se ejecuta"
+            ) from None
+        if valor is None or isinstance(valor, list):
+            raise ValueError(
+                f"La entrada {self.indice} no es un INSERT de una sola fila que haya insertado"
+            )
+        return self.formato.format(valor) if self.formato else valor
+
+def _resolver_ids(filas, ids):
+    """Reemplaza los IdGenerado de cada fila de parámetros por su valor"""
+    resueltas = []
+    for params in filas:
+        if any(isinstance(p, IdGenerado) for p in params):
+            params = tuple(p.resolver(ids) if isinstance(p, IdGenerado) else p for p in params)
+        resueltas.append(params)
+    return resueltas
+
+_RE_INSERCION = re.compile(r"^\s*(?:INSERT|REPLACE)\b", re.I)
+
+# INSERT sin cláusula de conflicto (OR IGNORE, OR REPLACE...) y con lista de
+# columnas: sus rowid en un executemany se pueden deducir (ver
+# _rowids_deducibles)
+_RE_INSERCION_SIMPLE = re.compile(
+    r"^\s*INSERT\s+INTO\s+[\"`\[]?(\w+)[\"`\]]?\s*\(([^)]*)\)\s*VALUES\s*\((?:[^()]|\([^()]*\))*\)\s*;?\s*$",
+    re.I
+)
+_RE_UPSERT = re.compile(r"\bON\s+CONFLICT\b", re.I)
+
+# Tabla -> nombres de columna (en minúsculas) que asignan el rowid
+_columnas_rowid = {}
+
+def _columnas_que_asignan_rowid(cursor, tabla):
+    columnas = _columnas_rowid.get(tabla.lower())
+    if columnas is None:
+        info = cursor.execute(f'PRAGMA table_info("{tabla}")').fetchall()
+        llave = [c for c in info if c[5]]
+        columnas = {"rowid", "oid", "_rowid_"}
+        # Una llave primaria INTEGER de una sola columna es el rowid
+        if len(llave) == 1 and llave[0][2].upper() == "INTEGER":
+            columnas.add(llave[0][1].lower())
+        columnas = _columnas_rowid[tabla.lower()] = frozenset(columnas)
+    return columnas
+
+def _rowids_deducibles(cursor, query):
+    """
+    Indica si los rowid de un INSERT ejecutado con executemany son
+    consecutivos y terminan en last_insert_rowid: INSERT de una fila por
+    ejecución, sin cláusula de conflicto (todas las filas se insertan) y
+    sin asignar el rowid explícitamente.
+    """
+    coincidencia = _RE_INSERCION_SIMPLE.match(query)
+    if coincidencia is None or _RE_UPSERT.search(query):
+        return False
+    tabla, columnas = coincidencia.groups()
+    asignan_rowid = _columnas_que_asignan_rowid(cursor, tabla)
+    return not any(
+        c.strip().strip('"`[]').lower() in asignan_rowid for c in columnas.split(",")
+    )
+
+def _agrupar_sentencias(queries):
+    """
+    Agrupa entradas consecutivas con el mismo texto SQL.
+
+    Returns:
+        list: Tuplas (query, lista_de_parametros, es_lote, exigir_todas) en
+            orden; es_lote indica que el grupo proviene de un Lote explícito
+    """
+    grupos = []
+    for entrada in queries:
+        if isinstance(entrada, Lote):
+            grupos.append((entrada.query, entrada.filas, True, entrada.exigir_todas))
+            continue
+        query, params = entrada
+        if grupos and not grupos[-1][2] and grupos[-1][0] == query:
+            grupos[-1][1].append(params)
+        else:
+            grupos.append((query, [params], False, False))
+    return grupos
+
+def _ultimo_id(ids):
+    """
+    Último rowid insertado según los ids de _ejecutar_grupos. No se usa
+    last_insert_rowid(): es de la conexión del pool y, si la transacción no
+    insertó, conserva el de una transacción anterior de otro llamador.
+    """
+    for valor in reversed(ids):
+        for rowid in reversed(valor) if isinstance(valor, list) else (valor,):
+            if rowid is not None:
+                return rowid
+    return None
+
+def ejecutar_transaccion(queries, devolver_ids=False):
     """
     Ejecuta múltiples queries en una sola transacción atómica.
-    
+
+    Las entradas consecutivas con el mismo texto SQL se envían juntas con
+    executemany, así que conviene ordenar las queries para que las
+    sentencias iguales queden seguidas (p. ej. todos los detalles de una
+    venta y luego todas las actualizaciones de stock). También se acepta un
+    Lote explícito con la misma sentencia y varias filas de parámetros.
+    Los INSERT con cláusula de conflicto (OR IGNORE, ON CONFLICT...) o que
+    asignan el rowid explícitamente se ejecutan fila por fila para conocer
+    el rowid real de cada una.
+
+    Un parámetro IdGenerado(i) toma el rowid insertado por la entrada i de
+    la misma transacción, de modo que las filas dependientes (detalles,
+    movimientos) se escriben correctas en un solo commit.
+
+    Si la base de datos está bloqueada por otra terminal la transacción
+    completa se reintenta con espera exponencial (REINTENTOS_BLOQUEO).
+
     Args:
-        queries (list): Lista de tuplas con (query, parametros)
-        
+        queries (list): Lista de tuplas (query, parametros) y/o Lote
+        devolver_ids (bool): Si es True devuelve los rowid generados por
+            cada entrada en lugar del último
+
     Returns:
-        int: Último rowid de la última operación INSERT
-        
+        int | list: rowid de la última fila insertada por la transacción
+            (None si no insertó); con devolver_ids, una lista con un
+            elemento por entrada de queries: el rowid (int) para tuplas o
+            la lista de rowids para un Lote
+
     Ejemplo:
         queries = [
             ("INSERT INTO tabla1 ...", (param1,)),
-            ("UPDATE tabla2 SET ...", (param2,))
+            Lote("INSERT INTO tabla2 (id_tabla1, ...) VALUES (?, ...)",
+                 [(IdGenerado(0), a), (IdGenerado(0), b)])
         ]
         id = ejecutar_transaccion(queries)
     """
-    conn = None
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
-        
-        for query, params in queries:
-            cursor.execute(query, params)
-            
-        conn.commit()
-        return cursor.lastrowid
-        
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+    grupos = _agrupar_sentencias(queries)
+
+    def operacion():
+        with obtener_pool().conexion() as conn:
+            try:
+                cursor = conn.cursor()
+                # Tomar el candado de escritura desde el inicio: si otra
+                # terminal está escribiendo, se espera (busy_timeout) aquí
+                # y no a mitad de la transacción
+                cursor.execute("BEGIN IMMEDIATE")
+
+                medir = instrumentacion.INSTRUMENTACION_ACTIVA
+                ids = _ejecutar_grupos(cursor, grupos, medir)
+
+                inicio = time.perf_counter()
+                conn.commit()
+                for query, *_ in grupos:
+                    cache.registrar_escritura(query)
+                if medir:
+                    instrumentacion.registrar_consulta("COMMIT", (), 0, inicio)
+                return ids if devolver_ids else _ultimo_id(ids)
+
+            except Exception:
+                conn.rollback()
+                raise
+
+    return _con_reintentos(operacion)
+
+def ejecutar_transacciones_agrupadas(transacciones):
+    """
+    Ejecuta varias transacciones independientes con un solo commit.
+
+    Cada transacción corre dentro de su propio SAVEPOINT: si una falla sólo
+    se revierte esa y las demás se confirman juntas (group commit). Sirve
+    a un escritor único que acumula las operaciones de varias terminales
+    (ver servicios/servidor.py) para pagar un solo commit por grupo.
+
+    Args:
+        transacciones (list): Listas de queries con el mismo formato que
+            ejecutar_transaccion
+
+    Returns:
+        list: Por cada transacción, la lista de ids (como con
+            devolver_ids=True) o la excepción que la revirtió
+    """
+    transacciones = [_agrupar_sentencias(queries) for queries in transacciones]
+
+    def operacion():
+        with obtener_pool().conexion() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+
+                medir = instrumentacion.INSTRUMENTACION_ACTIVA
+                resultados = []
+                for grupos in transacciones:
+                    cursor.execute("SAVEPOINT operacion")
+                    try:
+                        resultados.append(_ejecutar_grupos(cursor, grupos, medir))
+                    except (sqlite3.Error, FilasNoAfectadas, ValueError) as e:
+                        cursor.execute("ROLLBACK TO operacion")
+                        resultados.append(e)
+                    cursor.execute("RELEASE operacion")
+
+                inicio = time.perf_counter()
+                conn.commit()
+                for grupos, resultado in zip(transacciones, resultados):
+                    if not isinstance(resultado, Exception):
+                        for query, *_ in grupos:
+                            cache.registrar_escritura(query)
+                if medir:
+                    instrumentacion.registrar_consulta("COMMIT", (), 0, inicio)
+                return resultados
+
+            except Exception:
+                conn.rollback()
+                raise
+
+    return _con_reintentos(operacion)
+
+def _ejecutar_grupos(cursor, grupos, medir):
+    """
+    Ejecuta los grupos de _agrupar_sentencias dentro de una transacción ya
+    abierta.
+
+    Returns:
+        list: Un elemento por entrada de queries (ver ejecutar_transaccion)
+    """
+    ids = []
+    for query, filas, es_lote, exigir_todas in grupos:
+        if not filas:
+            ids.append([])
+            continue
+        filas = _resolver_ids(filas, ids)
+        es_insercion = bool(_RE_INSERCION.match(query))
+        generados = [None] * len(filas)
+        inicio = time.perf_counter()
+        if (len(filas) > 1 or es_lote) and not exigir_todas and (
+                not es_insercion or _rowids_deducibles(cursor, query)):
+            cursor.executemany(query, filas)
+            afectadas = cursor.rowcount
+            if es_insercion and afectadas == len(filas):
+                # executemany no actualiza lastrowid; los rowid de un INSERT
+                # múltiple dentro de la transacción son consecutivos
+                ultimo = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                generados = list(range(ultimo - len(filas) + 1, ultimo + 1))
+        else:
+            # Una ejecución por fila: para exigir_todas (se ejecutan todas
+            # para reportar juntas las que no afectaron filas) y para los
+            # INSERT cuyos rowid no se pueden deducir
+            upsert = es_insercion and _RE_UPSERT.search(query)
+            fallidas = []
+            afectadas = 0
+            for i, params in enumerate(filas):
+                anterior = cursor.lastrowid
+                cambios = cursor.execute(query, params).rowcount
+                afectadas += cambios
+                if cambios == 0:
+                    fallidas.append(i)
+                # Un OR IGNORE omitido no inserta y un upsert que actualiza
+                # no cambia last_insert_rowid
+                elif es_insercion and not (upsert and cursor.lastrowid == anterior):
+                    generados[i] = cursor.lastrowid
+            if exigir_todas and fallidas:
+                raise FilasNoAfectadas(query, fallidas)
+        if medir:
+            instrumentacion.registrar_consulta(query, filas[0], afectadas, inicio)
+
+        if es_lote:
+            ids.append(generados)
+        else:
+            ids.extend(generados)
+    return ids
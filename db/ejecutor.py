@@ -0,0 +1,285 @@
+"""
+Ejecutor de consultas en segundo plano para la interfaz Tk.
+
+Las consultas corren en hilos de trabajo (cada uno con sus propias
+conexiones del pool) y los resultados se entregan en el hilo de Tk: una
+llamada periódica con after() vacía la cola de resultados y ejecuta los
+callbacks. Tk nunca se toca desde los hilos de trabajo.
+
+Las solicitudes pueden llevar una clave; al enviar una nueva solicitud con
+la misma clave la anterior se cancela, así que escribir rápido en un filtro
+no deja consultas obsoletas en la cola ni pinta resultados viejos.
+
+Ejemplo:
+    from db.ejecutor import ejecutor
+
+    ejecutor.enviar(
+        self, obtener_datos, "SELECT ...", (param,),
+        al_terminar=self._mostrar, clave=(id(self), 'datos')
+    )
+"""
+
+import queue
+import sys
+import threading
+import time
+from db import instrumentacion
+from db.db import iterar_datos
+
+# Hilos de trabajo que ejecutan consultas
+HILOS_EJECUTOR = 2
+
+# Cada cuánto revisa Tk la cola de resultados mientras hay solicitudes pendientes
+INTERVALO_SONDEO_MS = 15
+
+# Tiempo máximo por ciclo entregando resultados (deja libre el resto del cuadro de 16 ms)
+PRESUPUESTO_ENTREGA_MS = 8
+
+# Lotes leídos pero no entregados por solicitud; limita la memoria en consultas grandes
+LOTES_EN_VUELO = 4
+
+
+def _relanzar(error):
+    """Manejador por defecto: el error se reporta como cualquier callback de Tk"""
+    raise error
+
+
+class Solicitud:
+    """
+    Consulta enviada al ejecutor.
+
+    Atributos:
+        widget (tk.Widget): Widget que recibe el resultado
+        clave (hashable): Identificador para reemplazar solicitudes previas
+        cancelada (bool): Si es True el resultado se descarta
+        pantalla (str): Pantalla a la que se atribuyen sus consultas en la
+            instrumentación (la que envió la solicitud)
+    """
+
+    def __init__(self, widget, funcion, args, kwargs, al_terminar, al_error, clave):
+        self.widget = widget
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.al_terminar = al_terminar
+        self.al_error = al_error
+        self.clave = clave
+        self.cancelada = False
+        self.pantalla = None
+
+    def cancelar(self):
+        self.cancelada = True
+
+    def ejecutar(self, ejecutor):
+        """Corre la función en el hilo de trabajo y encola el resultado"""
+        try:
+            with instrumentacion.atribuir_pantalla(self.pantalla):
+                resultado = self.funcion(*self.args, **self.kwargs)
+        except Exception as e:
+            ejecutor._publicar(self, self.al_error or _relanzar, e)
+        else:
+            ejecutor._publicar(self, self.al_terminar, resultado)
+        ejecutor._publicar(self, None, None, final=True)
+
+
+class SolicitudLotes(Solicitud):
+    """Consulta cuyo resultado se entrega por lotes (ver db.db.iterar_datos)"""
+
+    def __init__(self, widget, query, parameters, tamano_lote, al_lote, al_terminar, al_error, clave):
+        super().__init__(widget, None, (), {}, al_terminar, al_error, clave)
+        self.query = query
+        self.parameters = parameters
+        self.tamano_lote = tamano_lote
+        self.al_lote = al_lote
+        self.en_vuelo = threading.Semaphore(LOTES_EN_VUELO)
+
+    def ejecutar(self, ejecutor):
+        with instrumentacion.atribuir_pantalla(self.pantalla):
+            self._leer_lotes(ejecutor)
+
+    def _leer_lotes(self, ejecutor):
+        lotes = iterar_datos(self.query, self.parameters, tamano_lote=self.tamano_lote)
+        try:
+            for lote in lotes:
+                # Esperar a que la UI consuma lotes anteriores
+                while not self.en_vuelo.acquire(timeout=0.1):
+                    if self.cancelada:
+                        return
+                if self.cancelada:
+                    return
+                ejecutor._publicar(self, self.al_lote, lote, libera_lote=True)
+        except Exception as e:
+            ejecutor._publicar(self, self.al_error or _relanzar, e)
+        else:
+            ejecutor._publicar(self, self.al_terminar, None, sin_argumento=True)
+        finally:
+            lotes.close()
+            ejecutor._publicar(self, None, None, final=True)
+
+
+class EjecutorConsultas:
+    """
+    Ejecuta consultas fuera del hilo de Tk y entrega resultados con after().
+
+    Los métodos enviar* y cancelar deben llamarse desde el hilo de Tk.
+    """
+
+    def __init__(self, hilos=None):
+        self.hilos = hilos or HILOS_EJECUTOR
+        self._solicitudes = queue.Queue()
+        self._resultados = queue.Queue()
+        self._por_clave = {}
+        self._pendientes = 0
+        self._sondeo = None   # (widget raíz, id de after) mientras hay pendientes
+        self._trabajadores = []
+        self._candado = threading.Lock()
+
+    def _iniciar_trabajadores(self):
+        with self._candado:
+            if self._trabajadores:
+                return
+            for i in range(self.hilos):
+                hilo = threading.Thread(
+                    target=self._trabajar, name=f"ejecutor-db-{i}", daemon=True
+                )
+                hilo.start()
+                self._trabajadores.append(hilo)
+
+    def _trabajar(self):
+        while True:
+            solicitud = self._solicitudes.get()
+            if solicitud is None:
+                return
+            if solicitud.cancelada:
+                self._publicar(solicitud, None, None, final=True)
+                continue
+            solicitud.ejecutar(self)
+
+    def _publicar(self, solicitud, callback, valor, final=False, libera_lote=False, sin_argumento=False):
+        """Encola un resultado para entregarlo en el hilo de Tk"""
+        self._resultados.put((solicitud, callback, valor, final, libera_lote, sin_argumento))
+
+    def enviar(self, widget, funcion, *args, al_terminar=None, al_error=None, clave=None, **kwargs):
+        """
+        Ejecuta funcion(*args, **kwargs) en segundo plano.
+
+        Args:
+            widget (tk.Widget): Widget dueño del resultado; si se destruye
+                antes de terminar el resultado se descarta
+            funcion (function): Función a ejecutar (p. ej. obtener_datos)
+            al_terminar (function): Recibe el valor devuelto, en el hilo de Tk
+            al_error (function): Recibe la excepción, en el hilo de Tk
+            clave (hashable): Cancela la solicitud anterior con la misma clave
+
+        Returns:
+            Solicitud: Permite cancelar la consulta
+        """
+        solicitud = Solicitud(widget, funcion, args, kwargs, al_terminar, al_error, clave)
+        self._encolar(solicitud)
+        return solicitud
+
+    def enviar_lotes(self, widget, query, parameters=(), al_lote=None, al_terminar=None,
+                     al_error=None, clave=None, tamano_lote=None):
+        """
+        Ejecuta una consulta en segundo plano entregando el resultado por lotes.
+
+        Args:
+            widget (tk.Widget): Widget dueño del resultado
+            query (str): Consulta SELECT
+            parameters (tuple): Parámetros de la consulta
+            al_lote (function): Recibe cada lote de filas, en el hilo de Tk
+            al_terminar (function): Se llama sin argumentos al terminar
+            al_error (function): Recibe la excepción, en el hilo de Tk
+            clave (hashable): Cancela la solicitud anterior con la misma clave
+            tamano_lote (int): Filas por lote
+
+        Returns:
+            SolicitudLotes: Permite cancelar la consulta
+        """
+        solicitud = SolicitudLotes(
+            widget, query, parameters, tamano_lote, al_lote, al_terminar, al_error, clave
+        )
+        self._encolar(solicitud)
+        return solicitud
+
+    def cancelar(self, clave):
+        """Cancela la solicitud vigente con esa clave (si existe)"""
+        anterior = self._por_clave.pop(clave, None)
+        if anterior is not None:
+            anterior.cancelar()
+
+    def _encolar(self, solicitud):
+        if instrumentacion.INSTRUMENTACION_ACTIVA:
+            # La pila del hilo de trabajo no llega a la pantalla: se
+            # identifica aquí, en el hilo de Tk que envía la solicitud
+            solicitud.pantalla = instrumentacion.pantalla_llamadora()
+        if solicitud.clave is not None:
+            self.cancelar(solicitud.clave)
+            self._por_clave[solicitud.clave] = solicitud
+        self._iniciar_trabajadores()
+        self._pendientes += 1
+        self._solicitudes.put(solicitud)
+        self._programar_sondeo(solicitud.widget)
+
+    def _programar_sondeo(self, widget):
+        if self._sondeo is None:
+            raiz = widget._root()
+            self._sondeo = (raiz, raiz.after(INTERVALO_SONDEO_MS, self._despachar))
+
+    def _despachar(self):
+        """Entrega resultados en el hilo de Tk respetando un presupuesto de tiempo"""
+        raiz, _ = self._sondeo
+        self._sondeo = None
+        limite = time.perf_counter() + PRESUPUESTO_ENTREGA_MS / 1000
+
+        while time.perf_counter() < limite:
+            try:
+                solicitud, callback, valor, final, libera_lote, sin_argumento = (
+                    self._resultados.get_nowait()
+                )
+            except queue.Empty:
+                break
+
+            if final:
+                self._pendientes -= 1
+                if self._por_clave.get(solicitud.clave) is solicitud:
+                    del self._por_clave[solicitud.clave]
+                continue
+
+            vigente = not solicitud.cancelada and self._widget_existe(solicitud.widget)
+            try:
+                if vigente and callback is not None:
+                    if sin_argumento:
+                        callback()
+                    else:
+                        callback(valor)
+            except Exception:
+                # Un callback con error no debe detener la entrega de los demás
+                raiz.report_callback_exception(*sys.exc_info())
+            finally:
+                if libera_lote:
+                    solicitud.en_vuelo.release()
+
+        # Un callback pudo haber enviado otra solicitud y reprogramado el sondeo
+        if self._sondeo is None and (self._pendientes > 0 or not self._resultados.empty()):
+            try:
+                self._sondeo = (raiz, raiz.after(INTERVALO_SONDEO_MS, self._despachar))
+            except Exception:
+                pass  # La ventana principal ya se cerró
+
+    @staticmethod
+    def _widget_existe(widget):
+        try:
+            return bool(widget.winfo_exists())
+        except Exception:
+            return False
+
+    def detener(self):
+        """Termina los hilos de trabajo (al cerrar la aplicación)"""
+        with self._candado:
+            for _ in self._trabajadores:
+                self._solicitudes.put(None)
+            self._trabajadores = []
+
+
+ejecutor = EjecutorConsultas()
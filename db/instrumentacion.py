@@ -0,0 +1,277 @@
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Desactivar para eliminar por completo el costo de medición
+INSTRUMENTACION_ACTIVA = True
+
+# Consultas que tarden más que esto se guardan en el registro de lentas
+UMBRAL_LENTA_MS = 100.0
+
+# Capacidad del registro circular de consultas lentas
+TAMANO_REGISTRO_LENTAS = 200
+
+# Límites superiores (ms) de las cubetas del histograma; la última es "+inf"
+LIMITES_HISTOGRAMA_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_RE_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+# Pantalla asignada al hilo actual (ver atribuir_pantalla)
+_atribucion = threading.local()
+
+
+@lru_cache(maxsize=512)
+def huella_sql(query):
+    """
+    Normaliza una consulta para agrupar ejecuciones equivalentes.
+
+    Elimina comentarios y espacios repetidos y reemplaza literales de texto,
+    números y listas ``IN (?, ?, ...)`` por marcadores.
+
+    Args:
+        query (str): Texto SQL
+
+    Returns:
+        str: Huella de la consulta
+    """
+    huella = _RE_COMENTARIOS.sub(" ", query)
+    huella = _RE_CADENAS.sub("?", huella)
+    huella = _RE_NUMEROS.sub("?", huella)
+    huella = _RE_LISTAS.sub("(?...)", huella)
+    return _RE_ESPACIOS.sub(" ", huella).strip()
+
+
+def pantalla_llamadora():
+    """
+    Identifica la pantalla o diálogo de la UI que originó la consulta.
+
+    Returns:
+        str: La pantalla asignada al hilo con atribuir_pantalla; si no hay,
+            "Clase.metodo" del primer marco de pila dentro del paquete ui,
+            o el nombre del módulo si no hay ninguno
+    """
+    pantalla = getattr(_atribucion, 'pantalla', None)
+    if pantalla is not None:
+        return pantalla
+    frame = sys._getframe(2)
+    modulo_externo = None
+    while frame is not None:
+        modulo = frame.f_globals.get('__name__', '')
+        if modulo.startswith('ui.'):
+            instancia = frame.f_locals.get('self')
+            nombre = frame.f_code.co_name
+            if instancia is not None:
+                return f"{type(instancia).__name__}.{nombre}"
+            return f"{modulo}.{nombre}"
+        if modulo_externo is None and not modulo.startswith('db.'):
+            modulo_externo = modulo
+        frame = frame.f_back
+    return modulo_externo or "desconocido"
+
+
+@contextmanager
+def atribuir_pantalla(pantalla):
+    """
+    Atribuye a una pantalla las consultas del hilo actual mientras dura el
+    bloque. Lo usa el ejecutor en segundo plano, cuyos hilos de trabajo no
+    tienen a la pantalla en su pila.
+
+    Args:
+        pantalla (str): Pantalla obtenida con pantalla_llamadora() en el
+            hilo que envió el trabajo; None no cambia la atribución
+    """
+    anterior = getattr(_atribucion, 'pantalla', None)
+    if pantalla is not None:
+        _atribucion.pantalla = pantalla
+    try:
+        yield
+    finally:
+        _atribucion.pantalla = anterior
+
+
+class EstadisticaConsulta:
+    """Acumulado de tiempos de una huella de consulta"""
+
+    __slots__ = ('conteo', 'total_ms', 'max_ms', 'filas', 'cubetas', 'pantallas')
+
+    def __init__(self):
+        self.conteo = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.filas = 0
+        self.cubetas = [0] * (len(LIMITES_HISTOGRAMA_MS) + 1)
+        self.pantallas = {}
+
+    def agregar(self, ms, filas, pantalla):
+        self.conteo += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.filas += filas if filas and filas > 0 else 0
+        indice = len(LIMITES_HISTOGRAMA_MS)
+        for i, limite in enumerate(LIMITES_HISTOGRAMA_MS):
+            if ms <= limite:
+                indice = i
+                break
+        self.cubetas[indice] += 1
+        self.pantallas[pantalla] = self.pantallas.get(pantalla, 0) + 1
+
+    def percentil(self, p):
+        """Aproxima el percentil p (0-100) con el límite de la cubeta"""
+        objetivo = self.conteo * p / 100
+        acumulado = 0
+        for i, cantidad in enumerate(self.cubetas):
+            acumulado += cantidad
+            if acumulado >= objetivo and cantidad:
+                if i < len(LIMITES_HISTOGRAMA_MS):
+                    return float(LIMITES_HISTOGRAMA_MS[i])
+                return self.max_ms
+        return 0.0
+
+    def como_dict(self):
+        return {
+            'conteo': self.conteo,
+            'total_ms': round(self.total_ms, 3),
+            'promedio_ms': round(self.total_ms / self.conteo, 3) if self.conteo else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'filas': self.filas,
+            'cubetas': dict(zip(
+                [f"<={l}ms" for l in LIMITES_HISTOGRAMA_MS] + ["+inf"],
+                self.cubetas
+            )),
+            'pantallas': dict(self.pantallas),
+        }
+
+
+class RegistroConsultas:
+    """
+    Registro en memoria de tiempos de consultas SQL y etapas de la UI.
+
+    Atributos:
+        lentas (deque): Registro circular con las consultas más lentas que
+            UMBRAL_LENTA_MS
+        estadisticas (dict): Huella -> EstadisticaConsulta
+    """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.lentas = deque(maxlen=TAMANO_REGISTRO_LENTAS)
+        self.estadisticas = {}
+
+    def registrar(self, huella, ms, filas=0, num_parametros=0, pantalla=None, tipo='sql'):
+        """
+        Agrega una medición al histograma de su huella.
+
+        Args:
+            huella (str): Huella de la consulta (ver huella_sql)
+            ms (float): Tiempo transcurrido en milisegundos
+            filas (int): Filas devueltas o afectadas
+            num_parametros (int): Número de parámetros enlazados
+            pantalla (str): Pantalla que originó la consulta
+            tipo (str): 'sql' para consultas o 'ui' para etapas de interfaz
+        """
+        pantalla = pantalla or "desconocido"
+        with self._candado:
+            estadistica = self.estadisticas.get(huella)
+            if estadistica is None:
+                estadistica = self.estadisticas[huella] = EstadisticaConsulta()
+            estadistica.agregar(ms, filas, pantalla)
+            if ms >= UMBRAL_LENTA_MS:
+                self.lentas.append({
+                    'fecha': time.strftime("%Y-%m-%d %H:%M:%S"),
+                    'tipo': tipo,
+                    'huella': huella,
+                    'parametros': num_parametros,
+                    'filas': filas,
+                    'ms': round(ms, 3),
+                    'pantalla': pantalla,
+                })
+
+    def consultas_lentas(self):
+        """Devuelve una copia del registro de consultas lentas (más reciente al final)"""
+        with self._candado:
+            return list(self.lentas)
+
+    def histogramas(self):
+        """Devuelve las estadísticas por huella ordenadas por tiempo total"""
+        with self._candado:
+            datos = {h: e.como_dict() for h, e in self.estadisticas.items()}
+        return dict(sorted(datos.items(), key=lambda x: x[1]['total_ms'], reverse=True))
+
+    def reiniciar(self):
+        """Descarta todas las mediciones"""
+        with self._candado:
+            self.lentas.clear()
+            self.estadisticas.clear()
+
+
+registro = RegistroConsultas()
+
+
+def registrar_consulta(query, parameters, filas, inicio=None, ms=None, pantalla=None):
+    """
+    Registra una consulta ejecutada desde db.db.
+
+    Args:
+        query (str): Texto SQL ejecutado
+        parameters (tuple): Parámetros enlazados
+        filas (int): Filas devueltas o afectadas
+        inicio (float): Valor de time.perf_counter() antes de ejecutar
+        ms (float): Tiempo ya medido (en lugar de inicio)
+        pantalla (str): Pantalla llamadora, si ya se conoce
+    """
+    if ms is None:
+        ms = (time.perf_counter() - inicio) * 1000
+    registro.registrar(
+        huella_sql(query),
+        ms,
+        filas=filas,
+        num_parametros=len(parameters) if parameters else 0,
+        pantalla=pantalla or pantalla_llamadora(),
+    )
+
+
+@contextmanager
+def medir(etapa):
+    """
+    Mide una etapa que no es SQL (por ejemplo, llenar un Treeview) para
+    compararla con las consultas de la misma pantalla.
+
+    Ejemplo:
+        with medir("PantallaMovimientos.insertar_filas"):
+            for fila in datos:
+                tabla.insert(...)
+    """
+    if not INSTRUMENTACION_ACTIVA:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        registro.registrar(f"[ui] {etapa}", ms, pantalla=etapa.split('.')[0], tipo='ui')
+
+
+def obtener_consultas_lentas():
+    """Consultas que superaron UMBRAL_LENTA_MS, de la más antigua a la más reciente"""
+    return registro.consultas_lentas()
+
+
+def obtener_histogramas():
+    """Histogramas de tiempos por huella de consulta"""
+    return registro.histogramas()
+
+
+def reiniciar_estadisticas():
+    """Limpia el registro de consultas lentas y los histogramas"""
+    registro.reiniciar()
@@ -0,0 +1,248 @@
+"""
+Migraciones versionadas del esquema.
+
+data/estructura.sql define la versión 0 del esquema. Cada migración se
+identifica con un número consecutivo y se aplica una sola vez, en orden,
+dentro de su propia transacción. La versión aplicada queda registrada en la
+tabla Version_esquema (y en PRAGMA user_version), de modo que las bases
+existentes se actualizan automáticamente al iniciar la aplicación.
+
+Para agregar una migración basta con añadir una tupla al final de
+MIGRACIONES con el siguiente número de versión. Los pasos pueden ser
+sentencias SQL o funciones que reciben el cursor.
+"""
+
+from datetime import datetime
+from db.db import obtener_pool
+
+
+MIGRACIONES = [
+    (1, "Índices para las consultas frecuentes", [
+        # Referencias de venta por producto (Movimientos de una venta)
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_referencia_producto "
+        "ON Movimientos(referencia, id_producto)",
+        # Historial de movimientos de un producto
+        "CREATE INDEX IF NOT EXISTS idx_movimientos_producto "
+        "ON Movimientos(id_producto)",
+        # Detalle de una transacción
+        "CREATE INDEX IF NOT EXISTS idx_detalle_transaccion "
+        "ON Detalle_transaccion(id_transaccion)",
+        # Direcciones de un cliente (y su dirección principal)
+        "CREATE INDEX IF NOT EXISTS idx_direcciones_cliente "
+        "ON Direcciones(id_cliente, principal)",
+        # Filtros por rango de fechas y orden cronológico
+        "CREATE INDEX IF NOT EXISTS idx_transacciones_fecha "
+        "ON Transacciones(fecha)",
+        # Validación de unicidad y búsqueda por código
+        "CREATE INDEX IF NOT EXISTS idx_productos_sku ON Productos(sku)",
+        "CREATE INDEX IF NOT EXISTS idx_productos_codigo_barras "
+        "ON Productos(codigo_barras)",
+        # Factura de una transacción
+        "CREATE INDEX IF NOT EXISTS idx_facturas_transaccion "
+        "ON Facturas(id_transaccion)",
+    ]),
+    (2, "Cola persistente de trabajos de factura", [
+        """
+        CREATE TABLE IF NOT EXISTS Trabajos_factura (
+            id_trabajo INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_factura INTEGER NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            proximo_intento TEXT NOT NULL,
+            tomado_por TEXT,
+            fecha_tomado TEXT,
+            error TEXT,
+            FOREIGN KEY(id_factura) REFERENCES Facturas(id_factura)
+        )
+        """,
+        # Siguiente trabajo listo para procesar
+        "CREATE INDEX IF NOT EXISTS idx_trabajos_factura_estado "
+        "ON Trabajos_factura(estado, proximo_intento)",
+    ]),
+    (3, "Índices para la paginación del inventario", [
+        # Orden por nombre (keyset sobre nombre + id_producto) y filtro por
+        # categoría con el mismo orden
+        "CREATE INDEX IF NOT EXISTS idx_productos_nombre "
+        "ON Productos(nombre COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_productos_categoria_nombre "
+        "ON Productos(id_categoria, nombre COLLATE NOCASE)",
+        # Orden por stock y por precio
+        "CREATE INDEX IF NOT EXISTS idx_productos_stock ON Productos(stock_actual)",
+        "CREATE INDEX IF NOT EXISTS idx_productos_precio ON Productos(precio_venta)",
+    ]),
+    (4, "Índice de texto completo de productos", [
+        # Contenido externo: el texto vive en Productos y el índice sólo
+        # guarda los términos; prefix acelera las búsquedas de 2 y 3 letras
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS Productos_fts USING fts5(
+            nombre, descripcion, sku, codigo_barras,
+            content='Productos', content_rowid='id_producto',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS productos_fts_insertar AFTER INSERT ON Productos BEGIN
+            INSERT INTO Productos_fts (rowid, nombre, descripcion, sku, codigo_barras)
+            VALUES (new.id_producto, new.nombre, new.descripcion, new.sku, new.codigo_barras);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS productos_fts_eliminar AFTER DELETE ON Productos BEGIN
+            INSERT INTO Productos_fts (Productos_fts, rowid, nombre, descripcion, sku, codigo_barras)
+            VALUES ('delete', old.id_producto, old.nombre, old.descripcion, old.sku, old.codigo_barras);
+        END
+        """,
+        # Sólo las columnas indexadas: los cambios de stock de cada venta no
+        # tocan el índice
+        """
+        CREATE TRIGGER IF NOT EXISTS productos_fts_actualizar
+        AFTER UPDATE OF id_producto, nombre, descripcion, sku, codigo_barras ON Productos BEGIN
+            INSERT INTO Productos_fts (Productos_fts, rowid, nombre, descripcion, sku, codigo_barras)
+            VALUES ('delete', old.id_producto, old.nombre, old.descripcion, old.sku, old.codigo_barras);
+            INSERT INTO Productos_fts (rowid, nombre, descripcion, sku, codigo_barras)
+            VALUES (new.id_producto, new.nombre, new.descripcion, new.sku, new.codigo_barras);
+        END
+        """,
+        # Indexar los productos existentes
+        "INSERT INTO Productos_fts (Productos_fts) VALUES ('rebuild')",
+    ]),
+    (5, "Registro de cambios de productos", [
+        # Leído por db/cambios.py; el id creciente marca hasta dónde se
+        # sincronizó cada pantalla
+        """
+        CREATE TABLE IF NOT EXISTS Cambios_productos (
+            id_cambio INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_producto INTEGER NOT NULL,
+            tipo TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS cambios_productos_alta AFTER INSERT ON Productos BEGIN
+            INSERT INTO Cambios_productos (id_producto, tipo) VALUES (new.id_producto, 'alta');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS cambios_productos_baja AFTER DELETE ON Productos BEGIN
+            INSERT INTO Cambios_productos (id_producto, tipo) VALUES (old.id_producto, 'baja');
+        END
+        """,
+        # Ventas y movimientos sólo cambian el stock: una pantalla puede
+        # sustituir esas filas sin recargar
+        """
+        CREATE TRIGGER IF NOT EXISTS cambios_productos_stock
+        AFTER UPDATE OF stock_actual ON Productos BEGIN
+            INSERT INTO Cambios_productos (id_producto, tipo) VALUES (new.id_producto, 'stock');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS cambios_productos_datos
+        AFTER UPDATE OF id_producto, nombre, descripcion, precio_venta, costo, codigo_barras,
+            sku, stock_minimo, stock_maximo, id_categoria, id_proveedor, fecha_creacion, estado
+        ON Productos BEGIN
+            INSERT INTO Cambios_productos (id_producto, tipo) VALUES (new.id_producto, 'datos');
+        END
+        """,
+    ]),
+    (6, "Punto de control de la conciliación de stock", [
+        # Saldo del libro de movimientos por producto hasta el punto de
+        # control (ver servicios/conciliacion.py)
+        """
+        CREATE TABLE IF NOT EXISTS Conciliacion_stock (
+            id_producto INTEGER PRIMARY KEY,
+            stock_libro INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Conciliacion_estado (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            id_movimiento_hasta INTEGER NOT NULL,
+            fecha TEXT
+        )
+        """,
+        "INSERT OR IGNORE INTO Conciliacion_estado (id, id_movimiento_hasta) VALUES (1, 0)",
+    ]),
+]
+
+
+def _crear_tabla_version(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Version_esquema (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            fecha_aplicacion TEXT NOT NULL
+        )
+    """)
+
+
+def version_actual():
+    """
+    Devuelve la versión de esquema aplicada en la base de datos.
+
+    Returns:
+        int: Última versión registrada (0 si no se ha aplicado ninguna)
+    """
+    with obtener_pool().conexion() as conn:
+        cursor = conn.cursor()
+        existe = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Version_esquema'"
+        ).fetchone()
+        if not existe:
+            return 0
+        return cursor.execute("SELECT COALESCE(MAX(version), 0) FROM Version_esquema").fetchone()[0]
+
+
+def aplicar_migraciones(migraciones=None):
+    """
+    Aplica en orden las migraciones pendientes.
+
+    Cada migración corre en su propia transacción (BEGIN IMMEDIATE), así que
+    si varias terminales arrancan a la vez sólo una la aplica y las demás la
+    encuentran registrada al obtener el candado.
+
+    Args:
+        migraciones (list): Lista de (version, descripcion, pasos); por
+            defecto MIGRACIONES
+
+    Returns:
+        list: Versiones aplicadas en esta llamada
+    """
+    migraciones = sorted(migraciones or MIGRACIONES, key=lambda m: m[0])
+    aplicadas = []
+
+    with obtener_pool().conexion() as conn:
+        cursor = conn.cursor()
+        # Camino rápido al iniciar: el esquema ya está al día
+        if migraciones and cursor.execute("PRAGMA user_version").fetchone()[0] >= migraciones[-1][0]:
+            return aplicadas
+
+        for version, descripcion, pasos in migraciones:
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                _crear_tabla_version(cursor)
+                ya_aplicada = cursor.execute(
+                    "SELECT 1 FROM Version_esquema WHERE version = ?", (version,)
+                ).fetchone()
+                if ya_aplicada:
+                    conn.rollback()
+                    continue
+
+                for paso in pasos:
+                    if callable(paso):
+                        paso(cursor)
+                    else:
+                        cursor.execute(paso)
+
+                cursor.execute(
+                    "INSERT INTO Version_esquema (version, descripcion, fecha_aplicacion) "
+                    "VALUES (?, ?, ?)",
+                    (version, descripcion, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+                cursor.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+                aplicadas.append(version)
+            except Exception:
+                conn.rollback()
+                raise
+
+    return aplicadas
@@ -0,0 +1,356 @@
+"""
+Paginación por keyset (seek) para listas grandes.
+
+En lugar de OFFSET, cada página continúa después de la última fila de la
+anterior usando la clave de orden más un id único como desempate:
+
+    WHERE orden >= ? AND (orden > ? OR id > ?) ORDER BY orden, id LIMIT n
+
+Con un índice sobre (orden, id) SQLite salta directo a la posición y lee
+sólo las filas de la página, sin importar qué tan adentro esté. OFFSET se
+usa únicamente para ubicar el inicio de una página lejana (saltos con la
+barra de desplazamiento) leyendo sólo la clave.
+
+FuentePaginada adapta una ConsultaPaginada a la interfaz de fuente de
+ui/components/tabla_virtual.py. Al desplazarse, las páginas que faltan (y
+las vecinas) se leen en segundo plano con el ejecutor; mientras tanto la
+tabla muestra marcadores en esas filas.
+
+Ejemplo:
+    consulta = ConsultaPaginada(
+        "p.id_producto, p.nombre", "Productos p",
+        orden="p.nombre COLLATE NOCASE", clave="p.id_producto",
+        filtros=[("p.id_categoria = ?", (3,))]
+    )
+    fuente = FuentePaginada(consulta)   # cuenta y carga la primera página
+"""
+
+from collections import OrderedDict
+from db.db import obtener_datos
+from db.ejecutor import ejecutor
+
+# Filas por página
+TAMANO_PAGINA = 200
+
+# Páginas que FuentePaginada conserva en memoria (las menos recientes se descartan)
+MAX_PAGINAS_CACHE = 50
+
+
+class ConsultaPaginada:
+    """
+    Consulta SELECT con filtros y orden que se lee por páginas.
+
+    Las filas devueltas llevan dos columnas extra al final: el valor de
+    orden y la clave, usados para pedir la página siguiente.
+
+    Atributos:
+        columnas (str): Lista de columnas del SELECT
+        desde (str): Cláusula FROM (con sus JOIN)
+        orden (str): Expresión de orden (puede incluir COLLATE)
+        clave (str): Columna única de desempate (p. ej. el id)
+        ascendente (bool): Sentido del orden
+        filtros (list): Tuplas (condicion_sql, parametros) unidas con AND
+        tamano_pagina (int): Filas por página
+    """
+
+    def __init__(self, columnas, desde, orden, clave, filtros=(), ascendente=True,
+                 tamano_pagina=None):
+        self.columnas = columnas
+        self.desde = desde
+        self.orden = orden
+        self.clave = clave
+        self.ascendente = ascendente
+        self.filtros = list(filtros)
+        self.tamano_pagina = tamano_pagina or TAMANO_PAGINA
+
+    def _where(self, extra=None):
+        condiciones = [f"({condicion})" for condicion, _ in self.filtros]
+        parametros = [p for _, params in self.filtros for p in params]
+        if extra:
+            condiciones.append(f"({extra[0]})")
+            parametros.extend(extra[1])
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return where, parametros
+
+    def _order_by(self):
+        sentido = "ASC" if self.ascendente else "DESC"
+        return f"ORDER BY {self.orden} {sentido}, {self.clave} {sentido}"
+
+    def _despues_de(self, valor, clave):
+        """
+        Condición "posterior a (valor, clave)" en el orden de la consulta.
+
+        Se escribe como rango sobre la columna de orden (orden >= ? AND ...)
+        y no como valor de fila, porque SQLite sólo usa el índice para
+        saltar con la primera forma cuando la expresión lleva COLLATE.
+        """
+        if valor is None:
+            # Dentro del tramo de NULL sólo avanza la clave
+            return f"{self.orden} IS NULL AND {self.clave} {'>' if self.ascendente else '<'} ?", (clave,)
+        if self.ascendente:
+            return (f"{self.orden} >= ? AND ({self.orden} > ? OR {self.clave} > ?)",
+                    (valor, valor, clave))
+        return (f"{self.orden} <= ? AND ({self.orden} < ? OR {self.clave} < ?)",
+                (valor, valor, clave))
+
+    def _leer(self, condicion, limite):
+        where, parametros = self._where(condicion)
+        return obtener_datos(
+            f"""
+            SELECT {self.columnas}, {self.orden}, {self.clave}
+            FROM {self.desde} {where}
+            {self._order_by()}
+            LIMIT ?
+            """,
+            parametros + [limite]
+        )
+
+    def contar(self):
+        """Número de filas que cumplen los filtros"""
+        where, parametros = self._where()
+        return obtener_datos(f"SELECT COUNT(*) FROM {self.desde} {where}", parametros)[0][0]
+
+    def pagina(self, despues=None):
+        """
+        Lee una página.
+
+        Args:
+            despues (tuple): (valor_orden, clave) de la última fila de la
+                página anterior; None para la primera página
+
+        Returns:
+            list: Filas (con valor de orden y clave al final)
+        """
+        if despues is None:
+            return self._leer(None, self.tamano_pagina)
+        filas = self._leer(self._despues_de(*despues), self.tamano_pagina)
+
+        # SQLite ordena los NULL primero en ASC y al final en DESC. Se leen
+        # como un tramo aparte (un OR en la condición impediría usar el
+        # índice): al agotar un tramo la página continúa en el siguiente
+        valor = despues[0]
+        faltan = self.tamano_pagina - len(filas)
+        if faltan and self.ascendente and valor is None:
+            filas += self._leer((f"{self.orden} IS NOT NULL", ()), faltan)
+        elif faltan and not self.ascendente and valor is not None:
+            filas += self._leer((f"{self.orden} IS NULL", ()), faltan)
+        return filas
+
+    def por_claves(self, claves):
+        """
+        Filas de esas claves que cumplen los filtros, con el mismo formato
+        que pagina() (sin orden; p. ej. para refrescar filas que cambiaron)
+        """
+        claves = list(claves)
+        if not claves:
+            return []
+        where, parametros = self._where(
+            (f"{self.clave} IN ({', '.join('?' for _ in claves)})", claves)
+        )
+        return obtener_datos(
+            f"SELECT {self.columnas}, {self.orden}, {self.clave} FROM {self.desde} {where}",
+            parametros
+        )
+
+    def clave_en(self, posicion):
+        """
+        (valor_orden, clave) de la fila en una posición (0 = primera), o
+        None si no existe. Sólo lee las columnas de orden.
+        """
+        where, parametros = self._where()
+        filas = obtener_datos(
+            f"""
+            SELECT {self.orden}, {self.clave}
+            FROM {self.desde} {where}
+            {self._order_by()}
+            LIMIT 1 OFFSET ?
+            """,
+            parametros + [posicion]
+        )
+        return tuple(filas[0]) if filas else None
+
+
+def clave_de(fila):
+    """(valor_orden, clave) de una fila devuelta por ConsultaPaginada.pagina"""
+    return fila[-2], fila[-1]
+
+
+class FuentePaginada:
+    """
+    Fuente de datos para TablaVirtual que lee páginas bajo demanda.
+
+    El total se cuenta al crearla (y la primera página se carga), así que
+    conviene construirla fuera del hilo de Tk. Las páginas siguientes se
+    piden con keyset desde la anterior al desplazarse: cargadas() y
+    cargar() las leen en segundo plano; filas() las lee en el momento.
+    Salvo la creación, sus métodos se llaman desde el hilo de Tk.
+
+    Atributos:
+        consulta (ConsultaPaginada): Consulta a paginar
+        total (int): Filas que cumplen los filtros al crear la fuente
+    """
+
+    def __init__(self, consulta):
+        self.consulta = consulta
+        self.total = consulta.contar()
+        self._paginas = OrderedDict()  # número de página -> filas
+        if self.total:
+            self._pagina(0)
+
+    def __len__(self):
+        return self.total
+
+    def _pagina(self, numero):
+        filas = self._paginas.get(numero)
+        if filas is not None:
+            self._paginas.move_to_end(numero)
+            return filas
+
+        anterior = self._paginas.get(numero - 1)
+        filas = self._leer_pagina(numero, clave_de(anterior[-1]) if anterior else None)
+        self._guardar_pagina(numero, filas)
+        return filas
+
+    def _leer_pagina(self, numero, despues=None):
+        """
+        Lee una página de la base sin tocar las páginas en memoria.
+
+        Args:
+            numero (int): Número de página
+            despues (tuple): Clave de la última fila de la página anterior,
+                si se conoce
+        """
+        if numero == 0:
+            return self.consulta.pagina()
+        if despues is None:
+            # Salto lejano: ubicar la última fila de la página anterior
+            despues = self.consulta.clave_en(numero * self.consulta.tamano_pagina - 1)
+            if despues is None:
+                return []
+        return self.consulta.pagina(despues=despues)
+
+    def _guardar_pagina(self, numero, filas):
+        self._paginas[numero] = filas
+        self._paginas.move_to_end(numero)
+        if len(self._paginas) > MAX_PAGINAS_CACHE:
+            self._paginas.popitem(last=False)
+
+    def _leer_paginas(self, numeros, claves):
+        """
+        Lee varias páginas (hilo del ejecutor); cada una continúa desde la
+        anterior si ésta se acaba de leer o ya estaba en memoria.
+
+        Returns:
+            dict: número de página -> filas
+        """
+        leidas = {}
+        for numero in numeros:
+            anterior = leidas.get(numero - 1)
+            despues = clave_de(anterior[-1]) if anterior else claves.get(numero)
+            leidas[numero] = self._leer_pagina(numero, despues)
+        return leidas
+
+    def cargar(self, widget, inicio, cantidad, al_terminar):
+        """
+        Pide en segundo plano las páginas que faltan para mostrar esa
+        ventana y las ventanas anterior y siguiente. Una nueva llamada
+        cancela la lectura pendiente (desplazamiento rápido).
+
+        Args:
+            widget (tk.Widget): Widget dueño de la lectura (ver ejecutor)
+            inicio (int): Primera fila de la ventana
+            cantidad (int): Filas de la ventana
+            al_terminar (function): Se llama sin argumentos, en el hilo de
+                Tk, cuando las páginas ya están en memoria
+        """
+        if not self.total:
+            return
+        tamano = self.consulta.tamano_pagina
+        primera = max(0, inicio - cantidad) // tamano
+        ultima = (min(inicio + 2 * cantidad, self.total) - 1) // tamano
+        faltantes = [n for n in range(primera, ultima + 1) if n not in self._paginas]
+        if not faltantes:
+            return
+        claves = {
+            numero: clave_de(self._paginas[numero - 1][-1])
+            for numero in faltantes if self._paginas.get(numero - 1)
+        }
+
+        def al_leer(paginas):
+            for numero, filas in paginas.items():
+                self._guardar_pagina(numero, filas)
+            al_terminar()
+
+        ejecutor.enviar(
+            widget, self._leer_paginas, faltantes, claves,
+            al_terminar=al_leer,
+            # Las filas quedan como marcadores; se vuelve a pedir al pintar
+            al_error=lambda e: None,
+            clave=(id(self), 'cargar')
+        )
+
+    def cargadas(self, inicio, cantidad):
+        """
+        Como filas(), pero sin leer la base: las filas de páginas que no
+        están en memoria se devuelven como None (ver cargar).
+        """
+        tamano = self.consulta.tamano_pagina
+        resultado = []
+        posicion = inicio
+        fin = min(inicio + cantidad, self.total)
+        while posicion < fin:
+            numero, desplazamiento = divmod(posicion, tamano)
+            pagina = self._paginas.get(numero)
+            if pagina is None:
+                hasta = min(fin, (numero + 1) * tamano)
+                resultado.extend([None] * (hasta - posicion))
+                posicion = hasta
+                continue
+            self._paginas.move_to_end(numero)
+            if len(pagina) <= desplazamiento:
+                break  # Otra terminal borró filas desde que se contaron
+            tomadas = pagina[desplazamiento:desplazamiento + fin - posicion]
+            resultado.extend(tomadas)
+            posicion += len(tomadas)
+        return resultado
+
+    def reemplazar(self, filas):
+        """
+        Sustituye en las páginas en memoria las filas con la misma clave.
+
+        Sólo sirve para cambios que no alteran los filtros ni el orden (p.
+        ej. el stock cuando se ordena por nombre); las páginas que no están
+        en memoria se leerán ya actualizadas.
+
+        Args:
+            filas (list): Filas de ConsultaPaginada.por_claves
+
+        Returns:
+            bool: False si alguna fila cambió su valor de orden y hay que
+                recargar la fuente
+        """
+        nuevas = {clave_de(fila)[1]: fila for fila in filas}
+        for pagina in self._paginas.values():
+            for posicion, fila in enumerate(pagina):
+                nueva = nuevas.get(fila[-1])
+                if nueva is None:
+                    continue
+                if clave_de(nueva) != clave_de(fila):
+                    return False
+                pagina[posicion] = nueva
+        return True
+
+    def filas(self, inicio, cantidad):
+        tamano = self.consulta.tamano_pagina
+        resultado = []
+        posicion = inicio
+        fin = min(inicio + cantidad, self.total)
+        while posicion < fin:
+            numero, desplazamiento = divmod(posicion, tamano)
+            pagina = self._pagina(numero)
+            if len(pagina) <= desplazamiento:
+                break  # Otra terminal borró filas desde que se contaron
+            tomadas = pagina[desplazamiento:desplazamiento + fin - posicion]
+            resultado.extend(tomadas)
+            posicion += len(tomadas)
+        return resultado
@@ -1,7 +1,20 @@
 import tkinter as tk
 from ui.main import MainWindow  # Importa la clase del menú
+from db.db import cerrar_conexiones
+from db.cambios import depurar_cambios
+from db.ejecutor import ejecutor
+from db.migraciones import aplicar_migraciones
+from servicios.facturacion import procesador
+from servicios.operaciones import SERVIDOR
 
 if __name__ == "__main__":
+    aplicar_migraciones()       # Actualiza el esquema (índices, tablas nuevas)
+    depurar_cambios()           # Recorta el registro de cambios de productos
+    if not SERVIDOR:            # Con VENTAS_SERVIDOR las facturas las genera el servicio
+        procesador.iniciar()    # Genera en segundo plano los PDF de facturas
     root = tk.Tk()
     app = MainWindow(root)      # Crea la ventana principal
     root.mainloop()             # Inicia el bucle de Tkinter
+    procesador.detener(5)       # Termina la factura en curso (las demás siguen en cola)
+    ejecutor.detener()          # Termina los hilos de consultas
+    cerrar_conexiones()         # Libera las conexiones del pool
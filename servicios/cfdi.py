@@ -0,0 +1,290 @@
+"""
+Generación del XML CFDI 4.0 de las facturas (columna Facturas.xml).
+
+El XML se escribe de forma incremental, sin construir un DOM: los totales del
+comprobante se obtienen con una consulta agregada y los conceptos se leen
+por lotes con iterar_datos, así que la memoria no depende del número de
+conceptos. El resultado es el comprobante sin sellar; el timbrado lo hace
+el PAC.
+
+Uso:
+    python -m servicios.cfdi            # genera el XML de las facturas que no lo tienen
+"""
+
+import argparse
+import io
+import time
+from xml.sax.saxutils import quoteattr
+from db.db import ejecutar_transaccion, iterar_datos, obtener_datos, Lote
+
+NS_CFDI = "http://www.sat.gob.mx/cfd/4"
+NS_XSI = "http://www.w3.org/2001/XMLSchema-instance"
+ESQUEMA_CFDI = "http://www.sat.gob.mx/cfd/4 http://www.sat.gob.mx/sitio_internet/cfd/4/cfdv40.xsd"
+
+# Datos fiscales del emisor (ajustar a los del negocio)
+EMISOR = {
+    'Rfc': "EKU9003173C9",
+    'Nombre': "ESCUELA KEMPER URGATE",
+    'RegimenFiscal': "601",
+    'CodigoPostal': "22000",  # LugarExpedicion
+}
+
+# Claves por defecto de los conceptos (catálogos del SAT)
+CLAVE_PROD_SERV = "01010101"   # No existe en el catálogo
+CLAVE_UNIDAD = "H87"           # Pieza
+TASA_IVA = "0.160000"
+
+# Claves de moneda capturadas con otro formato
+MONEDAS = {'MX': "MXN"}
+
+# Régimen del receptor cuando Clientes.regimen_fiscal no trae la clave
+REGIMEN_POR_TIPO_PERSONA = {'fisica': "612", 'moral': "601"}
+
+# Facturas por transacción en la generación por lotes
+TAMANO_BLOQUE_ESCRITURA = 50
+
+
+def _importe(valor):
+    return f"{(valor or 0):.2f}"
+
+
+def _datos_comprobante(id_factura):
+    filas = obtener_datos(
+        """
+        SELECT f.id_factura, f.id_transaccion, f.serie, f.folio, f.fecha_emision,
+               f.forma_pago, f.uso_cfdi, f.nombre_cliente, f.rfc_cliente,
+               t.moneda, t.tipo_cambio, mp.clave_sat,
+               d.codigo_postal, c.regimen_fiscal, c.tipo_persona
+        FROM Facturas f
+        JOIN Transacciones t ON t.id_transaccion = f.id_transaccion
+        LEFT JOIN Medios_pago mp ON mp.id_medio_pago = t.id_medio_pago
+        LEFT JOIN Direcciones d ON d.id_direccion = f.id_direccion_fiscal
+        LEFT JOIN Clientes c ON c.id_cliente = t.id_cliente
+        WHERE f.id_factura = ?
+        """,
+        (id_factura,)
+    )
+    if not filas:
+        raise LookupError(f"No existe la factura {id_factura} o su transacción")
+    return filas[0]
+
+
+def _totales(id_transaccion):
+    """
+    Subtotal, descuento e IVA calculados en SQLite sin cargar los conceptos.
+
+    Se suman los importes ya redondeados de cada concepto (como se escriben
+    en el XML): el SAT rechaza el comprobante si los totales no son la suma
+    exacta de sus conceptos.
+    """
+    return obtener_datos(
+        """
+        SELECT COALESCE(SUM(ROUND(cantidad * precio_unitario, 2)), 0),
+               COALESCE(SUM(ROUND(descuento, 2)), 0),
+               COALESCE(SUM(ROUND(iva_aplicado, 2)), 0)
+        FROM Detalle_transaccion WHERE id_transaccion = ?
+        """,
+        (id_transaccion,)
+    )[0]
+
+
+def _regimen_receptor(datos):
+    regimen = (datos['regimen_fiscal'] or "").strip()
+    if regimen.isdigit():
+        return regimen
+    return REGIMEN_POR_TIPO_PERSONA.get((datos['tipo_persona'] or "").lower(), "616")
+
+
+def _etiqueta(nombre, atributos, vacia=False):
+    """Etiqueta de apertura (o vacía) con los atributos escapados"""
+    texto = "".join(f" {clave}={quoteattr(str(valor))}" for clave, valor in atributos.items())
+    return f"<{nombre}{texto}{'/' if vacia else ''}>"
+
+
+# Un concepto con su traslado de IVA; sólo NoIdentificacion y Descripcion
+# requieren escape (van con quoteattr, que incluye las comillas)
+_CONCEPTO = (
+    '<cfdi:Concepto ClaveProdServ="{clave}" NoIdentificacion={identificacion} '
+    'Cantidad="{cantidad}" ClaveUnidad="{unidad}" Descripcion={descripcion} '
+    'ValorUnitario="{valor}" Importe="{importe}" Descuento="{descuento}" ObjetoImp="02">'
+    '<cfdi:Impuestos><cfdi:Traslados><cfdi:Traslado Base="{base}" Impuesto="002" '
+    'TipoFactor="Tasa" TasaOCuota="{tasa}" Importe="{iva}"/></cfdi:Traslados>'
+    '</cfdi:Impuestos></cfdi:Concepto>'
+)
+
+
+def escribir_cfdi(id_factura, salida):
+    """
+    Escribe el XML CFDI 4.0 de una factura.
+
+    Args:
+        id_factura (int): Factura a generar
+        salida: Objeto de texto con write() (archivo, StringIO, ...)
+    """
+    datos = _datos_comprobante(id_factura)
+    subtotal, descuento, iva = _totales(datos['id_transaccion'])
+
+    moneda = MONEDAS.get(datos['moneda'], datos['moneda']) or "MXN"
+    metodo_pago = "PPD" if "parcialidades" in (datos['forma_pago'] or "").lower() else "PUE"
+    comprobante = {
+        'xmlns:cfdi': NS_CFDI,
+        'xmlns:xsi': NS_XSI,
+        'xsi:schemaLocation': ESQUEMA_CFDI,
+        'Version': "4.0",
+        'Serie': datos['serie'] or "",
+        'Folio': datos['folio'] or "",
+        'Fecha': (datos['fecha_emision'] or "")[:19],
+        'FormaPago': datos['clave_sat'] or "99",
+        'SubTotal': _importe(subtotal),
+        'Descuento': _importe(descuento),
+        'Moneda': moneda,
+        # Derivado de los totales ya redondeados
+        'Total': _importe(subtotal - descuento + iva),
+        'TipoDeComprobante': "I",
+        'Exportacion': "01",
+        'MetodoPago': metodo_pago,
+        'LugarExpedicion': EMISOR['CodigoPostal'],
+    }
+    if moneda not in ("MXN", "XXX") and datos['tipo_cambio']:
+        comprobante['TipoCambio'] = str(datos['tipo_cambio'])
+
+    salida.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    salida.write(_etiqueta("cfdi:Comprobante", comprobante))
+    salida.write(_etiqueta("cfdi:Emisor", {
+        'Rfc': EMISOR['Rfc'], 'Nombre': EMISOR['Nombre'], 'RegimenFiscal': EMISOR['RegimenFiscal'],
+    }, vacia=True))
+    salida.write(_etiqueta("cfdi:Receptor", {
+        'Rfc': datos['rfc_cliente'] or "XAXX010101000",
+        'Nombre': datos['nombre_cliente'] or "PUBLICO EN GENERAL",
+        'DomicilioFiscalReceptor': datos['codigo_postal'] or EMISOR['CodigoPostal'],
+        'RegimenFiscalReceptor': _regimen_receptor(datos),
+        'UsoCFDI': datos['uso_cfdi'] or "G03",
+    }, vacia=True))
+
+    salida.write("<cfdi:Conceptos>")
+    lotes = iterar_datos(
+        """
+        SELECT dt.cantidad, dt.precio_unitario,
+               ROUND(dt.cantidad * dt.precio_unitario, 2),
+               ROUND(COALESCE(dt.descuento, 0), 2), ROUND(dt.iva_aplicado, 2),
+               p.nombre, COALESCE(p.sku, p.codigo_barras, p.id_producto)
+        FROM Detalle_transaccion dt
+        LEFT JOIN Productos p ON p.id_producto = dt.id_producto
+        WHERE dt.id_transaccion = ?
+        ORDER BY dt.id_detalle
+        """,
+        (datos['id_transaccion'],)
+    )
+    for lote in lotes:
+        partes = []
+        for cantidad, precio, importe, descuento_concepto, iva_concepto, nombre, identificacion in lote:
+            # Importes redondeados con el mismo ROUND que _totales
+            base = importe - descuento_concepto
+            partes.append(_CONCEPTO.format(
+                clave=CLAVE_PROD_SERV,
+                identificacion=quoteattr(str(identificacion)),
+                cantidad=cantidad,
+                unidad=CLAVE_UNIDAD,
+                descripcion=quoteattr(nombre or "Producto"),
+                valor=_importe(precio),
+                importe=_importe(importe),
+                descuento=_importe(descuento_concepto),
+                base=_importe(base),
+                tasa=TASA_IVA,
+                iva=_importe(iva_concepto),
+            ))
+        # Una escritura por lote de conceptos
+        salida.write("".join(partes))
+    salida.write("</cfdi:Conceptos>")
+
+    salida.write(_etiqueta("cfdi:Impuestos", {'TotalImpuestosTrasladados': _importe(iva)}))
+    salida.write("<cfdi:Traslados>")
+    salida.write(_etiqueta("cfdi:Traslado", {
+        'Base': _importe(subtotal - descuento), 'Impuesto': "002", 'TipoFactor': "Tasa",
+        'TasaOCuota': TASA_IVA, 'Importe': _importe(iva),
+    }, vacia=True))
+    salida.write("</cfdi:Traslados></cfdi:Impuestos></cfdi:Comprobante>")
+
+
+def generar_xml(id_factura):
+    """
+    Genera el XML CFDI 4.0 de una factura.
+
+    Returns:
+        str: Documento XML
+    """
+    salida = io.StringIO()
+    escribir_cfdi(id_factura, salida)
+    return salida.getvalue()
+
+
+def guardar_xml(id_factura):
+    """Genera y guarda el XML de una factura; devuelve el documento"""
+    documento = generar_xml(id_factura)
+    ejecutar_transaccion([
+        ("UPDATE Facturas SET xml = ? WHERE id_factura = ?", (documento, id_factura))
+    ])
+    return documento
+
+
+def generar_xml_pendientes(tamano_bloque=None):
+    """
+    Genera el XML de todas las facturas (no canceladas) que no lo tienen.
+
+    Los documentos se guardan en transacciones de tamano_bloque facturas.
+
+    Returns:
+        dict: total, generadas, errores (lista de (id_factura, mensaje)),
+            segundos y facturas_por_segundo
+    """
+    tamano_bloque = tamano_bloque or TAMANO_BLOQUE_ESCRITURA
+    ids = [fila[0] for fila in obtener_datos(
+        "SELECT id_factura FROM Facturas "
+        "WHERE xml IS NULL AND estado != 'cancelada' ORDER BY id_factura"
+    )]
+    reporte = {'total': len(ids), 'generadas': 0, 'errores': []}
+    inicio = time.perf_counter()
+    pendientes = []
+
+    def guardar():
+        ejecutar_transaccion([Lote(
+            "UPDATE Facturas SET xml = ? WHERE id_factura = ? AND xml IS NULL", pendientes
+        )])
+        reporte['generadas'] += len(pendientes)
+        pendientes.clear()
+
+    for id_factura in ids:
+        try:
+            pendientes.append((generar_xml(id_factura), id_factura))
+        except Exception as e:
+            reporte['errores'].append((id_factura, f"{type(e).__name__}: {e}"))
+        if len(pendientes) >= tamano_bloque:
+            guardar()
+    if pendientes:
+        guardar()
+
+    segundos = time.perf_counter() - inicio
+    reporte['segundos'] = round(segundos, 3)
+    reporte['facturas_por_segundo'] = round(reporte['total'] / segundos, 1) if segundos else 0.0
+    return reporte
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Genera el XML CFDI 4.0 de las facturas que no lo tienen"
+    )
+    parser.add_argument("--bloque", type=int, help="Facturas por transacción")
+    args = parser.parse_args(argumentos)
+
+    reporte = generar_xml_pendientes(args.bloque)
+    print(f"Facturas sin XML: {reporte['total']}")
+    print(f"XML generados:    {reporte['generadas']}")
+    print(f"Tiempo:           {reporte['segundos']} s "
+          f"({reporte['facturas_por_segundo']} facturas/s)")
+    for id_factura, error in reporte['errores']:
+        print(f"  Error en factura {id_factura}: {error}")
+    return 1 if reporte['errores'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
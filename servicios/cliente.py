@@ -0,0 +1,130 @@
+"""
+Cliente HTTP/JSON del servicio local de escrituras (servicios/servidor.py).
+
+Cada hilo mantiene su propia conexión keep-alive con el servicio. Los
+errores que el servicio reporta se vuelven a lanzar con el mismo tipo que
+tendrían en modo directo (FilasNoAfectadas, ValueError), así que las
+pantallas los manejan igual en ambos modos.
+"""
+
+import http.client
+import json
+import select
+import threading
+from db.db import FilasNoAfectadas
+from servicios.operaciones import SERVIDOR
+
+# Segundos de espera de una respuesta del servicio
+TIEMPO_ESPERA_S = 30
+
+
+class ErrorServidor(Exception):
+    """El servicio no pudo ejecutar la operación por un error inesperado"""
+
+
+def _separar_direccion(direccion):
+    host, _, puerto = direccion.rpartition(":")
+    return host or "127.0.0.1", int(puerto)
+
+
+def _cerrada_por_servidor(sock):
+    """
+    True si una conexión inactiva ya no sirve: entre peticiones el servicio
+    no envía nada, así que un socket legible significa que lo cerró (EOF).
+    """
+    try:
+        legibles, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(legibles)
+
+
+def lanzar_error(error):
+    """Vuelve a lanzar un error reportado por el servicio"""
+    if error.get('tipo') == 'FilasNoAfectadas':
+        raise FilasNoAfectadas(None, error.get('indices', []))
+    if error.get('tipo') == 'ValueError':
+        raise ValueError(error.get('mensaje'))
+    raise ErrorServidor(error.get('mensaje'))
+
+
+class ClienteServidor:
+    """
+    Envía operaciones al servicio local.
+
+    Atributos:
+        direccion (str): "host:puerto" del servicio
+    """
+
+    def __init__(self, direccion):
+        self.direccion = direccion
+        self._local = threading.local()
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.sock is not None and _cerrada_por_servidor(conn.sock):
+            # El servicio cerró la conexión inactiva (p. ej. se reinició):
+            # se descarta antes de escribir la petición
+            self._cerrar()
+            conn = None
+        if conn is None:
+            host, puerto = _separar_direccion(self.direccion)
+            conn = http.client.HTTPConnection(host, puerto, timeout=TIEMPO_ESPERA_S)
+            self._local.conn = conn
+        return conn
+
+    def _cerrar(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def solicitar(self, metodo, ruta, cuerpo=None):
+        """
+        Realiza una petición y devuelve el JSON de la respuesta.
+
+        Las conexiones que el servicio cerró se detectan antes de escribir
+        la petición. Si la conexión falla después, sólo se reintenta un GET:
+        un POST pudo haberse aplicado y repetirlo registraría la operación
+        dos veces.
+
+        Raises:
+            ConnectionError: Si el servicio no está disponible o la conexión
+                se perdió durante un POST (no se sabe si se aplicó)
+        """
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        encabezados = {'Content-Type': "application/json"}
+        for intento in range(2):
+            reutilizada = getattr(self._local, 'conn', None) is not None
+            conn = self._conexion()
+            try:
+                conn.request(metodo, ruta, body=datos, headers=encabezados)
+                respuesta = conn.getresponse()
+                return json.loads(respuesta.read() or b"null")
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                self._cerrar()
+                # Una lectura (GET) se puede repetir con una conexión nueva
+                if metodo != "GET" or not reutilizada or intento:
+                    raise ConnectionError(f"Servicio {self.direccion} no disponible: {e}") from e
+            except OSError as e:
+                self._cerrar()
+                raise ConnectionError(f"Servicio {self.direccion} no disponible: {e}") from e
+
+    def enviar(self, nombre, datos):
+        """
+        Ejecuta una operación en el servicio.
+
+        Returns:
+            dict: Resultado de la operación
+        """
+        respuesta = self.solicitar("POST", f"/operaciones/{nombre}", datos)
+        if not respuesta.get('ok'):
+            lanzar_error(respuesta.get('error') or {})
+        return respuesta['resultado']
+
+    def estado(self):
+        """Devuelve los contadores del servicio (GET /salud)"""
+        return self.solicitar("GET", "/salud")
+
+
+cliente = ClienteServidor(SERVIDOR)
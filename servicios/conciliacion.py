@@ -0,0 +1,215 @@
+"""
+Conciliación de Productos.stock_actual contra el libro de Movimientos.
+
+stock_actual es un contador que actualizan las ventas y los movimientos
+en la misma transacción que registra el movimiento; esta tarea verifica
+que siga igual a la suma de los movimientos de cada producto y reporta (o
+repara) las diferencias.
+
+Es incremental: Conciliacion_estado guarda el último id_movimiento ya
+sumado (punto de control) y Conciliacion_stock el saldo del libro de cada
+producto hasta ese punto. Cada corrida suma, en una sola pasada agrupada
+por producto, sólo los movimientos nuevos (rango sobre la llave primaria)
+y compara saldo + nuevos contra stock_actual. Los ids de Movimientos se
+asignan con el candado de escritura tomado, así que un movimiento que aún
+no se confirmó nunca queda detrás del punto de control.
+
+El libro se supone de sólo inserción: si se corrigen o borran movimientos
+ya conciliados hay que recalcularlo con reiniciar=True (--reiniciar).
+
+En una base existente la primera corrida reporta como diferencia el stock
+inicial de los productos que se dieron de alta sin movimiento; reparar con
+'libro' lo registra una sola vez como ajuste.
+
+Uso:
+    python -m servicios.conciliacion                    # sólo reporte
+    python -m servicios.conciliacion --reparar stock    # corrige stock_actual
+    python -m servicios.conciliacion --reparar libro    # registra ajustes
+"""
+
+import argparse
+import time
+from datetime import datetime
+from db.db import ejecutar_transaccion, obtener_pool, Lote
+from db.migraciones import aplicar_migraciones
+
+# Efecto de un movimiento sobre el stock. Las salidas y transferencias
+# restan aunque la cantidad se haya guardado positiva (registros anteriores
+# a que se guardara con signo); los ajustes llevan su propio signo
+EFECTO_MOVIMIENTO = """
+    CASE
+        WHEN tipo IN ('salida', 'transferencia') THEN -abs(cantidad)
+        WHEN tipo = 'entrada' THEN abs(cantidad)
+        ELSE cantidad
+    END
+    """
+
+# Referencia de los movimientos de ajuste que registra la reparación 'libro'
+REFERENCIA_AJUSTE = "Conciliación de stock"
+
+# Formas de reparar una diferencia
+REPARACIONES = ("stock", "libro")
+
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def _leer(reiniciar):
+    """
+    Lee en una misma instantánea (transacción de lectura en WAL) el punto
+    de control, el último movimiento y, por producto, stock_actual, saldo
+    del libro y suma de los movimientos nuevos.
+
+    Returns:
+        tuple: (desde, hasta, filas)
+    """
+    with obtener_pool().conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        try:
+            desde = cursor.execute(
+                "SELECT id_movimiento_hasta FROM Conciliacion_estado WHERE id = 1"
+            ).fetchone()[0]
+            hasta = cursor.execute(
+                "SELECT COALESCE(MAX(id_movimiento), 0) FROM Movimientos"
+            ).fetchone()[0]
+            saldo = "0" if reiniciar else "COALESCE(c.stock_libro, 0)"
+            filas = cursor.execute(
+                f"""
+                WITH nuevos AS (
+                    SELECT id_producto, SUM({EFECTO_MOVIMIENTO}) AS suma, COUNT(*) AS cantidad
+                    FROM Movimientos
+                    WHERE id_movimiento > ? AND id_movimiento <= ?
+                    GROUP BY id_producto
+                )
+                SELECT p.id_producto, p.nombre, COALESCE(p.stock_actual, 0),
+                       {saldo}, COALESCE(n.suma, 0), COALESCE(n.cantidad, 0)
+                FROM Productos p
+                LEFT JOIN Conciliacion_stock c ON c.id_producto = p.id_producto
+                LEFT JOIN nuevos n ON n.id_producto = p.id_producto
+                ORDER BY p.id_producto
+                """,
+                (0 if reiniciar else desde, hasta)
+            ).fetchall()
+        finally:
+            conn.rollback()
+    return desde, hasta, filas
+
+
+def conciliar(reparar=None, reiniciar=False):
+    """
+    Concilia el stock de todos los productos con el libro de movimientos y
+    avanza el punto de control.
+
+    Args:
+        reparar (str): None para sólo reportar; 'stock' para llevar
+            stock_actual al saldo del libro; 'libro' para registrar un
+            movimiento 'ajuste' por la diferencia (stock_actual se respeta)
+        reiniciar (bool): Recalcular el libro desde el primer movimiento
+
+    Returns:
+        dict: desde, hasta, movimientos (sumados en esta corrida),
+            productos, diferencias (lista de dicts con id_producto, nombre,
+            stock_actual, stock_libro y diferencia), reparadas y segundos
+
+    Raises:
+        ValueError: Si reparar no es None, 'stock' ni 'libro'
+        FilasNoAfectadas: Si otra conciliación avanzó el punto de control
+            al mismo tiempo (no se guardó nada)
+    """
+    if reparar is not None and reparar not in REPARACIONES:
+        raise ValueError(f"Reparación desconocida: {reparar}")
+    inicio = time.perf_counter()
+    desde, hasta, filas = _leer(reiniciar)
+
+    saldos, diferencias = [], []
+    movimientos = 0
+    for id_producto, nombre, stock_actual, saldo, suma, cantidad in filas:
+        movimientos += cantidad
+        libro = saldo + suma
+        if suma or (reiniciar and libro):
+            saldos.append((id_producto, libro))
+        if stock_actual != libro:
+            diferencias.append({
+                'id_producto': id_producto,
+                'nombre': nombre,
+                'stock_actual': stock_actual,
+                'stock_libro': libro,
+                'diferencia': stock_actual - libro,
+            })
+
+    fecha = datetime.now().strftime(_FORMATO_FECHA)
+    queries = [
+        # Compara y avanza: si otra corrida movió el punto de control, la
+        # transacción se revierte con FilasNoAfectadas
+        Lote(
+            "UPDATE Conciliacion_estado SET id_movimiento_hasta = ?, fecha = ? "
+            "WHERE id = 1 AND id_movimiento_hasta = ?",
+            [(hasta, fecha, desde)],
+            exigir_todas=True
+        ),
+        Lote(
+            """
+            INSERT INTO Conciliacion_stock (id_producto, stock_libro) VALUES (?, ?)
+            ON CONFLICT(id_producto) DO UPDATE SET stock_libro = excluded.stock_libro
+            """,
+            saldos
+        ),
+    ]
+    if reiniciar:
+        queries.insert(1, ("DELETE FROM Conciliacion_stock", ()))
+    if reparar == "stock" and diferencias:
+        # Restar la diferencia (no asignar el saldo) conserva las ventas
+        # posteriores a la lectura
+        queries.append(Lote(
+            "UPDATE Productos SET stock_actual = COALESCE(stock_actual, 0) - ? WHERE id_producto = ?",
+            [(d['diferencia'], d['id_producto']) for d in diferencias]
+        ))
+    elif reparar == "libro" and diferencias:
+        # Los ajustes quedan después del punto de control: la siguiente
+        # corrida los suma al saldo
+        queries.append(Lote(
+            """
+            INSERT INTO Movimientos (tipo, fecha, cantidad, id_producto, referencia)
+            VALUES ('ajuste', ?, ?, ?, ?)
+            """,
+            [(fecha, d['diferencia'], d['id_producto'], REFERENCIA_AJUSTE) for d in diferencias]
+        ))
+    ejecutar_transaccion(queries)
+
+    return {
+        'desde': 0 if reiniciar else desde,
+        'hasta': hasta,
+        'movimientos': movimientos,
+        'productos': len(filas),
+        'diferencias': diferencias,
+        'reparadas': len(diferencias) if reparar else 0,
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Concilia el stock con el libro de movimientos")
+    parser.add_argument("--reparar", choices=REPARACIONES,
+                        help="stock: corrige stock_actual; libro: registra movimientos de ajuste")
+    parser.add_argument("--reiniciar", action="store_true",
+                        help="Recalcula el libro desde el primer movimiento")
+    args = parser.parse_args(argumentos)
+
+    aplicar_migraciones()
+    reporte = conciliar(args.reparar, args.reiniciar)
+    print(f"Movimientos sumados:  {reporte['movimientos']} "
+          f"(id {reporte['desde'] + 1} a {reporte['hasta']})")
+    print(f"Productos revisados:  {reporte['productos']}")
+    print(f"Con diferencia:       {len(reporte['diferencias'])}")
+    print(f"Tiempo:               {reporte['segundos']} s")
+    for d in reporte['diferencias']:
+        print(f"  {d['id_producto']:>6} {d['nombre'][:40]:<40} "
+              f"stock {d['stock_actual']:>7}  libro {d['stock_libro']:>7}  "
+              f"diferencia {d['diferencia']:>+7}")
+    if reporte['reparadas']:
+        print(f"Reparadas ({args.reparar}): {reporte['reparadas']}")
+    return 1 if reporte['diferencias'] and not args.reparar else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,312 @@
+"""
+Generación de facturas en segundo plano.
+
+La venta registra la factura (estado 'pendiente') y un trabajo en
+Trabajos_factura dentro de la misma transacción, así que la confirmación se
+muestra en cuanto hace commit. Un hilo de trabajo toma los trabajos
+pendientes, genera el XML CFDI (servicios/cfdi.py) y el PDF y los guarda en
+Facturas.xml y Facturas.pdf cambiando el estado a 'generada'. Si falla, el
+trabajo se reintenta con espera exponencial hasta MAX_INTENTOS y después la
+factura queda en estado 'error'.
+
+Como la cola vive en la base de datos, los trabajos sobreviven a un cierre
+de la aplicación y varias terminales pueden procesarla sin duplicar
+trabajo: cada una reclama un trabajo con un UPDATE atómico.
+
+Ejemplo:
+    queries += consultas_factura(datos_factura, indice=len(queries))
+    ejecutar_transaccion(queries)
+    procesador.avisar()
+"""
+
+import threading
+import uuid
+from datetime import datetime, timedelta
+from db.db import ejecutar_query, ejecutar_transaccion, obtener_datos, IdGenerado
+from servicios.cfdi import guardar_xml
+
+# Intentos antes de marcar la factura con error
+MAX_INTENTOS = 5
+
+# Espera antes del primer reintento; se duplica en cada intento
+ESPERA_REINTENTO_S = 30
+
+# Cada cuánto revisa la cola el hilo de trabajo si nadie lo avisa
+INTERVALO_SONDEO_S = 5
+
+# Un trabajo 'procesando' más viejo que esto se considera abandonado
+TIEMPO_ABANDONO_S = 600
+
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+# Columnas de Facturas que se llenan al registrar la venta
+CAMPOS_FACTURA = (
+    "id_transaccion", "id_direccion_fiscal", "serie", "folio",
+    "fecha_emision", "lugar_expedicion", "forma_pago", "metodo_pago",
+    "uso_cfdi", "nombre_cliente", "rfc_cliente", "subtotal", "iva", "total", "estado"
+)
+
+
+def _ahora(segundos=0):
+    return (datetime.now() + timedelta(seconds=segundos)).strftime(_FORMATO_FECHA)
+
+
+def consultas_factura(datos, indice):
+    """
+    Sentencias para registrar una factura y encolar la generación de su PDF.
+
+    Se agregan a las queries de la venta para que todo quede en un commit.
+
+    Args:
+        datos (dict): Valores de CAMPOS_FACTURA (pueden ser IdGenerado)
+        indice (int): Posición que tendrá el INSERT de la factura en la
+            lista de queries
+
+    Returns:
+        list: Tuplas (query, parametros) para ejecutar_transaccion
+    """
+    columnas = ", ".join(CAMPOS_FACTURA)
+    marcadores = ", ".join("?" for _ in CAMPOS_FACTURA)
+    return [
+        (
+            f"INSERT INTO Facturas ({columnas}) VALUES ({marcadores})",
+            tuple(datos[campo] for campo in CAMPOS_FACTURA)
+        ),
+        (
+            "INSERT INTO Trabajos_factura (id_factura, proximo_intento) VALUES (?, ?)",
+            (IdGenerado(indice), _ahora())
+        ),
+    ]
+
+
+def encolar_factura(id_factura):
+    """Encola (de nuevo) la generación del PDF de una factura existente"""
+    return ejecutar_query(
+        "INSERT INTO Trabajos_factura (id_factura, proximo_intento) VALUES (?, ?)",
+        (id_factura, _ahora())
+    )
+
+
+class PlantillaFactura:
+    """
+    Diseño del PDF de factura.
+
+    Se crea una sola vez (por proceso) y se reutiliza para cada documento:
+    importa fpdf y prepara las líneas con su formato.
+    """
+
+    # (texto, alineación) de cada renglón; los campos vienen de Facturas
+    LINEAS = (
+        # Cabecera
+        ("Factura {serie}-{folio}", 'C'),
+        ("Fecha: {fecha_emision}", ''),
+        # Datos del cliente
+        ("Cliente: {nombre_cliente}", ''),
+        ("RFC: {rfc_cliente}", ''),
+        # Totales
+        ("Subtotal: ${subtotal:.2f}", ''),
+        ("IVA: ${iva:.2f}", ''),
+        ("Total: ${total:.2f}", ''),
+    )
+
+    def __init__(self):
+        from fpdf import FPDF
+        self._fpdf = FPDF
+
+    def generar(self, datos):
+        pdf = self._fpdf()
+        pdf.add_page()
+        pdf.set_font("Arial", size=12)
+        valores = dict(datos)
+        for texto, alineacion in self.LINEAS:
+            pdf.cell(200, 10, txt=texto.format(**valores), ln=1, align=alineacion)
+        return bytes(pdf.output())
+
+
+_plantilla = None
+
+
+def generar_pdf(datos):
+    """
+    Genera el PDF básico de una factura.
+
+    Args:
+        datos (dict | sqlite3.Row): Fila de Facturas
+
+    Returns:
+        bytes: Contenido del PDF
+
+    Raises:
+        ImportError: Si fpdf2 no está instalado
+    """
+    global _plantilla
+    if _plantilla is None:
+        _plantilla = PlantillaFactura()
+    return _plantilla.generar(datos)
+
+
+def obtener_pdf(id_factura):
+    """
+    Devuelve el PDF guardado de una factura.
+
+    Returns:
+        bytes | None: Contenido del PDF, o None si aún no se genera
+    """
+    filas = obtener_datos("SELECT pdf FROM Facturas WHERE id_factura = ?", (id_factura,))
+    return filas[0][0] if filas else None
+
+
+class ProcesadorFacturas:
+    """
+    Hilo que procesa la cola Trabajos_factura.
+
+    Atributos:
+        generador (function): Recibe la fila de Facturas y devuelve los bytes
+            del PDF (generar_pdf por defecto)
+    """
+
+    def __init__(self, generador=None):
+        self.generador = generador or generar_pdf
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        """Arranca el hilo de trabajo (una sola vez)"""
+        if self._hilo is not None:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._trabajar, name="facturas", daemon=True)
+        self._hilo.start()
+
+    def avisar(self):
+        """Despierta al hilo de trabajo (p. ej. después de registrar una venta)"""
+        self._aviso.set()
+
+    def detener(self, espera=None):
+        """Detiene el hilo; el trabajo en curso, si lo hay, se completa"""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._aviso.set()
+        self._hilo.join(espera)
+        self._hilo = None
+
+    def _trabajar(self):
+        try:
+            self.recuperar_abandonados()
+        except Exception as e:
+            print(f"Error en la cola de facturas: {e}")
+        while not self._detener.is_set():
+            try:
+                procesado = self.procesar_siguiente()
+            except Exception as e:
+                # Base bloqueada o cerrada: reintentar en el siguiente ciclo
+                print(f"Error en la cola de facturas: {e}")
+                procesado = False
+            if not procesado:
+                self._aviso.wait(INTERVALO_SONDEO_S)
+                self._aviso.clear()
+
+    def recuperar_abandonados(self):
+        """Regresa a 'pendiente' los trabajos de una terminal que se cerró a medias"""
+        ejecutar_query(
+            """
+            UPDATE Trabajos_factura
+            SET estado = 'pendiente', tomado_por = NULL
+            WHERE estado = 'procesando' AND fecha_tomado < ?
+            """,
+            (_ahora(-TIEMPO_ABANDONO_S),)
+        )
+
+    def _reclamar(self):
+        """Marca como propio el siguiente trabajo listo; devuelve su fila o None"""
+        # Sondeo de sólo lectura: con la cola vacía no se toma el candado
+        # de escritura cada INTERVALO_SONDEO_S
+        listos = obtener_datos(
+            """
+            SELECT id_trabajo FROM Trabajos_factura
+            WHERE estado = 'pendiente' AND proximo_intento <= ?
+            ORDER BY id_trabajo LIMIT 1
+            """,
+            (_ahora(),)
+        )
+        if not listos:
+            return None
+        # Otra terminal pudo tomarlo entre la lectura y el UPDATE: la
+        # condición sobre el estado lo deja sin reclamar
+        token = uuid.uuid4().hex
+        ejecutar_query(
+            """
+            UPDATE Trabajos_factura
+            SET estado = 'procesando', intentos = intentos + 1,
+                tomado_por = ?, fecha_tomado = ?
+            WHERE id_trabajo = ? AND estado = 'pendiente'
+            """,
+            (token, _ahora(), listos[0][0])
+        )
+        filas = obtener_datos(
+            "SELECT id_trabajo, id_factura, intentos FROM Trabajos_factura WHERE tomado_por = ?",
+            (token,)
+        )
+        return filas[0] if filas else None
+
+    def procesar_siguiente(self):
+        """
+        Procesa un trabajo pendiente.
+
+        Returns:
+            bool: True si había un trabajo (con o sin éxito)
+        """
+        trabajo = self._reclamar()
+        if trabajo is None:
+            return False
+        id_trabajo, id_factura, intentos = trabajo
+
+        try:
+            filas = obtener_datos("SELECT * FROM Facturas WHERE id_factura = ?", (id_factura,))
+            if not filas:
+                raise LookupError(f"No existe la factura {id_factura}")
+            # El XML no depende de fpdf: se guarda aunque falle el PDF
+            if filas[0]['xml'] is None:
+                guardar_xml(id_factura)
+            contenido = self.generador(filas[0])
+        except Exception as e:
+            self._registrar_fallo(id_trabajo, id_factura, intentos, e)
+            return True
+
+        ejecutar_transaccion([
+            (
+                "UPDATE Facturas SET pdf = ?, estado = 'generada' WHERE id_factura = ?",
+                (contenido, id_factura)
+            ),
+            (
+                "UPDATE Trabajos_factura SET estado = 'terminado', error = NULL WHERE id_trabajo = ?",
+                (id_trabajo,)
+            ),
+        ])
+        return True
+
+    def _registrar_fallo(self, id_trabajo, id_factura, intentos, error):
+        mensaje = f"{type(error).__name__}: {error}"
+        if intentos >= MAX_INTENTOS:
+            ejecutar_transaccion([
+                (
+                    "UPDATE Trabajos_factura SET estado = 'fallido', error = ? WHERE id_trabajo = ?",
+                    (mensaje, id_trabajo)
+                ),
+                ("UPDATE Facturas SET estado = 'error' WHERE id_factura = ?", (id_factura,)),
+            ])
+            return
+        espera = ESPERA_REINTENTO_S * 2 ** (intentos - 1)
+        ejecutar_query(
+            """
+            UPDATE Trabajos_factura
+            SET estado = 'pendiente', tomado_por = NULL, error = ?, proximo_intento = ?
+            WHERE id_trabajo = ?
+            """,
+            (mensaje, _ahora(espera), id_trabajo)
+        )
+
+
+procesador = ProcesadorFacturas()
@@ -0,0 +1,311 @@
+"""
+Operaciones de escritura de las pantallas (ventas, movimientos, productos,
+clientes).
+
+Cada operación recibe un diccionario con datos simples (serializable a
+JSON) y arma las queries de su transacción, así que se ejecuta igual en la
+terminal o en el servicio local (servicios/servidor.py):
+
+    - Sin VENTAS_SERVIDOR, ejecutar_operacion escribe directamente en el
+      archivo SQLite con ejecutar_transaccion.
+    - Con VENTAS_SERVIDOR=host:puerto, la operación se envía al servicio,
+      que serializa todas las escrituras en un solo escritor con group
+      commit. Las lecturas siguen yendo directo al archivo (WAL).
+
+Ejemplo:
+    resultado = ejecutar_operacion("movimiento", {
+        'id_producto': 3, 'tipo': "entrada", 'cantidad': 10, 'referencia': "",
+    })
+"""
+
+import os
+from datetime import datetime
+from db.db import ejecutar_transaccion, ejecutar_transacciones_agrupadas, Lote, IdGenerado
+from db.cache import cache
+from servicios.facturacion import consultas_factura, procesador
+
+# Dirección del servicio local de escrituras ("host:puerto"); vacío = modo directo
+SERVIDOR = os.environ.get("VENTAS_SERVIDOR", "").strip()
+
+# Tasa de IVA aplicada a cada artículo
+TASA_IVA = 0.16
+
+_FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def _venta(datos):
+    """
+    Venta con sus detalles, descuento de stock, movimientos y factura.
+
+    datos:
+        id_cliente, id_medio_pago, subtotal, impuestos, total, moneda,
+        descuento_global (fracción), articulos (lista de id_producto,
+        cantidad, precio, descuento) y factura (dict de CAMPOS_FACTURA sin
+        id_transaccion ni folio, o None)
+    """
+    articulos = datos['articulos']
+    if not articulos:
+        raise ValueError("La venta no tiene artículos")
+    fecha = datetime.now().strftime(_FORMATO_FECHA)
+    queries = [(
+        """
+        INSERT INTO Transacciones (
+            tipo, fecha, id_cliente, id_medio_pago,
+            subtotal, impuestos, total, moneda, estado
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            "venta", fecha, datos.get('id_cliente'), datos['id_medio_pago'],
+            datos['subtotal'], datos['impuestos'], datos['total'],
+            datos.get('moneda') or "MXN", "completada"
+        )
+    )]
+
+    detalles, stock, movimientos = [], [], []
+    descuento_global = datos.get('descuento_global') or 0
+    for item in articulos:
+        importe = item['precio'] * item['cantidad']
+        descuento = importe * (descuento_global + (item.get('descuento') or 0))
+        detalles.append((
+            IdGenerado(0), item['id_producto'], item['cantidad'],
+            item['precio'], descuento, (importe - descuento) * TASA_IVA
+        ))
+        stock.append((item['cantidad'], item['id_producto'], item['cantidad']))
+        movimientos.append((
+            "salida", fecha, -item['cantidad'], item['id_producto'], IdGenerado(0, "Venta {}")
+        ))
+
+    queries.append(Lote(
+        """
+        INSERT INTO Detalle_transaccion (
+            id_transaccion, id_producto, cantidad,
+            precio_unitario, descuento, iva_aplicado
+        ) VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        detalles
+    ))
+    # Sólo descuenta si alcanza; si no, FilasNoAfectadas con los índices
+    # de los artículos sin stock
+    queries.append(Lote(
+        """
+        UPDATE Productos
+        SET stock_actual = stock_actual - ?
+        WHERE id_producto = ? AND stock_actual >= ?
+        """,
+        stock,
+        exigir_todas=True
+    ))
+    queries.append(Lote(
+        """
+        INSERT INTO Movimientos (
+            tipo, fecha, cantidad, id_producto, referencia
+        ) VALUES (?, ?, ?, ?, ?)
+        """,
+        movimientos
+    ))
+
+    factura = datos.get('factura')
+    if factura:
+        factura = dict(factura, id_transaccion=IdGenerado(0), folio=IdGenerado(0, "FAC-{:04d}"))
+        queries.extend(consultas_factura(factura, indice=len(queries)))
+
+    def resultado(ids):
+        if factura:
+            procesador.avisar()  # El PDF se genera en segundo plano
+        return {'id_transaccion': ids[0]}
+
+    return queries, resultado
+
+
+def _movimiento(datos):
+    """
+    Movimiento de inventario con su ajuste de stock.
+
+    datos: id_producto, tipo (entrada, salida, ajuste, transferencia),
+        cantidad (positiva) y referencia
+    """
+    cantidad = int(datos['cantidad'])
+    if cantidad <= 0:
+        raise ValueError("La cantidad debe ser mayor a cero")
+    if datos['tipo'] in ('salida', 'transferencia'):
+        cantidad = -cantidad
+
+    queries = [
+        (
+            """INSERT INTO Movimientos (
+                tipo, fecha, cantidad, id_producto, referencia
+            ) VALUES (?, datetime('now'), ?, ?, ?)""",
+            (datos['tipo'], cantidad, datos['id_producto'], datos.get('referencia') or "")
+        ),
+    ]
+    if cantidad < 0:
+        # Las salidas no pueden dejar el stock en negativo aunque otra
+        # terminal haya vendido después de la validación de la pantalla
+        queries.append(Lote(
+            """UPDATE Productos
+            SET stock_actual = stock_actual + ?
+            WHERE id_producto = ? AND stock_actual + ? >= 0""",
+            [(cantidad, datos['id_producto'], cantidad)],
+            exigir_todas=True
+        ))
+    else:
+        # Una entrada siempre se aplica, también para corregir un stock
+        # que ya quedó negativo
+        queries.append((
+            "UPDATE Productos SET stock_actual = stock_actual + ? WHERE id_producto = ?",
+            (cantidad, datos['id_producto'])
+        ))
+    return queries, lambda ids: {'id_movimiento': ids[0]}
+
+
+# Columnas de Productos que se capturan en el alta
+CAMPOS_PRODUCTO = (
+    "nombre", "descripcion", "precio_venta", "costo", "codigo_barras", "sku",
+    "stock_minimo", "stock_maximo", "stock_actual", "id_categoria", "id_proveedor"
+)
+
+
+def _alta_producto(datos):
+    """Alta de producto con su stock inicial; datos: valores de CAMPOS_PRODUCTO"""
+    if not (datos.get('nombre') or "").strip():
+        raise ValueError("El campo Nombre es obligatorio")
+    queries = [(
+        f"""INSERT INTO Productos
+        ({', '.join(CAMPOS_PRODUCTO)}, fecha_creacion, estado)
+        VALUES ({', '.join('?' for _ in CAMPOS_PRODUCTO)}, datetime('now'), 1)""",
+        tuple(datos.get(campo) for campo in CAMPOS_PRODUCTO)
+    )]
+    if datos.get('stock_actual'):
+        # El stock inicial también entra al libro de movimientos, que es
+        # contra lo que se concilia stock_actual (servicios/conciliacion.py)
+        queries.append((
+            """INSERT INTO Movimientos (
+                tipo, fecha, cantidad, id_producto, referencia
+            ) VALUES ('entrada', datetime('now'), ?, ?, 'Stock inicial')""",
+            (int(datos['stock_actual']), IdGenerado(0))
+        ))
+    return queries, lambda ids: {'id_producto': ids[0]}
+
+
+# Columnas de Clientes que se capturan en el alta
+CAMPOS_CLIENTE = (
+    "nombres", "apellido_p", "apellido_m", "tipo_persona",
+    "rfc", "correo", "telefono", "estado"
+)
+
+
+def _alta_cliente(datos):
+    """Alta de cliente; datos: valores de CAMPOS_CLIENTE"""
+    if not (datos.get('nombres') or "").strip():
+        raise ValueError("El campo Nombres es obligatorio")
+    queries = [(
+        f"""INSERT INTO Clientes
+        ({', '.join(CAMPOS_CLIENTE)}, fecha_registro)
+        VALUES ({', '.join('?' for _ in CAMPOS_CLIENTE)}, datetime('now'))""",
+        tuple(datos.get(campo) for campo in CAMPOS_CLIENTE)
+    )]
+    return queries, lambda ids: {'id_cliente': ids[0]}
+
+
+def _estado_cliente(datos):
+    """Activa o desactiva un cliente; datos: id_cliente y estado (0/1)"""
+    queries = [Lote(
+        "UPDATE Clientes SET estado = ? WHERE id_cliente = ?",
+        [(int(datos['estado']), datos['id_cliente'])],
+        exigir_todas=True
+    )]
+    return queries, lambda ids: {}
+
+
+# Nombre -> función que recibe los datos y devuelve (queries, resultado);
+# resultado recibe los ids de ejecutar_transaccion y arma la respuesta
+OPERACIONES = {
+    'venta': _venta,
+    'movimiento': _movimiento,
+    'producto': _alta_producto,
+    'cliente': _alta_cliente,
+    'estado_cliente': _estado_cliente,
+}
+
+
+def preparar_operacion(nombre, datos):
+    """
+    Arma las queries de una operación.
+
+    Returns:
+        tuple: (queries, resultado) según OPERACIONES
+
+    Raises:
+        ValueError: Si la operación no existe o los datos no son válidos
+    """
+    try:
+        preparar = OPERACIONES[nombre]
+    except KeyError:
+        raise ValueError(f"Operación desconocida: {nombre}") from None
+    if not isinstance(datos, dict):
+        raise ValueError(f"Los datos de '{nombre}' deben ser un objeto")
+    try:
+        return preparar(datos)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Datos incompletos para '{nombre}': {e}") from None
+
+
+def aplicar_operaciones(solicitudes):
+    """
+    Ejecuta varias operaciones con un solo commit (ver
+    ejecutar_transacciones_agrupadas); una operación fallida no afecta a
+    las demás.
+
+    Args:
+        solicitudes (list): Tuplas (nombre, datos)
+
+    Returns:
+        list: Por cada solicitud, el resultado (dict) o la excepción
+    """
+    respuestas = [None] * len(solicitudes)
+    preparadas = []  # (posición, queries, resultado)
+    for i, (nombre, datos) in enumerate(solicitudes):
+        try:
+            queries, resultado = preparar_operacion(nombre, datos)
+        except ValueError as e:
+            respuestas[i] = e
+        else:
+            preparadas.append((i, queries, resultado))
+
+    if preparadas:
+        ids_por_operacion = ejecutar_transacciones_agrupadas([q for _, q, _ in preparadas])
+        for (i, _, resultado), ids in zip(preparadas, ids_por_operacion):
+            respuestas[i] = ids if isinstance(ids, Exception) else resultado(ids)
+    return respuestas
+
+
+def _registrar_escrituras(queries):
+    """Invalida la caché local de las tablas que escribió el servicio"""
+    for entrada in queries:
+        cache.registrar_escritura(entrada.query if isinstance(entrada, Lote) else entrada[0])
+
+
+def ejecutar_operacion(nombre, datos):
+    """
+    Ejecuta una operación en modo directo o a través del servicio local.
+
+    Args:
+        nombre (str): Clave de OPERACIONES
+        datos (dict): Datos de la operación
+
+    Returns:
+        dict: Resultado de la operación (p. ej. {'id_transaccion': 15})
+
+    Raises:
+        FilasNoAfectadas: Si un UPDATE condicional (stock) no se cumplió
+        ValueError: Si los datos no son válidos
+        ConnectionError: Si el servicio no responde (modo cliente)
+    """
+    queries, resultado = preparar_operacion(nombre, datos)
+    if not SERVIDOR:
+        return resultado(ejecutar_transaccion(queries, devolver_ids=True))
+
+    from servicios.cliente import cliente
+    respuesta = cliente.enviar(nombre, datos)
+    _registrar_escrituras(queries)
+    return respuesta
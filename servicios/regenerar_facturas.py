@@ -0,0 +1,165 @@
+"""
+Regeneración masiva de PDF de facturas con un pool de procesos.
+
+Sirve para volver a generar cientos de facturas después de cambiar la
+plantilla o corregir datos como lugar_expedicion. El proceso principal lee
+las facturas por lotes (lectura en WAL, no bloquea a las terminales), los
+procesos de trabajo sólo generan los PDF (cada uno crea su PlantillaFactura
+una vez, con la primera factura) y los resultados se escriben en
+transacciones cortas de TAMANO_BLOQUE_ESCRITURA facturas para no retener el
+candado de escritura.
+
+Uso:
+    python -m servicios.regenerar_facturas --desde 2024-01-01 --hasta 2024-06-30
+    python -m servicios.regenerar_facturas --folios FAC-0063,FAC-0068 --procesos 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from db.db import ejecutar_transaccion, iterar_datos, Lote
+from servicios import facturacion
+
+# Facturas por transacción al guardar los PDF
+TAMANO_BLOQUE_ESCRITURA = 50
+
+# Facturas que se envían juntas a cada proceso
+TAMANO_BLOQUE_PROCESO = 8
+
+_generador = None
+
+
+def _iniciar_proceso(generador):
+    """
+    Inicializador de cada proceso. No crea la plantilla: si fallara aquí
+    (p. ej. sin fpdf) el pool reemplazaría el proceso indefinidamente.
+    """
+    global _generador
+    _generador = generador
+
+
+def _generar(datos):
+    """Genera un PDF en un proceso de trabajo; nunca lanza excepciones"""
+    global _generador
+    try:
+        if _generador is None:
+            # Una sola vez por proceso; si falla, el error se reporta en
+            # cada factura y se vuelve a intentar con la siguiente
+            _generador = facturacion.PlantillaFactura().generar
+        return datos['id_factura'], _generador(datos), None
+    except Exception as e:
+        return datos['id_factura'], None, f"{type(e).__name__}: {e}"
+
+
+def _consulta_facturas(desde=None, hasta=None, folios=None):
+    condiciones, parametros = [], []
+    if desde:
+        condiciones.append("fecha_emision >= ?")
+        parametros.append(desde)
+    if hasta:
+        # fecha_emision incluye la hora: el límite superior abarca todo el día
+        condiciones.append("fecha_emision < date(?, '+1 day')")
+        parametros.append(hasta)
+    if folios:
+        condiciones.append(f"folio IN ({', '.join('?' for _ in folios)})")
+        parametros.extend(folios)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return f"SELECT * FROM Facturas {where} ORDER BY id_factura", tuple(parametros)
+
+
+def _leer_facturas(query, parametros):
+    """Entrega las facturas como diccionarios (enviables a otros procesos)"""
+    for lote in iterar_datos(query, parametros):
+        for fila in lote:
+            datos = dict(fila)
+            datos.pop('pdf', None)  # No hace falta enviar el PDF anterior
+            yield datos
+
+
+def _guardar(resultados):
+    """Escribe un bloque de PDF generados en una sola transacción"""
+    ejecutar_transaccion([Lote(
+        """
+        UPDATE Facturas
+        SET pdf = ?,
+            estado = CASE WHEN estado IN ('pendiente', 'error') THEN 'generada' ELSE estado END
+        WHERE id_factura = ?
+        """,
+        [(contenido, id_factura) for id_factura, contenido in resultados]
+    )])
+
+
+def regenerar_facturas(desde=None, hasta=None, folios=None, procesos=None, generador=None):
+    """
+    Regenera los PDF de las facturas seleccionadas.
+
+    Args:
+        desde (str): Fecha de emisión inicial (YYYY-MM-DD)
+        hasta (str): Fecha de emisión final, inclusive (YYYY-MM-DD)
+        folios (list): Folios a regenerar
+        procesos (int): Procesos de trabajo (por defecto, uno por núcleo)
+        generador (function): Función de nivel de módulo que recibe los datos
+            de la factura y devuelve el PDF; por defecto PlantillaFactura
+
+    Returns:
+        dict: total, generadas, errores (lista de (id_factura, mensaje)),
+            segundos y facturas_por_segundo
+    """
+    procesos = procesos or os.cpu_count() or 1
+    query, parametros = _consulta_facturas(desde, hasta, folios)
+    reporte = {'total': 0, 'generadas': 0, 'errores': []}
+    pendientes = []
+    inicio = time.perf_counter()
+
+    # spawn: los procesos no heredan las conexiones SQLite del proceso principal
+    contexto = multiprocessing.get_context("spawn")
+    with contexto.Pool(procesos, initializer=_iniciar_proceso, initargs=(generador,)) as pool:
+        resultados = pool.imap_unordered(
+            _generar, _leer_facturas(query, parametros), chunksize=TAMANO_BLOQUE_PROCESO
+        )
+        for id_factura, contenido, error in resultados:
+            reporte['total'] += 1
+            if error:
+                reporte['errores'].append((id_factura, error))
+                continue
+            pendientes.append((id_factura, contenido))
+            if len(pendientes) >= TAMANO_BLOQUE_ESCRITURA:
+                _guardar(pendientes)
+                reporte['generadas'] += len(pendientes)
+                pendientes = []
+
+    if pendientes:
+        _guardar(pendientes)
+        reporte['generadas'] += len(pendientes)
+
+    segundos = time.perf_counter() - inicio
+    reporte['segundos'] = round(segundos, 3)
+    reporte['facturas_por_segundo'] = round(reporte['total'] / segundos, 1) if segundos else 0.0
+    return reporte
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Regenera los PDF de facturas")
+    parser.add_argument("--desde", help="Fecha de emisión inicial (YYYY-MM-DD)")
+    parser.add_argument("--hasta", help="Fecha de emisión final (YYYY-MM-DD)")
+    parser.add_argument("--folios", help="Folios separados por comas")
+    parser.add_argument("--procesos", type=int, help="Procesos de trabajo (uno por núcleo)")
+    args = parser.parse_args(argumentos)
+
+    folios = [f.strip() for f in args.folios.split(",") if f.strip()] if args.folios else None
+    if not (args.desde or args.hasta or folios):
+        parser.error("Indique un rango de fechas (--desde/--hasta) o --folios")
+
+    reporte = regenerar_facturas(args.desde, args.hasta, folios, args.procesos)
+    print(f"Facturas procesadas: {reporte['total']}")
+    print(f"PDF generados:       {reporte['generadas']}")
+    print(f"Tiempo:              {reporte['segundos']} s "
+          f"({reporte['facturas_por_segundo']} facturas/s)")
+    for id_factura, error in reporte['errores']:
+        print(f"  Error en factura {id_factura}: {error}")
+    return 1 if reporte['errores'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,238 @@
+"""
+Servicio local de escrituras para varias terminales.
+
+Un servidor HTTP/JSON pequeño (asyncio, sin dependencias) que es dueño de
+las escrituras en la base de datos: las terminales envían sus operaciones
+(ver servicios/operaciones.py) y una sola tarea escritora las ejecuta. Las
+operaciones que llegan mientras se hace un commit se acumulan y se
+confirman juntas en el siguiente (group commit), cada una en su propio
+SAVEPOINT. Así no hay competencia por el candado de SQLite entre
+terminales y el costo del commit se reparte entre todas las operaciones
+del grupo.
+
+Las lecturas no pasan por el servicio: las terminales siguen leyendo el
+archivo directamente (WAL).
+
+Rutas:
+    POST /operaciones/<nombre>   cuerpo: datos de la operación (JSON)
+        -> {"ok": true, "resultado": {...}}
+        -> {"ok": false, "error": {"tipo": ..., "mensaje": ..., "indices": [...]}}
+    GET /salud                   contadores del servicio
+
+Uso:
+    python -m servicios.servidor --puerto 8765
+    VENTAS_SERVIDOR=127.0.0.1:8765 python main.py    # en cada terminal
+"""
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from db.cambios import depurar_cambios
+from db.db import FilasNoAfectadas, cerrar_conexiones
+from db.migraciones import aplicar_migraciones
+from servicios.facturacion import procesador
+from servicios.operaciones import aplicar_operaciones
+
+HOST = "127.0.0.1"
+PUERTO = 8765
+
+# Máximo de operaciones confirmadas en un mismo commit
+MAX_OPERACIONES_POR_COMMIT = 64
+
+# Tamaño máximo del cuerpo de una petición (bytes)
+MAX_CUERPO = 1024 * 1024
+
+_ESTADOS_HTTP = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large"}
+
+
+def _error(e):
+    """Representación JSON de la excepción de una operación"""
+    error = {'tipo': type(e).__name__, 'mensaje': str(e)}
+    if isinstance(e, FilasNoAfectadas):
+        error['indices'] = e.indices
+    return error
+
+
+class ServidorVentas:
+    """
+    Servidor HTTP con una única tarea escritora.
+
+    Atributos:
+        host (str): Interfaz de escucha (sólo localhost por defecto)
+        puerto (int): Puerto TCP (0 = cualquiera libre)
+    """
+
+    def __init__(self, host=HOST, puerto=PUERTO):
+        self.host = host
+        self.puerto = puerto
+        self._cola = None
+        self._servidor = None
+        self._tarea_escritora = None
+        # Un solo hilo: las escrituras nunca se ejecutan en paralelo
+        self._hilo_escritura = ThreadPoolExecutor(1, thread_name_prefix="escritor")
+        self._stats = {'operaciones': 0, 'errores': 0, 'commits': 0, 'max_grupo': 0}
+
+    async def iniciar(self):
+        """Abre el puerto y arranca la tarea escritora"""
+        self._cola = asyncio.Queue()
+        self._tarea_escritora = asyncio.create_task(self._escribir())
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.puerto)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        """Deja de aceptar conexiones y termina las escrituras pendientes"""
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        if self._tarea_escritora is not None:
+            await self._cola.put(None)
+            await self._tarea_escritora
+        self._hilo_escritura.shutdown()
+
+    async def ejecutar(self, nombre, datos):
+        """
+        Encola una operación y espera su resultado.
+
+        Returns:
+            dict: Resultado de la operación
+
+        Raises:
+            Exception: La excepción con la que se revirtió la operación
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put((nombre, datos, futuro))
+        return await futuro
+
+    async def _escribir(self):
+        """Tarea escritora: toma lo acumulado en la cola y lo confirma junto"""
+        loop = asyncio.get_running_loop()
+        terminar = False
+        while not terminar:
+            pendiente = await self._cola.get()
+            if pendiente is None:
+                break
+            grupo = [pendiente]
+            while len(grupo) < MAX_OPERACIONES_POR_COMMIT and not self._cola.empty():
+                pendiente = self._cola.get_nowait()
+                if pendiente is None:
+                    terminar = True
+                    break
+                grupo.append(pendiente)
+
+            solicitudes = [(nombre, datos) for nombre, datos, _ in grupo]
+            try:
+                respuestas = await loop.run_in_executor(
+                    self._hilo_escritura, aplicar_operaciones, solicitudes
+                )
+            except Exception as e:
+                # Falló el commit: ninguna operación del grupo se guardó
+                respuestas = [e] * len(grupo)
+            else:
+                self._stats['commits'] += 1
+                self._stats['max_grupo'] = max(self._stats['max_grupo'], len(grupo))
+
+            for (_, _, futuro), respuesta in zip(grupo, respuestas):
+                self._stats['operaciones'] += 1
+                if futuro.done():
+                    continue  # El cliente se desconectó
+                if isinstance(respuesta, Exception):
+                    self._stats['errores'] += 1
+                    futuro.set_exception(respuesta)
+                else:
+                    futuro.set_result(respuesta)
+
+    async def _despachar(self, metodo, ruta, cuerpo):
+        """Devuelve (estado_http, respuesta) de una petición"""
+        if metodo == "GET" and ruta == "/salud":
+            return 200, dict(self._stats, ok=True, en_cola=self._cola.qsize())
+
+        prefijo = "/operaciones/"
+        if metodo != "POST" or not ruta.startswith(prefijo):
+            return 404, {'ok': False, 'error': {'tipo': "NoEncontrado", 'mensaje': ruta}}
+        try:
+            datos = json.loads(cuerpo or b"{}")
+        except ValueError as e:
+            return 400, {'ok': False, 'error': {'tipo': "ValueError", 'mensaje': f"JSON inválido: {e}"}}
+
+        try:
+            resultado = await self.ejecutar(ruta[len(prefijo):], datos)
+        except Exception as e:
+            return 200, {'ok': False, 'error': _error(e)}
+        return 200, {'ok': True, 'resultado': resultado}
+
+    async def _atender(self, lector, escritor):
+        """Atiende las peticiones de una conexión (HTTP/1.1 keep-alive)"""
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea.strip():
+                    break
+                metodo, ruta, _ = linea.decode("latin-1").split(" ", 2)
+
+                encabezados = {}
+                while True:
+                    linea = await lector.readline()
+                    if linea in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = linea.decode("latin-1").partition(":")
+                    encabezados[nombre.strip().lower()] = valor.strip()
+
+                largo = int(encabezados.get('content-length') or 0)
+                if largo > MAX_CUERPO:
+                    estado, respuesta = 413, {'ok': False, 'error': {
+                        'tipo': "ValueError", 'mensaje': "Petición demasiado grande"}}
+                    cerrar = True
+                else:
+                    cuerpo = await lector.readexactly(largo) if largo else b""
+                    estado, respuesta = await self._despachar(metodo, ruta, cuerpo)
+                    cerrar = encabezados.get('connection', "").lower() == "close"
+
+                contenido = json.dumps(respuesta).encode()
+                escritor.write(
+                    f"HTTP/1.1 {estado} {_ESTADOS_HTTP[estado]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(contenido)}\r\n"
+                    f"Connection: {'close' if cerrar else 'keep-alive'}\r\n\r\n".encode("latin-1")
+                    + contenido
+                )
+                await escritor.drain()
+                if cerrar:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Petición mal formada o cliente desconectado
+        finally:
+            escritor.close()
+
+
+async def _servir(host, puerto):
+    servidor = ServidorVentas(host, puerto)
+    await servidor.iniciar()
+    print(f"Servicio de ventas en http://{servidor.host}:{servidor.puerto}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servidor.detener()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Servicio local de escrituras de ventas")
+    parser.add_argument("--host", default=HOST, help="Interfaz de escucha (127.0.0.1)")
+    parser.add_argument("--puerto", type=int, default=PUERTO, help="Puerto TCP")
+    args = parser.parse_args(argumentos)
+
+    aplicar_migraciones()
+    depurar_cambios()
+    procesador.iniciar()  # Las facturas de las ventas recibidas se generan aquí
+    try:
+        asyncio.run(_servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        procesador.detener(5)
+        cerrar_conexiones()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,253 @@
+"""
+Motor de ventas sin interfaz: carrito, descuentos, IVA y registro.
+
+La pantalla de punto de venta sólo captura y muestra; las reglas viven
+aquí para que un script (p. ej. benchmarks/bench_ventas.py) pueda armar y
+registrar ventas igual que la pantalla.
+
+Ejemplo:
+    carrito = CarritoVenta()
+    carrito.agregar(producto, cantidad=2)
+    carrito.aplicar_descuento(10)                  # 10 % a toda la venta
+    id_transaccion = motor.registrar(carrito, id_medio_pago=1)
+"""
+
+from collections import namedtuple
+from db.db import FilasNoAfectadas
+from servicios.operaciones import TASA_IVA, aplicar_operaciones, ejecutar_operacion
+
+Totales = namedtuple("Totales", "subtotal descuento iva total")
+
+
+class StockInsuficiente(Exception):
+    """
+    No hay stock para los artículos indicados.
+
+    Atributos:
+        articulos (list): Artículos del carrito afectados (vacía si el
+            error ocurrió al agregar)
+    """
+
+    def __init__(self, mensaje, articulos=()):
+        super().__init__(mensaje)
+        self.articulos = list(articulos)
+
+
+class CarritoVenta:
+    """
+    Artículos de una venta con sus descuentos.
+
+    Los totales se mantienen con acumulados que se ajustan en cada cambio,
+    así que consultarlos no recorre el carrito.
+
+    Atributos:
+        articulos (dict): id_producto -> artículo (id_producto, nombre,
+            precio, cantidad, descuento), en orden de captura
+        descuento_global (float): Fracción de descuento de toda la venta
+    """
+
+    def __init__(self):
+        self.articulos = {}
+        self.descuento_global = 0.0
+        self._importe_bruto = 0.0       # Σ precio * cantidad
+        self._descuento_articulos = 0.0  # Σ precio * cantidad * descuento individual
+
+    def __len__(self):
+        return len(self.articulos)
+
+    def __iter__(self):
+        return iter(self.articulos.values())
+
+    def __getitem__(self, id_producto):
+        return self.articulos[id_producto]
+
+    def _acumular(self, item, signo):
+        """Sumar (signo=1) o restar (signo=-1) un artículo de los acumulados"""
+        importe = item["precio"] * item["cantidad"]
+        self._importe_bruto += signo * importe
+        self._descuento_articulos += signo * importe * item["descuento"]
+
+    def agregar(self, producto, cantidad=1):
+        """
+        Agrega unidades de un producto validando el stock conocido.
+
+        Args:
+            producto: Fila (id_producto, nombre, precio, ..., stock en la
+                posición 5), como las de la lista del punto de venta
+            cantidad (int): Unidades a agregar
+
+        Returns:
+            dict: Artículo del carrito
+
+        Raises:
+            StockInsuficiente: Si el producto no tiene stock suficiente
+        """
+        if producto[5] < 1:
+            raise StockInsuficiente("Producto sin stock disponible")
+        item = self.articulos.get(producto[0])
+        en_carrito = item["cantidad"] if item else 0
+        if en_carrito + cantidad > producto[5]:
+            raise StockInsuficiente("No hay suficiente stock")
+
+        if item:
+            self._acumular(item, -1)
+            item["cantidad"] += cantidad
+        else:
+            item = self.articulos[producto[0]] = {
+                "id_producto": producto[0],
+                "nombre": producto[1],
+                "precio": producto[2],
+                "cantidad": cantidad,
+                "descuento": 0.0  # Descuento individual
+            }
+        self._acumular(item, 1)
+        return item
+
+    def quitar(self, id_producto):
+        """Quita un artículo; devuelve el artículo quitado"""
+        item = self.articulos.pop(id_producto)
+        self._acumular(item, -1)
+        return item
+
+    def aplicar_descuento(self, porcentaje, id_producto=None):
+        """
+        Aplica un descuento a toda la venta o a un artículo.
+
+        Args:
+            porcentaje (float): Entre 0 y 100
+            id_producto (int): Artículo; sin él el descuento es global
+
+        Raises:
+            ValueError: Si el porcentaje está fuera de rango
+        """
+        if porcentaje < 0 or porcentaje > 100:
+            raise ValueError("El descuento debe ser entre 0 y 100%")
+        if id_producto is None:
+            self.descuento_global = porcentaje / 100
+            return
+        item = self.articulos[id_producto]
+        self._acumular(item, -1)
+        item["descuento"] = porcentaje / 100
+        self._acumular(item, 1)
+
+    def importes(self, item):
+        """
+        Returns:
+            tuple: (descuento, subtotal) de un artículo con el descuento
+                global y el individual
+        """
+        importe = item["precio"] * item["cantidad"]
+        descuento = importe * (self.descuento_global + item["descuento"])
+        return descuento, importe - descuento
+
+    def totales(self):
+        """
+        Returns:
+            Totales: subtotal (antes de descuentos), descuento, iva y total
+        """
+        if not self.articulos:
+            # Descartar el residuo de redondeo de sumas y restas sucesivas
+            self._importe_bruto = self._descuento_articulos = 0.0
+        subtotal = self._importe_bruto
+        descuento = subtotal * self.descuento_global + self._descuento_articulos
+        base_gravable = subtotal - descuento
+        iva = base_gravable * TASA_IVA
+        return Totales(subtotal, descuento, iva, base_gravable + iva)
+
+    def limpiar(self):
+        """Vacía el carrito y quita el descuento global"""
+        self.articulos.clear()
+        self.descuento_global = 0.0
+        self._importe_bruto = self._descuento_articulos = 0.0
+
+    def datos_venta(self, id_medio_pago, id_cliente=None, factura=None, moneda="MXN"):
+        """
+        Datos de la operación 'venta' (ver servicios/operaciones.py).
+
+        Los importes se redondean a centavos, como se muestran en pantalla.
+
+        Args:
+            id_medio_pago (int): Medio de pago
+            id_cliente (int): Cliente, o None para público en general
+            factura (dict): Datos de la factura sin id_transaccion, folio
+                ni importes, o None para no facturar
+            moneda (str): Clave de la moneda
+        """
+        totales = self.totales()
+        subtotal, iva, total = (round(v, 2) for v in (totales.subtotal, totales.iva, totales.total))
+        if factura is not None:
+            factura = dict(factura, subtotal=subtotal, iva=iva, total=total)
+        return {
+            "id_cliente": id_cliente,
+            "id_medio_pago": id_medio_pago,
+            "subtotal": subtotal,
+            "impuestos": iva,
+            "total": total,
+            "moneda": moneda,
+            "descuento_global": self.descuento_global,
+            # En el orden del carrito: FilasNoAfectadas reporta sus índices
+            "articulos": [
+                {
+                    "id_producto": item["id_producto"],
+                    "cantidad": item["cantidad"],
+                    "precio": item["precio"],
+                    "descuento": item["descuento"],
+                }
+                for item in self
+            ],
+            "factura": factura,
+        }
+
+
+class MotorVentas:
+    """
+    Registra ventas a partir de un CarritoVenta.
+
+    Atributos:
+        ejecutar (function): Recibe (nombre, datos) de una operación;
+            ejecutar_operacion por defecto (directo o vía VENTAS_SERVIDOR)
+    """
+
+    def __init__(self, ejecutar=None):
+        self.ejecutar = ejecutar or ejecutar_operacion
+
+    def registrar(self, carrito, id_medio_pago, id_cliente=None, factura=None):
+        """
+        Registra la venta del carrito en una sola transacción.
+
+        Returns:
+            int: id_transaccion
+
+        Raises:
+            ValueError: Si el carrito está vacío
+            StockInsuficiente: Si otra terminal vendió el stock; la venta
+                se revirtió y el carrito queda intacto
+        """
+        if not carrito:
+            raise ValueError("El carrito está vacío")
+        datos = carrito.datos_venta(id_medio_pago, id_cliente, factura)
+        try:
+            return self.ejecutar("venta", datos)["id_transaccion"]
+        except FilasNoAfectadas as e:
+            articulos = list(carrito)
+            raise StockInsuficiente(
+                "Stock insuficiente", [articulos[i] for i in e.indices]
+            ) from e
+
+    def registrar_lote(self, ventas):
+        """
+        Registra varias ventas con un solo commit (p. ej. ventas capturadas
+        sin conexión); cada venta es independiente de las demás. Escribe
+        siempre directo en la base de datos, como el servicio local.
+
+        Args:
+            ventas (list): Diccionarios de CarritoVenta.datos_venta
+
+        Returns:
+            list: Por venta, su id_transaccion o la excepción que la revirtió
+        """
+        respuestas = aplicar_operaciones([("venta", datos) for datos in ventas])
+        return [r if isinstance(r, Exception) else r["id_transaccion"] for r in respuestas]
+
+
+motor = MotorVentas()
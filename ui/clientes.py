@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from threading import Timer
-from db.db import obtener_datos, ejecutar_query
+from db.db import obtener_datos
+from servicios.operaciones import ejecutar_operacion
+from db.ejecutor import ejecutor
 from ui.styles import AppTheme
 from utils.helpers import get_inactive_color  
 from ui.dialogos.dialogo_clientes import DialogoCliente 
@@ -26,6 +27,10 @@ class PantallaClientes(ttk.Frame):
     }
     
     CAMPOS_BUSQUEDA = ['c.nombres', 'c.apellido_p', 'c.apellido_m', 'c.rfc']  
+
+    # Espera tras la última tecla antes de consultar
+    DEBOUNCE_MS = 300
+
     def __init__(self, parent):
         super().__init__(parent)
         self.theme = AppTheme()
@@ -35,9 +40,16 @@ class PantallaClientes(ttk.Frame):
             'estado': 'Todos',
         }
         self.orden = {'columna': None, 'ascendente': True}
+        self._id_debounce = None
         
         self._inicializar_ui()
         self._cargar_datos()
+        self.bind("<Destroy>", self._al_destruir)
+
+    def _al_destruir(self, event):
+        if event.widget is self and self._id_debounce is not None:
+            self.after_cancel(self._id_debounce)
+            self._id_debounce = None
 
     def _inicializar_ui(self):
         self._crear_controles()
@@ -135,13 +147,21 @@ class PantallaClientes(ttk.Frame):
             if self.filtros['estado'] != 'Todos':
                 parametros.append(1 if self.filtros['estado'] == self.ESTADOS[1] else 0)
                 
-            self.datos = obtener_datos(query, parametros)
-            
-            self._actualizar_tabla()
+            # La consulta corre en segundo plano; una búsqueda nueva cancela la anterior
+            ejecutor.enviar(
+                self, obtener_datos, query, parametros,
+                al_terminar=self._al_cargar_datos,
+                al_error=lambda e: messagebox.showerror("Error", f"Error cargando datos: {str(e)}"),
+                clave=(id(self), '_cargar_datos')
+            )
             
         except Exception as e:
             messagebox.showerror("Error", f"Error cargando datos: {str(e)}")
 
+    def _al_cargar_datos(self, datos):
+        self.datos = datos
+        self._actualizar_tabla()
+
     def _actualizar_tabla(self):
         self.tabla.delete(*self.tabla.get_children())
         for cliente in self.datos:
@@ -180,9 +200,9 @@ class PantallaClientes(ttk.Frame):
             nuevo_estado = 0 if current_estado == 1 else 1
             
             if messagebox.askyesno("Confirmar", f"¿Cambiar estado a {self.ESTADOS[nuevo_estado]}?"):
-                ejecutar_query(
-                    "UPDATE Clientes SET estado = ? WHERE id_cliente = ?",
-                    (nuevo_estado, cliente_id)
+                ejecutar_operacion(
+                    "estado_cliente",
+                    {"id_cliente": int(cliente_id), "estado": nuevo_estado}
                 )
                 
                 # 1. Quitar la selección ANTES de recargar
@@ -209,12 +229,13 @@ class PantallaClientes(ttk.Frame):
         return f"{self.orden['columna']} {'ASC' if self.orden['ascendente'] else 'DESC'}"
     
     def _aplicar_debounce_filtros(self):
-        if hasattr(self, '_timer_filtro'):
-            self._timer_filtro.cancel()
-        self._timer_filtro = Timer(0.3, self._aplicar_filtros)
-        self._timer_filtro.start()
+        # after() en lugar de threading.Timer: el filtro se aplica en el hilo de Tk
+        if self._id_debounce is not None:
+            self.after_cancel(self._id_debounce)
+        self._id_debounce = self.after(self.DEBOUNCE_MS, self._aplicar_filtros)
 
     def _aplicar_filtros(self, event=None):
+        self._id_debounce = None
         self.filtros.update({
             'busqueda': self.entrada_busqueda.get().strip(),
             'estado': self.combo_estado.get(),
@@ -0,0 +1,262 @@
+"""
+Tabla virtualizada para listas muy grandes.
+
+Un ttk.Treeview normal crea un elemento de Tk por fila; con 100 000
+productos eso tarda segundos y ocupa mucha memoria. TablaVirtual mantiene
+sólo las filas que caben en pantalla y, al desplazarse, vuelve a llenar
+esos mismos elementos con la ventana de datos correspondiente. El costo de
+abrir, filtrar u ordenar ya no depende del número de filas.
+
+Los datos vienen de una fuente con esta interfaz:
+
+    len(fuente)                     -> número total de filas
+    fuente.filas(inicio, cantidad)  -> lista con las filas de esa ventana
+
+FuenteLista adapta una lista en memoria; una fuente respaldada por SQL sólo
+tiene que implementar los mismos dos métodos. Para no leer la base en el
+hilo de Tk puede implementar además (ver db/paginacion.FuentePaginada):
+
+    fuente.cargadas(inicio, cantidad)   -> filas ya en memoria, None en las
+                                           que faltan (se pintan como marcador)
+    fuente.cargar(widget, inicio, cantidad, al_terminar)
+                                        -> las lee en segundo plano y llama
+                                           a al_terminar en el hilo de Tk
+
+Ejemplo:
+    tabla = TablaVirtual(frame, columnas=[('id', 'ID', 60), ('nombre', 'Nombre', 200)],
+                         formatear=lambda fila: (fila, ()))
+    tabla.cambiar_fuente(FuenteLista(productos))
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+# Alto de fila si aún no se puede medir (antes de mostrarse)
+ALTO_FILA_INICIAL = 20
+
+# Texto de las filas que la fuente todavía está leyendo
+TEXTO_CARGANDO = "Cargando…"
+
+
+class FuenteLista:
+    """
+    Fuente de datos sobre una lista en memoria.
+
+    Atributos:
+        datos (list): Filas en el orden en que se muestran
+    """
+
+    def __init__(self, datos=()):
+        self.datos = datos if isinstance(datos, list) else list(datos)
+
+    def __len__(self):
+        return len(self.datos)
+
+    def filas(self, inicio, cantidad):
+        return self.datos[inicio:inicio + cantidad]
+
+
+class TablaVirtual(ttk.Frame):
+    """
+    Treeview con barra de desplazamiento que sólo materializa las filas
+    visibles.
+
+    Atributos:
+        tabla (ttk.Treeview): Treeview interno (encabezados, estilos)
+        fuente: Fuente de datos actual (ver el docstring del módulo)
+        inicio (int): Índice de la primera fila visible
+    """
+
+    def __init__(self, parent, columnas, formatear, al_ordenar=None, etiquetas=None, **opciones):
+        """
+        Args:
+            parent: Widget contenedor
+            columnas (list): Tuplas (id, texto, ancho) de las columnas
+            formatear (function): Recibe una fila de la fuente y devuelve
+                (valores, tags) para el Treeview
+            al_ordenar (function): Se llama con el id de la columna al
+                hacer clic en su encabezado
+            etiquetas (dict): tag -> opciones de tag_configure
+            **opciones: Opciones adicionales del ttk.Frame
+        """
+        super().__init__(parent, **opciones)
+        self.formatear = formatear
+        # Valores de una fila que aún no se lee (primera columna con el texto)
+        self._marcador = (TEXTO_CARGANDO,) + ("",) * (len(columnas) - 1)
+        self.fuente = FuenteLista()
+        self.inicio = 0
+        self._visibles = 1
+        self._seleccionado = None  # Índice absoluto de la fila seleccionada
+        self._pintando = False
+
+        self.barra = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._desplazar)
+        self.tabla = ttk.Treeview(
+            self,
+            columns=[c[0] for c in columnas],
+            show="headings",
+            selectmode="browse"
+        )
+        for col_id, texto, ancho in columnas:
+            self.tabla.heading(
+                col_id, text=texto,
+                command=(lambda c=col_id: al_ordenar(c)) if al_ordenar else ""
+            )
+            self.tabla.column(col_id, width=ancho, anchor=tk.CENTER)
+        for tag, configuracion in (etiquetas or {}).items():
+            self.tabla.tag_configure(tag, **configuracion)
+
+        self.barra.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tabla.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tabla.bind("<Configure>", self._al_redimensionar)
+        self.tabla.bind("<<TreeviewSelect>>", self._al_seleccionar)
+        # El Treeview no debe desplazarse solo: todas sus filas están visibles
+        self.tabla.bind("<MouseWheel>", self._rueda)
+        self.tabla.bind("<Button-4>", lambda e: self._mover(-3))
+        self.tabla.bind("<Button-5>", lambda e: self._mover(3))
+        for tecla, paso in (("<Up>", -1), ("<Down>", 1)):
+            self.tabla.bind(tecla, lambda e, p=paso: self._mover_seleccion(p))
+        self.tabla.bind("<Prior>", lambda e: self._mover_seleccion(-self._visibles))
+        self.tabla.bind("<Next>", lambda e: self._mover_seleccion(self._visibles))
+        self.tabla.bind("<Home>", lambda e: self._mover_seleccion(-len(self.fuente)))
+        self.tabla.bind("<End>", lambda e: self._mover_seleccion(len(self.fuente)))
+
+    # --- Datos ---
+
+    def cambiar_fuente(self, fuente, conservar_posicion=False):
+        """
+        Muestra otra fuente de datos (p. ej. tras filtrar u ordenar).
+
+        Args:
+            fuente: Objeto con __len__ y filas(inicio, cantidad)
+            conservar_posicion (bool): Mantener el desplazamiento actual
+                (útil al recargar los mismos datos)
+        """
+        self.fuente = fuente
+        self._seleccionado = None
+        if not conservar_posicion:
+            self.inicio = 0
+        self.refrescar()
+
+    def refrescar(self):
+        """Vuelve a pintar la ventana visible con los datos de la fuente"""
+        total = len(self.fuente)
+        self.inicio = max(0, min(self.inicio, total - self._visibles))
+        if total and hasattr(self.fuente, 'cargadas'):
+            # Se pinta lo que ya está en memoria; lo demás (y las ventanas
+            # vecinas) se lee en segundo plano y se vuelve a pintar
+            filas = self.fuente.cargadas(self.inicio, self._visibles)
+            self.fuente.cargar(self, self.inicio, self._visibles, self.refrescar)
+        else:
+            filas = self.fuente.filas(self.inicio, self._visibles) if total else []
+
+        self._pintando = True
+        try:
+            elementos = self.tabla.get_children()
+            # Ajustar la cantidad de elementos de Tk a las filas visibles
+            if len(elementos) > len(filas):
+                self.tabla.delete(*elementos[len(filas):])
+            for posicion, fila in enumerate(filas):
+                valores, tags = self.formatear(fila) if fila is not None else (self._marcador, ())
+                if posicion < len(elementos):
+                    self.tabla.item(elementos[posicion], values=valores, tags=tags)
+                else:
+                    self.tabla.insert("", tk.END, iid=str(posicion), values=valores, tags=tags)
+
+            posicion = None if self._seleccionado is None else self._seleccionado - self.inicio
+            if posicion is not None and 0 <= posicion < len(filas):
+                self.tabla.selection_set(str(posicion))
+                self.tabla.focus(str(posicion))
+            else:
+                self.tabla.selection_remove(self.tabla.selection())
+        finally:
+            self._pintando = False
+
+        if total > self._visibles:
+            self.barra.set(self.inicio / total, (self.inicio + len(filas)) / total)
+        else:
+            self.barra.set(0, 1)
+
+    def seleccion(self):
+        """
+        Returns:
+            La fila seleccionada de la fuente, o None (también si aún no
+            se lee)
+        """
+        if self._seleccionado is None or self._seleccionado >= len(self.fuente):
+            return None
+        if hasattr(self.fuente, 'cargadas'):
+            filas = self.fuente.cargadas(self._seleccionado, 1)
+        else:
+            filas = self.fuente.filas(self._seleccionado, 1)
+        return filas[0] if filas else None
+
+    # --- Encabezados ---
+
+    def indicar_orden(self, columna, ascendente):
+        """Muestra la flecha de orden en el encabezado de la columna"""
+        for col in self.tabla["columns"]:
+            texto = self.tabla.heading(col)["text"]
+            self.tabla.heading(col, text=texto.rstrip(' ↑↓'))
+        flecha = ' ↑' if ascendente else ' ↓'
+        self.tabla.heading(columna, text=self.tabla.heading(columna)["text"] + flecha)
+
+    # --- Desplazamiento ---
+
+    def _ir_a(self, inicio):
+        inicio = max(0, min(int(inicio), len(self.fuente) - self._visibles))
+        if inicio != self.inicio:
+            self.inicio = inicio
+            self.refrescar()
+
+    def _mover(self, filas):
+        self._ir_a(self.inicio + filas)
+        return "break"
+
+    def _desplazar(self, accion, cantidad, unidad=None):
+        """Comando de la barra: ('moveto', fracción) o ('scroll', n, unidad)"""
+        if accion == "moveto":
+            self._ir_a(float(cantidad) * len(self.fuente))
+        elif accion == "scroll":
+            paso = self._visibles if unidad == "pages" else 1
+            self._ir_a(self.inicio + int(cantidad) * paso)
+
+    def _rueda(self, event):
+        return self._mover(-3 if event.delta > 0 else 3)
+
+    def _mover_seleccion(self, paso):
+        total = len(self.fuente)
+        if not total:
+            return "break"
+        actual = self._seleccionado if self._seleccionado is not None else self.inicio - 1
+        self._seleccionado = max(0, min(actual + paso, total - 1))
+        if self._seleccionado < self.inicio:
+            self.inicio = self._seleccionado
+        elif self._seleccionado >= self.inicio + self._visibles:
+            self.inicio = self._seleccionado - self._visibles + 1
+        self.refrescar()
+        self.tabla.event_generate("<<TreeviewSelect>>")
+        return "break"
+
+    def _al_seleccionar(self, event=None):
+        if self._pintando:
+            return
+        seleccion = self.tabla.selection()
+        if seleccion:
+            self._seleccionado = self.inicio + self.tabla.index(seleccion[0])
+
+    def _al_redimensionar(self, event=None):
+        """Recalcula cuántas filas caben con el alto actual del Treeview"""
+        elementos = self.tabla.get_children()
+        caja = self.tabla.bbox(elementos[0]) if elementos else None
+        if caja:
+            encabezado, alto_fila = caja[1], caja[3]
+        else:
+            encabezado, alto_fila = ALTO_FILA_INICIAL, ALTO_FILA_INICIAL
+        visibles = max(1, (self.tabla.winfo_height() - encabezado) // max(1, alto_fila))
+        if visibles != self._visibles:
+            self._visibles = visibles
+            self.refrescar()
+            if not caja and self.tabla.get_children():
+                # Se estimó sin filas; medir de nuevo con la primera ya dibujada
+                self.after_idle(self._al_redimensionar)
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db.db import ejecutar_query
+from servicios.operaciones import ejecutar_operacion
 
 class DialogoCliente(tk.Toplevel):
     def __init__(self, parent, actualizar_callback):
@@ -55,13 +55,7 @@ class DialogoCliente(tk.Toplevel):
             return
 
         try:
-            ejecutar_query(
-                """INSERT INTO Clientes 
-                (nombres, apellido_p, apellido_m, tipo_persona, rfc, correo, telefono, estado, fecha_registro)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))""",  
-                (datos['nombres'], datos['apellido_p'], datos['apellido_m'], datos['tipo_persona'], 
-                 datos['rfc'], datos['correo'], datos['telefono'], datos['estado'])
-            )
+            ejecutar_operacion("cliente", datos)
             self.actualizar_callback()
             self.destroy()
         except Exception as e:
@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db.db import ejecutar_query, obtener_datos
+from db.db import obtener_datos, FilasNoAfectadas
+from db.busqueda import buscar_productos
+from servicios.operaciones import ejecutar_operacion
 from ui.dialogos.dialogo_producto import DialogoProducto
 
 class DialogoMovimiento:
@@ -9,24 +11,24 @@ class DialogoMovimiento:
     
     Atributos:
         parent (tk.Widget): Ventana padre del diálogo
-        productos (list): Lista de productos disponibles
         callback_actualizar (function): Función para actualizar la vista principal
         dialogo (tk.Toplevel): Ventana del diálogo
     """
     
     TIPOS_MOVIMIENTO = ['entrada', 'salida', 'transferencia']
     
-    def __init__(self, parent, productos, callback_actualizar):
+    # Productos que se muestran en la lista de búsqueda
+    MAX_RESULTADOS = 50
+    
+    def __init__(self, parent, callback_actualizar):
         """
         Inicializa el diálogo de movimientos
         
         Args:
             parent (tk.Widget): Ventana padre
-            productos (list): Lista de productos para búsqueda
             callback_actualizar (function): Callback para actualizar datos
         """
         self.parent = parent
-        self.productos = productos
         self.callback_actualizar = callback_actualizar
         
         self._configurar_ventana()
@@ -140,19 +142,16 @@ class DialogoMovimiento:
         Args:
             event (tk.Event): Evento de teclado opcional
         """
-        busqueda = self.busqueda_producto.get().strip().lower()
-        self.lista_productos.delete(0, tk.END)
+        busqueda = self.busqueda_producto.get().strip()
+        
+        # Búsqueda por ID, nombre, descripción, SKU y código de barras en el
+        # índice de texto completo; sólo se leen los primeros MAX_RESULTADOS
+        productos = buscar_productos(
+            busqueda, "p.id_producto, p.nombre", limite=self.MAX_RESULTADOS
+        )
         
-        # Búsqueda en múltiples campos: ID, nombre, SKU y código de barras
-        for producto in self.productos:
-            texto_match = (
-                busqueda in str(producto[0]).lower() or       # ID
-                busqueda in producto[1].lower() or           # Nombre
-                (producto[9] and busqueda in producto[9].lower()) or  # SKU
-                (producto[10] and busqueda in producto[10].lower()))    # Código
-                
-            if texto_match:
-                self.lista_productos.insert(tk.END, f"{producto[0]} - {producto[1]}")
+        self.lista_productos.delete(0, tk.END)
+        self.lista_productos.insert(tk.END, *(f"{p[0]} - {p[1]}" for p in productos))
 
     def _abrir_dialogo_nuevo_producto(self):
         """Abre el diálogo para crear nuevos productos"""
@@ -225,31 +224,26 @@ class DialogoMovimiento:
             cantidad = int(self.cantidad_movimiento.get())
             referencia = self.referencia_movimiento.get().strip()
             
-            # Ajustar cantidad según tipo de movimiento
-            cantidad_ajustada = -cantidad if tipo in ['salida', 'transferencia'] else cantidad
-            
-            # Transacción en base de datos
-            with ejecutar_query() as cursor:
-                # Insertar movimiento
-                cursor.execute(
-                    """INSERT INTO Movimientos (
-                        tipo, fecha, cantidad, id_producto, referencia
-                    ) VALUES (?, datetime('now'), ?, ?, ?)""",
-                    (tipo, cantidad_ajustada, id_producto, referencia)
-                )
-                
-                # Actualizar stock
-                cursor.execute(
-                    """UPDATE Productos 
-                    SET stock_actual = stock_actual + ? 
-                    WHERE id_producto = ?""",
-                    (cantidad_ajustada, id_producto)
-                )
+            # Movimiento y ajuste de stock en una transacción, directo o a
+            # través del servicio local (VENTAS_SERVIDOR)
+            ejecutar_operacion("movimiento", {
+                "id_producto": id_producto,
+                "tipo": tipo,
+                "cantidad": cantidad,
+                "referencia": referencia,
+            })
             
             messagebox.showinfo("Éxito", "Movimiento registrado correctamente", parent=self.dialogo)
             self.callback_actualizar()
             self._cerrar_dialogo()
             
+        except FilasNoAfectadas:
+            # Otra terminal descontó stock después de la validación
+            messagebox.showerror(
+                "Stock insuficiente",
+                "El stock cambió y ya no alcanza para este movimiento",
+                parent=self.dialogo
+            )
         except Exception as e:
             messagebox.showerror("Error", f"Error al guardar movimiento:\n{str(e)}", parent=self.dialogo)
 
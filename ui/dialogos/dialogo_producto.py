@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-from db.db import ejecutar_query, obtener_datos
+from db.db import obtener_datos, obtener_datos_cache
+from servicios.operaciones import ejecutar_operacion
 
 class DialogoProducto:
     """
@@ -29,10 +30,10 @@ class DialogoProducto:
 
     def _cargar_datos_soporte(self):
         """Carga datos de catálogos para los combobox (categorías y proveedores)"""
-        self.categorias = obtener_datos(
+        self.categorias = obtener_datos_cache(
             "SELECT id_categoria, nombre FROM Categorias ORDER BY nombre"
         )
-        self.proveedores = obtener_datos(
+        self.proveedores = obtener_datos_cache(
             "SELECT id_proveedor, nombre FROM Proveedores ORDER BY nombre"
         )
 
@@ -326,15 +327,8 @@ class DialogoProducto:
         }
 
     def _guardar_en_db(self, datos):
-        """Ejecuta la inserción en la base de datos"""
-        ejecutar_query(
-            """INSERT INTO Productos (
-                nombre, descripcion, precio_venta, costo,
-                codigo_barras, sku, stock_minimo, stock_maximo, stock_actual,
-                id_categoria, id_proveedor, fecha_creacion, estado
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), 1)""",
-            tuple(datos.values())
-        )
+        """Registra el producto (directo o a través del servicio local)"""
+        ejecutar_operacion("producto", datos)
         messagebox.showinfo("Éxito", "Producto creado exitosamente")
         self.callback_actualizar()
 
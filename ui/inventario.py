@@ -1,7 +1,12 @@
 import tkinter as tk
-from tkinter import ttk
-from db.db import obtener_datos
+from tkinter import ttk, messagebox
+from db.db import obtener_datos_cache
+from db.busqueda import filtro_productos
+from db.cambios import cambios_desde, ultimo_cambio
+from db.paginacion import ConsultaPaginada, FuentePaginada
+from db.ejecutor import ejecutor
 from ui.styles import AppTheme
+from ui.components.tabla_virtual import TablaVirtual
 from utils import helpers
 from ui.dialogos.dialogo_movimientos import DialogoMovimiento
 
@@ -24,43 +29,192 @@ class PantallaInventario(ttk.Frame):
         ]
     }
 
+    # Columnas de la consulta (mismo orden que COLUMNAS)
+    SELECT_PRODUCTOS = """
+        p.id_producto,          -- Índice 0
+        p.nombre,               -- 1
+        c.nombre,               -- 2 (categoría)
+        pr.nombre,              -- 3 (proveedor)
+        p.stock_actual,         -- 4
+        p.stock_minimo,         -- 5
+        p.stock_maximo,         -- 6
+        p.precio_venta,         -- 7
+        p.costo,                -- 8
+        p.sku,                  -- 9
+        p.codigo_barras,        -- 10
+        p.estado                -- 11
+        """
+    DESDE_PRODUCTOS = """
+        Productos p
+        LEFT JOIN Categorias c ON p.id_categoria = c.id_categoria
+        LEFT JOIN Proveedores pr ON p.id_proveedor = pr.id_proveedor
+        """
+
+    # Expresión SQL de orden por columna; las de Productos tienen índice
+    # (migración 3), categoría y proveedor se ordenan sin índice
+    ORDEN_SQL = {
+        'id_producto': "p.id_producto",
+        'nombre': "p.nombre COLLATE NOCASE",
+        'categoria': "c.nombre COLLATE NOCASE",
+        'proveedor': "pr.nombre COLLATE NOCASE",
+        'stock_actual': "p.stock_actual",
+        'stock_minimo': "p.stock_minimo",
+        'stock_maximo': "p.stock_maximo",
+        'precio_venta': "p.precio_venta",
+        'costo': "p.costo",
+        'sku': "p.sku",
+        'codigo_barras': "p.codigo_barras",
+        'estado': "p.estado",
+    }
+
+    # Espera tras la última tecla antes de consultar
+    DEBOUNCE_MS = 300
+
+    # Cada cuánto se buscan cambios de otras pantallas o terminales
+    INTERVALO_SINCRONIZACION_MS = 2000
+
+    # Con más productos cambiados se recarga en lugar de sustituir filas
+    MAX_CAMBIOS_DELTA = 500
+
     def __init__(self, parent):
         super().__init__(parent)
         self.theme = AppTheme()
-        self.productos = []
-        self.categorias = []
+        self.categorias = ["Todas las categorías"]
         self.sort_column = 'id_producto'
         self.sort_ascending = True
         self.columnas_visibles = {'Básico': True}
+        self._id_debounce = None
+        self.ultimo_cambio = None  # Último id de Cambios_productos aplicado
         
-        self._cargar_datos()
         self._crear_widgets()
-        self._actualizar_tabla()
+        self._cargar_datos()
+        self._id_sondeo = self.after(self.INTERVALO_SINCRONIZACION_MS, self._sondear)
+        self.bind("<Destroy>", self._al_destruir)
+
+    def _al_destruir(self, event):
+        if event.widget is not self:
+            return
+        for id_after in (self._id_debounce, self._id_sondeo):
+            if id_after is not None:
+                self.after_cancel(id_after)
+        self._id_debounce = self._id_sondeo = None
 
     def _cargar_datos(self):
-        self.productos = obtener_datos("""
-            SELECT 
-                p.id_producto,          -- Índice 0
-                p.nombre,               -- 1
-                c.nombre,               -- 2 (categoría)
-                pr.nombre,              -- 3 (proveedor)
-                p.stock_actual,         -- 4
-                p.stock_minimo,         -- 5
-                p.stock_maximo,         -- 6
-                p.precio_venta,         -- 7
-                p.costo,                -- 8
-                p.sku,                  -- 9
-                p.codigo_barras,        -- 10
-                p.estado                -- 11
-            FROM Productos p
-            LEFT JOIN Categorias c ON p.id_categoria = c.id_categoria
-            LEFT JOIN Proveedores pr ON p.id_proveedor = pr.id_proveedor
-            ORDER BY {}
-            """.format(f"{self.sort_column} {'ASC' if self.sort_ascending else 'DESC'}")
+        """Solicita en segundo plano el conteo y la primera página de productos"""
+        ejecutor.cancelar((id(self), '_sincronizar'))  # La recarga ya incluye los cambios
+        ejecutor.enviar(
+            self, self._consultar_datos,
+            self.combo_categorias.get(),
+            self.entrada_busqueda.get().strip(),
+            self.sort_column,
+            self.sort_ascending,
+            al_terminar=self._al_cargar_datos,
+            al_error=lambda e: messagebox.showerror("Error", f"Error cargando datos: {str(e)}"),
+            clave=(id(self), '_cargar_datos')
         )
-            
-        raw_categorias = obtener_datos("SELECT id_categoria, nombre FROM Categorias")
-        self.categorias = helpers.obtener_opciones_categorias(raw_categorias)
+
+    def _consultar_datos(self, categoria, busqueda, columna, ascendente):
+        """Consultas del inventario (se ejecuta en el hilo del ejecutor, sin tocar Tk)"""
+        # Antes de leer: un cambio durante la lectura se vuelve a aplicar
+        # en la siguiente sincronización
+        ultimo = ultimo_cambio()
+        raw_categorias = obtener_datos_cache("SELECT id_categoria, nombre FROM Categorias")
+        ids_categoria = {nombre: id_categoria for id_categoria, nombre in raw_categorias}
+
+        # Filtros en SQL: la categoría usa idx_productos_categoria_nombre
+        filtros = []
+        if categoria in ids_categoria:
+            filtros.append(("p.id_categoria = ?", (ids_categoria[categoria],)))
+        # La búsqueda de texto usa el índice Productos_fts
+        filtro_busqueda = filtro_productos(busqueda)
+        if filtro_busqueda:
+            filtros.append(filtro_busqueda)
+
+        consulta = ConsultaPaginada(
+            self.SELECT_PRODUCTOS, self.DESDE_PRODUCTOS,
+            orden=self.ORDEN_SQL[columna],
+            clave="p.id_producto",
+            filtros=filtros,
+            ascendente=ascendente
+        )
+        # Cuenta y lee la primera página aquí; las demás se leen en segundo
+        # plano al desplazarse (TablaVirtual pinta marcadores mientras)
+        return FuentePaginada(consulta), raw_categorias, ultimo
+
+    def _al_cargar_datos(self, resultado):
+        """Actualiza la pantalla con los datos recibidos del ejecutor"""
+        fuente, raw_categorias, ultimo = resultado
+        self.categorias = helpers.obtener_opciones_categorias(raw_categorias) or self.categorias
+
+        seleccion = self.combo_categorias.get()
+        self.combo_categorias['values'] = self.categorias
+        if seleccion not in self.categorias:
+            # La categoría ya no existe: volver a consultar sin filtro
+            self.combo_categorias.current(0)
+            self._cargar_datos()
+            return
+        self.ultimo_cambio = ultimo
+        self.tabla.cambiar_fuente(fuente)
+
+    def _sincronizar(self):
+        """
+        Aplica los productos que cambiaron desde la última lectura (ver
+        db/cambios.py) sin recargar el inventario completo.
+        """
+        if self.ultimo_cambio is None:
+            return  # Aún no termina la primera carga
+        ejecutor.enviar(
+            self, self._consultar_cambios,
+            self.tabla.fuente, self.ultimo_cambio, self.sort_column,
+            al_terminar=self._al_sincronizar,
+            # El siguiente sondeo lo vuelve a intentar
+            al_error=lambda e: None,
+            clave=(id(self), '_sincronizar')
+        )
+
+    def _consultar_cambios(self, fuente, desde, columna):
+        """
+        Lee los cambios posteriores a `desde` (hilo del ejecutor).
+
+        Returns:
+            tuple: (fuente, ultimo, filas, recarga): filas que sustituir en
+                la fuente actual, o recarga con una FuentePaginada nueva
+                (mismos filtros y orden) si los cambios no se pueden aplicar
+                fila por fila
+        """
+        ultimo, cambios = cambios_desde(desde, self.MAX_CAMBIOS_DELTA)
+        if cambios == {}:
+            return fuente, ultimo, [], None
+        # Un cambio de stock no mueve la fila de lugar ni cambia los
+        # filtros, salvo que se ordene por stock; altas, bajas y otros
+        # datos sí pueden hacerlo
+        sustituibles = (
+            cambios is not None
+            and columna != 'stock_actual'
+            and all(tipos == {'stock'} for tipos in cambios.values())
+        )
+        if sustituibles:
+            return fuente, ultimo, fuente.consulta.por_claves(cambios), None
+        return fuente, ultimo, None, FuentePaginada(fuente.consulta)
+
+    def _al_sincronizar(self, resultado):
+        """Sustituye las filas cambiadas o cambia a la fuente recargada"""
+        fuente, ultimo, filas, recarga = resultado
+        if fuente is not self.tabla.fuente:
+            return  # Se recargó con otros filtros mientras se consultaba
+        self.ultimo_cambio = ultimo
+        if recarga is not None:
+            self.tabla.cambiar_fuente(recarga, conservar_posicion=True)
+        elif filas:
+            if fuente.reemplazar(filas):
+                self.tabla.refrescar()
+            else:
+                self._cargar_datos()
+
+    def _sondear(self):
+        """Sincroniza periódicamente (ventas y movimientos de otras terminales)"""
+        self._sincronizar()
+        self._id_sondeo = self.after(self.INTERVALO_SINCRONIZACION_MS, self._sondear)
 
     def _crear_widgets(self):
         controles_frame = ttk.Frame(self)
@@ -79,7 +233,7 @@ class PantallaInventario(ttk.Frame):
         ttk.Label(controles_frame, text="Buscar:").pack(side=tk.LEFT, padx=10)
         self.entrada_busqueda = ttk.Entry(controles_frame)
         self.entrada_busqueda.pack(side=tk.LEFT, padx=5)
-        self.entrada_busqueda.bind("<KeyRelease>", self._aplicar_filtros)
+        self.entrada_busqueda.bind("<KeyRelease>", lambda e: self._aplicar_debounce_filtros())
         
         btn_entrada = ttk.Button(
             controles_frame,
@@ -92,38 +246,20 @@ class PantallaInventario(ttk.Frame):
         self._configurar_tabla()
 
     def _configurar_tabla(self):
-        self.tabla_frame = ttk.Frame(self)
-        self.tabla_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-        
-        scrollbar = ttk.Scrollbar(self.tabla_frame, orient=tk.VERTICAL)
-        
-        todas_las_columnas = [
-            col[0] 
-            for grupo in self.COLUMNAS.values() 
-            for col in grupo
-        ]
-        
-        self.tabla = ttk.Treeview(
-            self.tabla_frame,
-            columns=todas_las_columnas,
-            show="headings",
-            yscrollcommand=scrollbar.set,
-            selectmode="browse"
+        # Sólo se crean elementos de Tk para las filas visibles, así que
+        # abrir, filtrar u ordenar no depende del tamaño del catálogo
+        self.tabla = TablaVirtual(
+            self,
+            columnas=[col for grupo in self.COLUMNAS.values() for col in grupo],
+            formatear=self._formatear_fila,
+            al_ordenar=self._ordenar_por_columna,
+            etiquetas={
+                'bajo_stock': {'foreground': '#bf616a'},
+                'minimo_stock': {'foreground': '#ebcb8b'},
+                'inactivo': {'foreground': '#bf616a'},
+            }
         )
-        
-        for grupo in self.COLUMNAS.values():
-            for col_id, col_text, width in grupo:
-                self.tabla.heading(col_id, text=col_text, 
-                                command=lambda c=col_id: self._ordenar_por_columna(c))
-                self.tabla.column(col_id, width=width, anchor=tk.CENTER)
-        
-        scrollbar.config(command=self.tabla.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tabla.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        self.tabla.tag_configure('bajo_stock', foreground='#bf616a')
-        self.tabla.tag_configure('minimo_stock', foreground='#ebcb8b')
-        self.tabla.tag_configure('inactivo', foreground='#bf616a')
+        self.tabla.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
 
     def _ordenar_por_columna(self, columna):
         """Maneja el ordenamiento al hacer click en encabezados"""
@@ -132,130 +268,51 @@ class PantallaInventario(ttk.Frame):
         else:
             self.sort_column = columna
             self.sort_ascending = True
-            
-        # Mapeo de columnas a índices
-        column_map = {
-            'id_producto': 0,
-            'nombre': 1,
-            'categoria': 2,
-            'proveedor': 3,
-            'stock_actual': 4,
-            'stock_minimo': 5,
-            'stock_maximo': 6,
-            'precio_venta': 7,
-            'costo': 8,
-            'sku': 9,
-            'codigo_barras': 10,
-            'estado': 11
-        }
-        
-        reverse = not self.sort_ascending
-        self.productos.sort(
-            key=lambda x: (
-                str(x[column_map[columna]]).lower() 
-                if columna in ['nombre', 'categoria', 'proveedor'] 
-                else x[column_map[columna]]
-            ),
-            reverse=reverse
-        )
-        
-        self._actualizar_tabla()
-        self._actualizar_indicador_orden(columna)
-
-    def _actualizar_indicador_orden(self, columna):
-        """Actualiza flechas de ordenamiento"""
-        for col in self.tabla["columns"]:
-            current_text = self.tabla.heading(col)["text"]
-            self.tabla.heading(col, text=current_text.rstrip(' ↑↓'))
-            
-        arrow = ' ↑' if self.sort_ascending else ' ↓'
-        new_text = self.tabla.heading(columna)["text"] + arrow
-        self.tabla.heading(columna, text=new_text)
-
-    def _actualizar_tabla(self, datos=None):
-        self.tabla.delete(*self.tabla.get_children())
-        datos = datos or self.productos
-        
-        for prod in datos:
-            stock_actual = prod[4]
-            stock_minimo = prod[5]
-            tags = []
-
-            # Determinar tacg
-            if stock_actual < stock_minimo:
-                tags.append('bajo_stock')
-            elif stock_actual == stock_minimo:
-                tags.append('minimo_stock')
-            if prod[11] != 1:  # Estado inactivo
-                tags.append('inactivo')
-
-            # Construir lista de valores con TODOS los campos
-            valores = [
-                prod[0],        # id_producto
-                prod[1],        # nombre
-                prod[2] or "-", # categoria
-                prod[3] or "-", # proveedor
-                helpers.formatear_stock(prod[4], prod[5])[0],  # stock_actual
-                prod[5],        # stock_minimo
-                prod[6],        # stock_maximo
-                f"${prod[7]:.2f}",  # precio_venta
-                f"${prod[8]:.2f}",  # costo
-                prod[9] or "-", # sku
-                prod[10] or "-",# codigo_barras
-                "Activo" if prod[11] == 1 else "Inactivo"  # estado
-            ]
-            
-            self.tabla.insert("", tk.END, values=valores, tags=tags)  # <-- valores ya está definido
-        
-        # Configurar colores para estado
-        self.tabla.tag_configure('inactivo', foreground='#bf616a')
 
-    def _aplicar_filtros(self, event=None):
-        """Aplica los filtros activos"""
-        categoria = self.combo_categorias.get()
-        busqueda = self.entrada_busqueda.get().strip().lower()
-        
-        filtrados = []
-        for p in self.productos:
-            # Filtro de categoría
-            cumple_categoria = (
-                categoria == "Todas las categorías" or 
-                (p[2] and p[2].lower() == categoria.lower())
-            )
-            
-            # Filtro de búsqueda
-            cumple_busqueda = (
-                not busqueda or
-                busqueda in str(p[0]).lower() or    # ID
-                busqueda in p[1].lower() or         # Nombre
-                (p[2] and busqueda in p[2].lower()) or  # Categoría
-                (p[9] and busqueda in str(p[9]).lower()) or  # SKU 
-                (p[10] and busqueda in str(p[10]).lower())   # Código de Barras
-            )
-            
-            if cumple_categoria and cumple_busqueda:
-                filtrados.append(p)
-        
-        self._actualizar_tabla(filtrados)
+        self.tabla.indicar_orden(columna, self.sort_ascending)
+        self._cargar_datos()
 
+    def _formatear_fila(self, prod):
+        """Valores y tags de una fila (sólo se llama para las filas visibles)"""
+        stock_actual = prod[4]
+        stock_minimo = prod[5]
+        tags = []
 
-    def _actualizar_lista_productos(self, event=None):
-        """Actualiza la lista de productos según la búsqueda"""
-        busqueda = self.busqueda_producto.get().strip().lower()
-        self.lista_productos.delete(0, tk.END)
-        
-        for p in self.productos:
-            match = (
-                busqueda in str(p[0]).lower() or     # ID
-                busqueda in p[1].lower() or          # Nombre
-                (p[9] and busqueda in p[9].lower()) or  # SKU
-                (p[10] and busqueda in p[10].lower())   # Código Barras
-            )
-            if match:
-                self.lista_productos.insert(tk.END, f"{p[0]} - {p[1]}")
+        if stock_actual < stock_minimo:
+            tags.append('bajo_stock')
+        elif stock_actual == stock_minimo:
+            tags.append('minimo_stock')
+        if prod[11] != 1:  # Estado inactivo
+            tags.append('inactivo')
+
+        valores = [
+            prod[0],        # id_producto
+            prod[1],        # nombre
+            prod[2] or "-", # categoria
+            prod[3] or "-", # proveedor
+            helpers.formatear_stock(prod[4], prod[5])[0],  # stock_actual
+            prod[5],        # stock_minimo
+            prod[6],        # stock_maximo
+            f"${prod[7]:.2f}",  # precio_venta
+            f"${prod[8]:.2f}",  # costo
+            prod[9] or "-", # sku
+            prod[10] or "-",# codigo_barras
+            "Activo" if prod[11] == 1 else "Inactivo"  # estado
+        ]
+        return valores, tags
+
+    def _aplicar_debounce_filtros(self):
+        if self._id_debounce is not None:
+            self.after_cancel(self._id_debounce)
+        self._id_debounce = self.after(self.DEBOUNCE_MS, self._aplicar_filtros)
+
+    def _aplicar_filtros(self, event=None):
+        """Aplica los filtros activos (se resuelven en SQL)"""
+        self._id_debounce = None
+        self._cargar_datos()
 
     def _abrir_dialogo_movimiento(self):
-        DialogoMovimiento(self, self.productos, self._cargar_datos)
+        DialogoMovimiento(self, self._sincronizar)
 
     if __name__ == "__main__":
         root = tk.Tk()
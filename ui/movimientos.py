@@ -1,6 +1,8 @@
 import tkinter as tk
-from tkinter import ttk
-from db.db import obtener_datos, ejecutar_query
+from tkinter import ttk, messagebox
+from db.db import ejecutar_query
+from db.ejecutor import ejecutor
+from db.instrumentacion import medir
 from ui.styles import AppTheme
 from utils import helpers
 
@@ -18,18 +20,39 @@ class PantallaMovimientos(ttk.Frame):
         ]
     }
 
+    # Columnas en las que busca el filtro de texto (equivalente a la búsqueda anterior)
+    CAMPOS_BUSQUEDA = [
+        "CAST(m.id_movimiento AS TEXT)",
+        "m.tipo",
+        "strftime('%d/%m/%Y %H:%M', m.fecha)",
+        "CAST(abs(m.cantidad) AS TEXT)",
+        "p.nombre",
+        "COALESCE(u.nombres || ' ' || u.apellido_p, 'Sistema')",
+        "m.referencia"
+    ]
+
+    # Filas que se insertan en el Treeview por cada ciclo de la interfaz
+    TAMANO_LOTE = 500
+
     def __init__(self, parent):
         super().__init__(parent)
         self.theme = AppTheme()
-        self.datos = []
+        self.filtro = ''
         self.sort_column = 'm.id_movimiento'
         self.sort_ascending = False
 
         self._crear_widgets()
         self._cargar_datos()
-        self._actualizar_tabla()
+        self.bind("<Destroy>", self._al_destruir)
 
     def _cargar_datos(self):
+        """Inicia la carga por lotes del historial con el filtro y orden actuales"""
+        where = ""
+        parametros = ()
+        if self.filtro:
+            where = "WHERE " + " OR ".join(f"{campo} LIKE ?" for campo in self.CAMPOS_BUSQUEDA)
+            parametros = (f"%{self.filtro}%",) * len(self.CAMPOS_BUSQUEDA)
+
         query = """
             SELECT 
                 m.id_movimiento,
@@ -42,12 +65,30 @@ class PantallaMovimientos(ttk.Frame):
             FROM Movimientos m
             LEFT JOIN Productos p ON m.id_producto = p.id_producto
             LEFT JOIN Usuarios u ON m.id_usuario = u.id_usuario
+            {}
             ORDER BY {} {}
         """.format(
+            where,
             self.sort_column, 
             'ASC' if self.sort_ascending else 'DESC'
         )
-        self.datos = obtener_datos(query)
+
+        # Reemplaza (y cancela) cualquier carga anterior de esta pantalla
+        self.tabla.delete(*self.tabla.get_children())
+        ejecutor.enviar_lotes(
+            self, query, parametros,
+            al_lote=self._actualizar_tabla,
+            al_error=self._mostrar_error,
+            clave=(id(self), '_cargar_datos'),
+            tamano_lote=self.TAMANO_LOTE
+        )
+
+    def _mostrar_error(self, error):
+        messagebox.showerror("Error", f"Error cargando datos: {str(error)}")
+
+    def _al_destruir(self, event):
+        if event.widget is self:
+            ejecutor.cancelar((id(self), '_cargar_datos'))
 
     def _ordenar_por_columna(self, columna):
         # Mapeo de columnas virtuales a campos reales
@@ -68,49 +109,34 @@ class PantallaMovimientos(ttk.Frame):
             self.sort_ascending = True
 
         self._cargar_datos()
-        self._aplicar_filtros()
 
     def _aplicar_filtros(self, event=None):
-        filtro = self.entrada_busqueda.get().strip().lower()
-        datos_filtrados = []
-        
-        for row in self.datos:
-            # Buscar en todos los campos relevantes
-            match = any(
-                filtro in str(value).lower()
-                for value in (
-                    row[0],  # ID
-                    row[1],  # Tipo
-                    row[2],  # Fecha
-                    abs(row[3]),  # Cantidad (valor absoluto)
-                    row[4],  # Producto
-                    row[5],  # Usuario
-                    row[6]   # Referencia
-                )
-            )
-            if match:
-                datos_filtrados.append(row)
-        
-        self._actualizar_tabla(datos_filtrados)
+        filtro = self.entrada_busqueda.get().strip()
+        if filtro == self.filtro:
+            return  # Teclas que no cambian el texto (flechas, Shift...)
+        self.filtro = filtro
+        self._cargar_datos()
 
-    def _actualizar_tabla(self, datos=None):
-        self.tabla.delete(*self.tabla.get_children())
-        for item in (datos or self.datos):
-            # Formatear cantidad con signo
-            cantidad = item[3]
-            cantidad_formateada = f"+{cantidad}" if cantidad > 0 else str(cantidad)
-            
-            # Crear nueva tupla con los valores formateados
-            valores = (
-                item[0],  # ID
-                item[1].capitalize(),  # Tipo
-                item[2],  # Fecha
-                cantidad_formateada,
-                item[4] or "N/A",  # Producto
-                item[5],  # Usuario
-                item[6]   # Referencia
-            )
-            self.tabla.insert("", tk.END, values=valores)
+    def _actualizar_tabla(self, lote):
+        """Agrega un lote de movimientos al final de la tabla"""
+        # Medido por separado para distinguir el costo del Treeview del SQL
+        with medir("PantallaMovimientos._actualizar_tabla"):
+            for item in lote:
+                # Formatear cantidad con signo
+                cantidad = item[3]
+                cantidad_formateada = f"+{cantidad}" if cantidad > 0 else str(cantidad)
+                
+                # Crear nueva tupla con los valores formateados
+                valores = (
+                    item[0],  # ID
+                    item[1].capitalize(),  # Tipo
+                    item[2],  # Fecha
+                    cantidad_formateada,
+                    item[4] or "N/A",  # Producto
+                    item[5],  # Usuario
+                    item[6]   # Referencia
+                )
+                self.tabla.insert("", tk.END, values=valores)
 
     def _crear_widgets(self):
         # Controles superiores
@@ -163,7 +189,6 @@ class PantallaMovimientos(ttk.Frame):
         self.sort_column = alias_map.get(columna, f"m.{columna}")
 
         self._cargar_datos()
-        self._aplicar_filtros()
 
     def _abrir_dialogo_nuevo(self):
         # Método pendiente: puedes abrir un diálogo para crear un nuevo movimiento
@@ -1,51 +1,267 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from db.db import obtener_datos, ejecutar_query, ejecutar_transaccion
+from db.db import obtener_datos, obtener_datos_cache
+from db.cache import cache, tablas_leidas
+from db.busqueda import buscar_productos
+from db.cambios import cambios_desde, ultimo_cambio
+from db.ejecutor import ejecutor
 from ui.styles import AppTheme
+from utils.indice_busqueda import IndiceBusqueda
+from servicios.ventas import CarritoVenta, StockInsuficiente, motor
 from datetime import datetime
 
+# Columnas de producto en el orden que espera CarritoVenta.agregar
+COLUMNAS_PRODUCTO = "p.id_producto, p.nombre, p.precio_venta, p.sku, p.codigo_barras, p.stock_actual"
+
+# Productos que aparecen en la búsqueda: activos y con stock
+PRODUCTOS_VENDIBLES = [("p.estado = 1 AND p.stock_actual > 0", ())]
+
+# Sugerencias visibles en la búsqueda de clientes
+MAX_SUGERENCIAS_CLIENTES = 8
+
+# Clientes de las últimas ventas cuyas direcciones se precargan en caché
+CLIENTES_PRECARGA = 20
+
+# Direcciones de un cliente (principal primero); usa idx_direcciones_cliente
+QUERY_DIRECCIONES = """
+    SELECT id_direccion, 
+           calle || ' ' || numero_domicilio || ', ' || colonia || ', ' || ciudad
+    FROM Direcciones
+    WHERE id_cliente = ?
+    ORDER BY principal DESC, id_direccion
+    """
+
+def precargar_direcciones(ids_clientes):
+    """
+    Cargar en la caché de consultas las direcciones de varios clientes con
+    una sola consulta, como si se hubiera ejecutado QUERY_DIRECCIONES para
+    cada uno.
+    """
+    ids_clientes = list(dict.fromkeys(ids_clientes))
+    if not ids_clientes:
+        return
+    generaciones = cache.generaciones(tablas_leidas(QUERY_DIRECCIONES))
+    filas = obtener_datos(f"""
+        SELECT id_cliente, id_direccion, 
+               calle || ' ' || numero_domicilio || ', ' || colonia || ', ' || ciudad
+        FROM Direcciones
+        WHERE id_cliente IN ({', '.join('?' for _ in ids_clientes)})
+        ORDER BY id_cliente, principal DESC, id_direccion
+        """, tuple(ids_clientes))
+    
+    por_cliente = {id_cliente: [] for id_cliente in ids_clientes}
+    for fila in filas:
+        por_cliente[fila[0]].append(tuple(fila[1:]))
+    for id_cliente, direcciones in por_cliente.items():
+        cache.guardar(QUERY_DIRECCIONES, (id_cliente,), direcciones, generaciones)
+
+class IndiceCodigos:
+    """
+    Productos activos por código de barras y por SKU para el lector de
+    códigos: cada lectura es una búsqueda en un diccionario, sin consultar
+    la base de datos en el hilo de Tk.
+
+    No distingue mayúsculas; el código de barras tiene prioridad sobre un
+    SKU igual de otro producto.
+    """
+
+    def __init__(self, productos=()):
+        """
+        Args:
+            productos (list): Filas con las columnas de COLUMNAS_PRODUCTO
+        """
+        self._por_codigo_barras = {}
+        self._por_sku = {}
+        self._codigos = {}  # id_producto -> (sku, codigo_barras) normalizados
+        for producto in productos:
+            self._agregar(producto)
+
+    @staticmethod
+    def _normalizar(codigo):
+        return str(codigo).strip().lower() if codigo else None
+
+    def _agregar(self, producto):
+        sku, codigo_barras = self._normalizar(producto[3]), self._normalizar(producto[4])
+        self._codigos[producto[0]] = (sku, codigo_barras)
+        if sku:
+            self._por_sku[sku] = producto
+        if codigo_barras:
+            self._por_codigo_barras[codigo_barras] = producto
+
+    def _quitar(self, id_producto):
+        sku, codigo_barras = self._codigos.pop(id_producto, (None, None))
+        for codigos, codigo in ((self._por_sku, sku), (self._por_codigo_barras, codigo_barras)):
+            # Sólo si la entrada sigue siendo de este producto
+            if codigo and codigos.get(codigo, (None,))[0] == id_producto:
+                del codigos[codigo]
+
+    def actualizar(self, ids_productos, productos):
+        """
+        Sustituye los productos que cambiaron.
+
+        Args:
+            ids_productos (iterable): Productos que cambiaron (incluye los
+                dados de baja o desactivados)
+            productos (list): Filas actuales de los que siguen activos
+        """
+        for id_producto in ids_productos:
+            self._quitar(id_producto)
+        for producto in productos:
+            self._agregar(producto)
+
+    def buscar(self, codigo):
+        """Fila del producto con ese código de barras o SKU, o None"""
+        codigo = self._normalizar(codigo)
+        if not codigo:
+            return None
+        return self._por_codigo_barras.get(codigo) or self._por_sku.get(codigo)
+
+def leer_productos_activos(ids_productos=None):
+    """
+    Productos activos con las columnas de COLUMNAS_PRODUCTO (todos, o sólo
+    los de esos ids).
+    """
+    if ids_productos is None:
+        return obtener_datos(f"SELECT {COLUMNAS_PRODUCTO} FROM Productos p WHERE p.estado = 1")
+    ids_productos = list(ids_productos)
+    if not ids_productos:
+        return []
+    return obtener_datos(
+        f"SELECT {COLUMNAS_PRODUCTO} FROM Productos p "
+        f"WHERE p.estado = 1 AND p.id_producto IN ({', '.join('?' for _ in ids_productos)})",
+        ids_productos
+    )
+
 class PantallaVentas(ttk.Frame):
+    # Cada cuánto se aplican al índice de códigos los cambios de productos
+    # (ventas, altas y ediciones de otras pantallas o terminales)
+    INTERVALO_SINCRONIZACION_MS = 2000
+
+    # Con más productos cambiados se vuelve a leer el catálogo completo
+    MAX_CAMBIOS_DELTA = 500
+
     def __init__(self, parent):
         super().__init__(parent)
         self.theme = AppTheme()
-        self.carrito = []
-        self.productos = []
+        self.carrito = CarritoVenta()  # Reglas de la venta (servicios/ventas.py)
         self.clientes = []
+        self.cliente_actual = None  # Fila de self.clientes elegida en la búsqueda
+        self.indice_clientes = IndiceBusqueda([], campos=())
         self.medios_pago = []
-        self.descuento_global = 0.0  # Descuento aplicado a toda la venta
+        self.productos_filtrados = []
+        self.codigos = IndiceCodigos()  # Lector de códigos (ver IndiceCodigos)
+        self.ultimo_cambio = None  # Último id de Cambios_productos aplicado a self.codigos
         
-        self._cargar_datos()
         self._crear_widgets()
         self._actualizar_totales()
-        self.productos_filtrados = []
+        self._cargar_datos()
+        self._id_sondeo = self.after(self.INTERVALO_SINCRONIZACION_MS, self._sondear)
+        self.bind("<Destroy>", self._al_destruir)
+
+    def _al_destruir(self, event):
+        if event.widget is not self:
+            return
+        if self._id_sondeo is not None:
+            self.after_cancel(self._id_sondeo)
+            self._id_sondeo = None
 
     def _cargar_datos(self):
-        """Cargar datos iniciales desde la base de datos"""
-        # Productos activos con stock
-        self.productos = obtener_datos("""
-            SELECT id_producto, nombre, precio_venta, sku, codigo_barras, stock_actual
-            FROM Productos WHERE estado = 1 AND stock_actual > 0
-            ORDER BY nombre
-            """)
+        """Solicitar datos iniciales en segundo plano"""
+        ejecutor.cancelar((id(self), '_sincronizar'))  # La carga ya incluye los cambios
+        ejecutor.enviar(
+            self, self._consultar_datos,
+            al_terminar=self._al_cargar_datos,
+            al_error=lambda e: messagebox.showerror("Error", f"Error cargando datos:\n{str(e)}"),
+            clave=(id(self), '_cargar_datos')
+        )
+
+    def _consultar_datos(self):
+        """Cargar datos iniciales desde la base de datos (hilo del ejecutor)"""
+        # Antes de leer: un cambio durante la lectura se vuelve a aplicar
+        # en la siguiente sincronización
+        ultimo = ultimo_cambio()
+        codigos = IndiceCodigos(leer_productos_activos())
         
         # Clientes activos con sus direcciones
-        self.clientes = obtener_datos("""
+        clientes = obtener_datos("""
             SELECT c.id_cliente, 
                    c.nombres || ' ' || COALESCE(c.apellido_p, '') || ' ' || COALESCE(c.apellido_m, ''),
                    c.rfc,
                    d.id_direccion,
-                   d.calle || ' ' || d.numero_domicilio || ', ' || d.colonia || ', ' || d.ciudad
+                   d.calle || ' ' || d.numero_domicilio || ', ' || d.colonia || ', ' || d.ciudad,
+                   c.telefono
             FROM Clientes c
             LEFT JOIN Direcciones d ON c.id_cliente = d.id_cliente AND d.principal = 1
             WHERE c.estado = 1
             """)
         
+        # Direcciones de los clientes recientes (suelen repetir); se leen las
+        # últimas ventas, no todo el historial
+        recientes = obtener_datos("""
+            SELECT id_cliente FROM Transacciones
+            WHERE id_cliente IS NOT NULL
+            ORDER BY id_transaccion DESC LIMIT ?
+            """, (CLIENTES_PRECARGA * 5,))
+        precargar_direcciones(list(dict.fromkeys(r[0] for r in recientes))[:CLIENTES_PRECARGA])
+        
         # Medios de pago configurados
-        self.medios_pago = obtener_datos("""
+        medios_pago = obtener_datos_cache("""
             SELECT id_medio_pago, clave_sat, nombre 
             FROM Medios_pago 
             ORDER BY id_medio_pago
             """)
+        # Búsqueda de clientes por nombre, RFC y teléfono
+        indice_clientes = IndiceBusqueda(clientes, campos=(1, 2, 5), limite=MAX_SUGERENCIAS_CLIENTES)
+        return clientes, indice_clientes, medios_pago, codigos, ultimo
+
+    def _al_cargar_datos(self, resultado):
+        """Llenar los controles con los datos recibidos del ejecutor"""
+        (self.clientes, self.indice_clientes, self.medios_pago,
+         self.codigos, self.ultimo_cambio) = resultado
+        self.combo_medios_pago['values'] = [f"{mp[2]} ({mp[1]})" for mp in self.medios_pago]
+        self._actualizar_lista_productos()
+
+    def _sincronizar(self):
+        """Aplica al índice de códigos los productos que cambiaron (db/cambios.py)"""
+        if self.ultimo_cambio is None:
+            return  # Aún no termina la primera carga
+        ejecutor.enviar(
+            self, self._consultar_cambios,
+            self.codigos, self.ultimo_cambio,
+            al_terminar=self._al_sincronizar,
+            # El siguiente sondeo lo vuelve a intentar
+            al_error=lambda e: None,
+            clave=(id(self), '_sincronizar')
+        )
+
+    def _consultar_cambios(self, codigos, desde):
+        """
+        Lee los productos cambiados después de `desde` (hilo del ejecutor).
+
+        Returns:
+            tuple: (codigos, ultimo, ids, filas, recarga): ids cambiados y
+                sus filas vigentes, o recarga con un IndiceCodigos nuevo si
+                hubo demasiados cambios
+        """
+        ultimo, cambios = cambios_desde(desde, self.MAX_CAMBIOS_DELTA)
+        if cambios is None:
+            return codigos, ultimo, (), [], IndiceCodigos(leer_productos_activos())
+        return codigos, ultimo, list(cambios), leer_productos_activos(cambios), None
+
+    def _al_sincronizar(self, resultado):
+        codigos, ultimo, ids, filas, recarga = resultado
+        if codigos is not self.codigos:
+            return  # Se recargó el catálogo mientras se consultaba
+        self.ultimo_cambio = ultimo
+        if recarga is not None:
+            self.codigos = recarga
+        else:
+            self.codigos.actualizar(ids, filas)
+
+    def _sondear(self):
+        """Sincroniza periódicamente el índice de códigos"""
+        self._sincronizar()
+        self._id_sondeo = self.after(self.INTERVALO_SINCRONIZACION_MS, self._sondear)
 
     def _crear_widgets(self):
         """Construir todos los componentes de la interfaz gráfica"""
@@ -76,6 +292,10 @@ class PantallaVentas(ttk.Frame):
         self.entrada_busqueda = ttk.Entry(search_frame)
         self.entrada_busqueda.grid(row=0, column=1, sticky=tk.EW, padx=5)
         self.entrada_busqueda.bind("<KeyRelease>", self._actualizar_lista_productos)
+        # Lector de códigos: "codigo" o "cantidad*codigo" seguido de Enter
+        self.entrada_busqueda.bind("<Return>", self._escanear_codigo)
+        self.entrada_busqueda.bind("<KP_Enter>", self._escanear_codigo)
+        self.entrada_busqueda.focus_set()
         
         # Lista de productos con scroll
         container = ttk.Frame(parent)
@@ -147,18 +367,31 @@ class PantallaVentas(ttk.Frame):
         cliente_frame = ttk.LabelFrame(parent, text="Datos del Cliente")
         cliente_frame.pack(fill=tk.X, pady=5)
         
+        # Búsqueda con sugerencias (nombre, RFC o teléfono)
         ttk.Label(cliente_frame, text="Cliente:").grid(row=0, column=0, sticky=tk.W)
-        self.combo_clientes = ttk.Combobox(
-            cliente_frame, 
-            state="readonly",
-            values=[c[1] for c in self.clientes]
+        self.entrada_cliente = ttk.Entry(cliente_frame)
+        self.entrada_cliente.grid(row=0, column=1, sticky=tk.EW, padx=5)
+        self.entrada_cliente.bind("<KeyRelease>", self._sugerir_clientes)
+        self.entrada_cliente.bind("<Return>", self._elegir_cliente)
+        self.entrada_cliente.bind("<Down>", self._enfocar_sugerencias)
+        self.entrada_cliente.bind("<Escape>", lambda e: self._ocultar_sugerencias())
+        
+        self.lista_clientes = tk.Listbox(
+            cliente_frame,
+            height=MAX_SUGERENCIAS_CLIENTES,
+            selectbackground=self.theme.colors['accent']
         )
-        self.combo_clientes.grid(row=0, column=1, sticky=tk.EW, padx=5)
-        self.combo_clientes.bind("<<ComboboxSelected>>", self._actualizar_direcciones)
-        
-        ttk.Label(cliente_frame, text="Dirección:").grid(row=1, column=0, sticky=tk.W)
+        self.lista_clientes.grid(row=1, column=1, sticky=tk.EW, padx=5)
+        self.lista_clientes.grid_remove()
+        self.lista_clientes.bind("<Return>", self._elegir_cliente)
+        self.lista_clientes.bind("<Double-Button-1>", self._elegir_cliente)
+        self.lista_clientes.bind("<Escape>", lambda e: self._ocultar_sugerencias())
+        self.clientes_sugeridos = []
+        
+        ttk.Label(cliente_frame, text="Dirección:").grid(row=2, column=0, sticky=tk.W)
         self.combo_direcciones = ttk.Combobox(cliente_frame, state="readonly")
-        self.combo_direcciones.grid(row=1, column=1, sticky=tk.EW, padx=5)
+        self.combo_direcciones.grid(row=2, column=1, sticky=tk.EW, padx=5)
+        cliente_frame.columnconfigure(1, weight=1)
         
         # Frame para pago
         pago_frame = ttk.LabelFrame(parent, text="Datos de Pago")
@@ -212,21 +445,54 @@ class PantallaVentas(ttk.Frame):
 
     def _actualizar_lista_productos(self, event=None):
         """Actualizar lista de productos según criterio de búsqueda"""
-        busqueda = self.entrada_busqueda.get().lower()
+        if event is not None and event.keysym in ("Return", "KP_Enter"):
+            return  # Lo atiende _escanear_codigo
+        # Búsqueda en el índice de texto completo (db/busqueda.py) en segundo
+        # plano; cada tecla cancela la búsqueda anterior
+        ejecutor.enviar(
+            self, buscar_productos,
+            self.entrada_busqueda.get(), COLUMNAS_PRODUCTO, PRODUCTOS_VENDIBLES,
+            al_terminar=self._mostrar_productos,
+            al_error=lambda e: messagebox.showerror("Error", f"Error buscando productos:\n{str(e)}"),
+            clave=(id(self), '_actualizar_lista_productos')
+        )
+
+    def _mostrar_productos(self, productos):
+        """Llenar la lista con los resultados de la búsqueda"""
+        self.productos_filtrados = productos
         self.lista_productos.delete(0, tk.END)
-        self.productos_filtrados = []
-        
-        for p in self.productos:
-            match = any([
-                busqueda in str(p[0]).lower(),
-                busqueda in p[1].lower(),
-                (p[3] and busqueda in p[3].lower()),
-                (p[4] and busqueda in p[4].lower())
-            ])
-            
-            if match and p[5] > 0:
-                self.lista_productos.insert(tk.END, f"{p[1]} - ${p[2]:.2f} | Stock: {p[5]}")
-                self.productos_filtrados.append(p)
+        self.lista_productos.insert(
+            tk.END, *(f"{p[1]} - ${p[2]:.2f} | Stock: {p[5]}" for p in self.productos_filtrados)
+        )
+
+    def _escanear_codigo(self, event=None):
+        """Agregar al carrito el producto cuyo código o sku se capturó"""
+        texto = self.entrada_busqueda.get().strip()
+        if not texto:
+            return "break"
+        
+        cantidad = 1
+        codigo = texto
+        if "*" in texto:
+            prefijo, codigo = texto.split("*", 1)
+            try:
+                cantidad = int(prefijo)
+            except ValueError:
+                cantidad = 0
+            if cantidad < 1:
+                messagebox.showwarning("Cantidad", f"Cantidad inválida: {prefijo}")
+                return "break"
+        
+        # Diccionario en memoria: no consulta la base en el hilo de Tk
+        producto = self.codigos.buscar(codigo)
+        if producto is None:
+            # No es un código: dejar el texto como búsqueda normal
+            self.bell()
+            return "break"
+        
+        if self._agregar_producto(producto, cantidad):
+            self.entrada_busqueda.delete(0, tk.END)
+        return "break"
 
     def _agregar_al_carrito(self, event):
         """Agregar producto seleccionado al carrito"""
@@ -234,63 +500,69 @@ class PantallaVentas(ttk.Frame):
         if not seleccion:
             return
         
-        producto_idx = seleccion[0]
-        producto = self.productos_filtrados[seleccion[0]]
-        
-        # Verificar stock
-        if producto[5] < 1:
-            messagebox.showwarning("Stock", "Producto sin stock disponible")
-            return
+        self._agregar_producto(self.productos_filtrados[seleccion[0]])
+
+    def _agregar_producto(self, producto, cantidad=1):
+        """
+        Agregar unidades de un producto al carrito validando el stock.
         
-        # Buscar si ya está en el carrito
-        for item in self.carrito:
-            if item["id_producto"] == producto[0]:
-                if (item["cantidad"] + 1) > producto[5]:
-                    messagebox.showwarning("Stock", "No hay suficiente stock")
-                    return
-                item["cantidad"] += 1
-                break
-        else:
-            self.carrito.append({
-                "id_producto": producto[0],
-                "nombre": producto[1],
-                "precio": producto[2],
-                "cantidad": 1,
-                "descuento": 0.0  # Descuento individual
-            })
+        Returns:
+            bool: True si se agregó
+        """
+        try:
+            self.carrito.agregar(producto, cantidad)
+        except StockInsuficiente as e:
+            messagebox.showwarning("Stock", str(e))
+            return False
         
-        self._actualizar_carrito()
+        self._actualizar_carrito(producto[0])
         self._actualizar_totales()
+        return True
 
-    def _actualizar_carrito(self):
-        """Actualizar visualización del carrito"""
-        self.tabla_carrito.delete(*self.tabla_carrito.get_children())
+    def _actualizar_carrito(self, id_producto=None):
+        """
+        Actualizar visualización del carrito.
+        
+        Args:
+            id_producto (int): Sólo refrescar (o quitar) la fila de ese
+                producto; sin él se refrescan todas, p. ej. al cambiar el
+                descuento global
+        """
+        if id_producto is not None:
+            item = self.carrito.articulos.get(id_producto)
+            if item is None:
+                if self.tabla_carrito.exists(id_producto):
+                    self.tabla_carrito.delete(id_producto)
+            else:
+                self._pintar_fila(item)
+            return
         
+        vigentes = {str(id_producto) for id_producto in self.carrito.articulos}
+        sobrantes = [iid for iid in self.tabla_carrito.get_children() if iid not in vigentes]
+        if sobrantes:
+            self.tabla_carrito.delete(*sobrantes)
         for item in self.carrito:
-            descuento_total = (item["precio"] * item["cantidad"] * 
-                             (self.descuento_global + item["descuento"]))
-            
-            subtotal = (item["precio"] * item["cantidad"]) - descuento_total
-            
-            self.tabla_carrito.insert("", tk.END, values=(
-                item["nombre"],
-                item["cantidad"],
-                f"${item['precio']:.2f}",
-                f"${descuento_total:.2f}",
-                f"${subtotal:.2f}"
-            ))
+            self._pintar_fila(item)
 
-    def _actualizar_totales(self):
-        """Calcular y mostrar totales actualizados"""
-        subtotal = sum(item["precio"] * item["cantidad"] for item in self.carrito)
-        descuento = sum(
-            (item["precio"] * item["cantidad"] * 
-             (self.descuento_global + item["descuento"])) 
-            for item in self.carrito
+    def _pintar_fila(self, item):
+        """Insertar o actualizar la fila del carrito de un artículo"""
+        descuento_total, subtotal = self.carrito.importes(item)
+        
+        valores = (
+            item["nombre"],
+            item["cantidad"],
+            f"${item['precio']:.2f}",
+            f"${descuento_total:.2f}",
+            f"${subtotal:.2f}"
         )
-        base_gravable = subtotal - descuento
-        iva = base_gravable * 0.16
-        total = base_gravable + iva
+        if self.tabla_carrito.exists(item["id_producto"]):
+            self.tabla_carrito.item(item["id_producto"], values=valores)
+        else:
+            self.tabla_carrito.insert("", tk.END, iid=item["id_producto"], values=valores)
+
+    def _actualizar_totales(self):
+        """Mostrar los totales del carrito"""
+        subtotal, descuento, iva, total = self.carrito.totales()
         
         self.subtotal_var.set(f"${subtotal:.2f}")
         self.descuento_var.set(f"${descuento:.2f}")
@@ -363,11 +635,8 @@ class PantallaVentas(ttk.Frame):
         """Aplicar descuento según selección"""
         try:
             valor = float(self.entrada_descuento.get())
-            if valor < 0 or valor > 100:
-                raise ValueError("El descuento debe ser entre 0 y 100%")
-                
             if self.tipo_descuento.get() == "global":
-                self.descuento_global = valor / 100
+                self.carrito.aplicar_descuento(valor)
             else:
                 selected_item = self.tabla_carrito.selection()
                 if not selected_item:
@@ -375,8 +644,12 @@ class PantallaVentas(ttk.Frame):
                                         "Seleccione un producto del carrito primero")
                     return
                     
-                item_idx = self.tabla_carrito.index(selected_item[0])
-                self.carrito[item_idx]["descuento"] = valor / 100
+                id_producto = int(selected_item[0])
+                self.carrito.aplicar_descuento(valor, id_producto)
+                self._actualizar_carrito(id_producto)
+                self._actualizar_totales()
+                dialogo.destroy()
+                return
                 
             self._actualizar_carrito()
             self._actualizar_totales()
@@ -385,20 +658,86 @@ class PantallaVentas(ttk.Frame):
         except ValueError as e:
             messagebox.showerror("Error", f"Valor inválido: {str(e)}")
 
+    def _sugerir_clientes(self, event=None):
+        """Mostrar los clientes que coinciden con lo escrito"""
+        if event is not None and event.keysym in ("Return", "KP_Enter", "Down", "Escape"):
+            return
+        texto = self.entrada_cliente.get()
+        if self.cliente_actual is not None and texto != self.cliente_actual[1]:
+            # Se editó el nombre: la selección anterior ya no aplica
+            self.cliente_actual = None
+            self.combo_direcciones.set("")
+            self.combo_direcciones["values"] = []
+        if not texto.strip() or self.cliente_actual is not None:
+            self._ocultar_sugerencias()
+            return
+        
+        self.clientes_sugeridos = self.indice_clientes.buscar(texto)
+        self.lista_clientes.delete(0, tk.END)
+        if not self.clientes_sugeridos:
+            self._ocultar_sugerencias()
+            return
+        self.lista_clientes.insert(
+            tk.END, *(f"{c[1]} | {c[2] or 'Sin RFC'}" for c in self.clientes_sugeridos)
+        )
+        self.lista_clientes.selection_set(0)
+        self.lista_clientes.grid()
+
+    def _enfocar_sugerencias(self, event=None):
+        """Pasar a la lista de sugerencias con la flecha abajo"""
+        if self.clientes_sugeridos and self.lista_clientes.winfo_ismapped():
+            self.lista_clientes.focus_set()
+            self.lista_clientes.activate(0)
+        return "break"
+
+    def _ocultar_sugerencias(self):
+        self.lista_clientes.grid_remove()
+
+    def _elegir_cliente(self, event=None):
+        """Tomar el cliente seleccionado (o el primero) de las sugerencias"""
+        if not self.clientes_sugeridos or not self.lista_clientes.winfo_ismapped():
+            return "break"
+        seleccion = self.lista_clientes.curselection()
+        self._seleccionar_cliente(self.clientes_sugeridos[seleccion[0] if seleccion else 0])
+        return "break"
+
+    def _seleccionar_cliente(self, cliente):
+        """Fijar el cliente de la venta (None para venta sin cliente)"""
+        self.cliente_actual = cliente
+        self.clientes_sugeridos = []
+        self._ocultar_sugerencias()
+        self.entrada_cliente.delete(0, tk.END)
+        self.combo_direcciones.set("")
+        self.combo_direcciones["values"] = []
+        if cliente is not None:
+            self.entrada_cliente.insert(0, cliente[1])
+            self.entrada_cliente.focus_set()
+            self._actualizar_direcciones()
+
     def _actualizar_direcciones(self, event=None):
         """Actualizar direcciones al seleccionar cliente"""
-        cliente_idx = self.combo_clientes.current()
-        if cliente_idx == -1:
+        if self.cliente_actual is None:
             return
         
-        id_cliente = self.clientes[cliente_idx][0]
-        direcciones = obtener_datos(f"""
-            SELECT id_direccion, 
-                   calle || ' ' || numero_domicilio || ', ' || colonia || ', ' || ciudad
-            FROM Direcciones
-            WHERE id_cliente = {id_cliente}
-            """)
-        
+        # Sin SQL si el cliente se precargó o ya se consultó (la caché se
+        # invalida al escribir en Direcciones); si no, se consulta en
+        # segundo plano
+        cliente = self.cliente_actual
+        direcciones = cache.obtener(QUERY_DIRECCIONES, (cliente[0],))
+        if direcciones is not None:
+            self._mostrar_direcciones(cliente, direcciones)
+            return
+        ejecutor.enviar(
+            self, obtener_datos_cache, QUERY_DIRECCIONES, (cliente[0],),
+            al_terminar=lambda direcciones: self._mostrar_direcciones(cliente, direcciones),
+            al_error=lambda e: messagebox.showerror("Error", f"Error cargando direcciones:\n{str(e)}"),
+            clave=(id(self), '_actualizar_direcciones')
+        )
+
+    def _mostrar_direcciones(self, cliente, direcciones):
+        """Llenar el combo con las direcciones del cliente elegido"""
+        if cliente is not self.cliente_actual:
+            return  # Se eligió otro cliente mientras se consultaba
         self.combo_direcciones["values"] = [d[1] for d in direcciones]
         if direcciones:
             self.combo_direcciones.current(0)
@@ -406,13 +745,12 @@ class PantallaVentas(ttk.Frame):
     def _validar_facturacion(self):
         """Validar requisitos para facturación"""
         if self.factura_var.get():
-            if self.combo_clientes.current() == -1:
+            if self.cliente_actual is None:
                 messagebox.showwarning("Facturación", "Se requiere cliente para facturar")
                 self.factura_var.set(False)
                 return
             
-            cliente_idx = self.combo_clientes.current()
-            if not self.clientes[cliente_idx][2]:  # Verificar RFC
+            if not self.cliente_actual[2]:  # Verificar RFC
                 messagebox.showwarning("Facturación", "El cliente no tiene RFC registrado")
                 self.factura_var.set(False)
 
@@ -422,188 +760,71 @@ class PantallaVentas(ttk.Frame):
             return
         
         try:
-            cliente_idx = self.combo_clientes.current()
-            medio_pago_idx = self.combo_medios_pago.current()
-            direccion_idx = self.combo_direcciones.current()
-            
-            # Preparar todas las queries
-            queries = []
-            
-            # 1. Transacción principal
-            queries.append((
-                """
-                INSERT INTO Transacciones (
-                    tipo, fecha, id_cliente, id_medio_pago,
-                    subtotal, impuestos, total, moneda, estado
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    "venta",
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    self.clientes[cliente_idx][0] if cliente_idx >=0 else None,
-                    self.medios_pago[medio_pago_idx][0],
-                    float(self.subtotal_var.get()[1:]),
-                    float(self.iva_var.get()[1:]),
-                    float(self.total_var.get()[1:]),
-                    "MXN",
-                    "completada"
-                )
-            ))
-            
-            # 2. Detalles y movimientos
-            for item in self.carrito:
-                descuento_total = (item["precio"] * item["cantidad"] * 
-                                (self.descuento_global + item["descuento"]))
-                
-                # Detalle transacción
-                queries.append((
-                    """
-                    INSERT INTO Detalle_transaccion (
-                        id_transaccion, id_producto, cantidad,
-                        precio_unitario, descuento, iva_aplicado
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        None,  # Se reemplazará con lastrowid
-                        item["id_producto"],
-                        item["cantidad"],
-                        item["precio"],
-                        descuento_total,
-                        (item["precio"] * item["cantidad"] - descuento_total) * 0.16
-                    )
-                ))
-                
-                # Actualizar stock
-                queries.append((
-                    """
-                    UPDATE Productos 
-                    SET stock_actual = stock_actual - ? 
-                    WHERE id_producto = ?
-                    """,
-                    (item["cantidad"], item["id_producto"])
-                ))
-                
-                # Movimiento de inventario
-                queries.append((
-                    """
-                    INSERT INTO Movimientos (
-                        tipo, fecha, cantidad, id_producto, referencia
-                    ) VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (
-                        "salida",
-                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        -item["cantidad"],
-                        item["id_producto"],
-                        f"Venta {None}"  # Se actualizará después
-                    )
-                ))
-            
-            # 3. Ejecutar todas las queries en transacción
-            id_transaccion = ejecutar_transaccion(queries)
-            
-            # 4. Actualizar referencias dependientes del ID de transacción
-            self._actualizar_referencias(id_transaccion)
-            
-            # 5. Facturación (si aplica)
-            if self.factura_var.get():
-                self._generar_factura(id_transaccion, cliente_idx, direccion_idx)            
+            cliente = self.cliente_actual
+            # Directo a la base de datos o al servicio local (VENTAS_SERVIDOR);
+            # la factura se registra en la misma transacción y su PDF se
+            # genera en segundo plano
+            id_transaccion = motor.registrar(
+                self.carrito,
+                id_medio_pago=self.medios_pago[self.combo_medios_pago.current()][0],
+                id_cliente=cliente[0] if cliente is not None else None,
+                factura=self._datos_factura(cliente) if self.factura_var.get() else None
+            )
             
             messagebox.showinfo("Éxito", f"Venta #{id_transaccion} procesada")
             self._limpiar_venta()
             
+        except StockInsuficiente as e:
+            # La venta completa se revirtió; el carrito se conserva para ajustarlo
+            self._reportar_stock_insuficiente(e.articulos)
         except Exception as e:
             messagebox.showerror("Error", f"Error al procesar venta:\n{str(e)}")
 
-    def _actualizar_referencias(self, id_transaccion):
-        """Actualiza referencias que dependen del ID de transacción"""
-        queries = []
-        for i, item in enumerate(self.carrito, start=1):
-            # Actualizar referencia en Movimientos
-            queries.append((
-                """
-                UPDATE Movimientos 
-                SET referencia = ? 
-                WHERE referencia = 'Venta None' 
-                AND id_producto = ?
-                """,
-                (f"Venta {id_transaccion}", item["id_producto"])
-            ))
-        ejecutar_transaccion(queries)
-
-    def _generar_factura(self, id_transaccion, cliente_idx, direccion_idx):
-        """Generar registro de factura en la base de datos"""
-        try:
-            cliente = self.clientes[cliente_idx]
-            direccion = self.combo_direcciones.get()
-            
-            # Obtener datos necesarios para la factura
-            datos_factura = {
-                "id_transaccion": id_transaccion,
-                "id_direccion_fiscal": cliente[3],  # ID de dirección principal
-                "serie": "FAC",  # Serie fija (puede personalizarse)
-                "folio": f"FAC-{id_transaccion:04d}",  # Folio secuencial
-                "fecha_emision": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
-                "lugar_expedicion": direccion.split(",")[-1].strip(),  # Ciudad de la dirección
-                "forma_pago": "Pago en una sola exhibición",
-                "metodo_pago": self.medios_pago[self.combo_medios_pago.current()][1],  # Clave SAT
-                "uso_cfdi": "G03",  # Uso genérico
-                "nombre_cliente": cliente[1],  # Nombre completo
-                "rfc_cliente": cliente[2],  # RFC del cliente
-                "subtotal": float(self.subtotal_var.get()[1:]),
-                "iva": float(self.iva_var.get()[1:]),
-                "total": float(self.total_var.get()[1:]),
-                "estado": "generada"
-            }
-            
-            # Insertar factura en la base de datos
-            ejecutar_query(
-                """
-                INSERT INTO Facturas (
-                    id_transaccion, id_direccion_fiscal, serie, folio,
-                    fecha_emision, lugar_expedicion, forma_pago, metodo_pago,
-                    uso_cfdi, nombre_cliente, rfc_cliente, subtotal, iva, total, estado
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                tuple(datos_factura.values())
-            )
-            
-            # Generar PDF básico (opcional)
-            self._generar_pdf_factura(datos_factura)
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al generar factura:\n{str(e)}")
+    def _reportar_stock_insuficiente(self, articulos):
+        """Mostrar, por artículo, lo solicitado contra el stock actual"""
+        ids = [item["id_producto"] for item in articulos]
+        ejecutor.enviar(
+            self, obtener_datos,
+            f"SELECT id_producto, stock_actual FROM Productos "
+            f"WHERE id_producto IN ({', '.join('?' for _ in ids)})",
+            tuple(ids),
+            al_terminar=lambda filas: self._mostrar_stock_insuficiente(articulos, dict(filas)),
+            # El reporte se muestra aunque no se pueda leer el stock
+            al_error=lambda e: self._mostrar_stock_insuficiente(articulos, {}),
+            clave=(id(self), '_reportar_stock_insuficiente')
+        )
 
-    def _generar_pdf_factura(self, datos):
-        """Generar PDF básico de la factura (esqueleto)"""
-        try:
-            from fpdf import FPDF
-            
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            
-            # Cabecera
-            pdf.cell(200, 10, txt=f"Factura {datos['serie']}-{datos['folio']}", ln=1, align='C')
-            pdf.cell(200, 10, txt=f"Fecha: {datos['fecha_emision']}", ln=1)
-            
-            # Datos del cliente
-            pdf.cell(200, 10, txt=f"Cliente: {datos['nombre_cliente']}", ln=1)
-            pdf.cell(200, 10, txt=f"RFC: {datos['rfc_cliente']}", ln=1)
-            
-            # Totales
-            pdf.cell(200, 10, txt=f"Subtotal: ${datos['subtotal']:.2f}", ln=1)
-            pdf.cell(200, 10, txt=f"IVA: ${datos['iva']:.2f}", ln=1)
-            pdf.cell(200, 10, txt=f"Total: ${datos['total']:.2f}", ln=1)
-            
-            # Guardar PDF
-            nombre_archivo = f"factura_{datos['folio']}.pdf"
-            pdf.output(nombre_archivo)
-            
-        except ImportError:
-            print("FPDF2 no está instalado. Instala con: pip install fpdf2")
-        except Exception as e:
-            print(f"Error al generar PDF: {str(e)}")
+    def _mostrar_stock_insuficiente(self, articulos, disponibles):
+        lineas = [
+            f"- {item['nombre']}: solicitado {item['cantidad']}, "
+            f"disponible {disponibles.get(item['id_producto'], '?')}"
+            for item in articulos
+        ]
+        messagebox.showwarning(
+            "Stock insuficiente",
+            "La venta no se registró porque otra terminal vendió primero:\n"
+            + "\n".join(lineas)
+            + "\n\nAjuste las cantidades y vuelva a cobrar."
+        )
+        self._actualizar_lista_productos()  # Refrescar el stock de la lista de productos
+
+    def _datos_factura(self, cliente):
+        """Datos de la factura de la venta en curso (ver servicios.facturacion)"""
+        direccion = self.combo_direcciones.get()
+        
+        # id_transaccion, folio e importes se asignan al registrar la venta
+        return {
+            "id_direccion_fiscal": cliente[3],  # ID de dirección principal
+            "serie": "FAC",  # Serie fija (puede personalizarse)
+            "fecha_emision": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "lugar_expedicion": direccion.split(",")[-1].strip(),  # Ciudad de la dirección
+            "forma_pago": "Pago en una sola exhibición",
+            "metodo_pago": self.medios_pago[self.combo_medios_pago.current()][1],  # Clave SAT
+            "uso_cfdi": "G03",  # Uso genérico
+            "nombre_cliente": cliente[1],  # Nombre completo
+            "rfc_cliente": cliente[2],  # RFC del cliente
+            "estado": "pendiente"  # Pasa a 'generada' al guardar el PDF
+        }
 
     def _validar_venta(self):
         """Validar datos requeridos antes de procesar"""
@@ -626,17 +847,15 @@ class PantallaVentas(ttk.Frame):
         if not seleccion:
             return
         
-        item_idx = self.tabla_carrito.index(seleccion[0])
-        del self.carrito[item_idx]
-        self._actualizar_carrito()
+        id_producto = int(seleccion[0])
+        self.carrito.quitar(id_producto)
+        self._actualizar_carrito(id_producto)
         self._actualizar_totales()
 
     def _limpiar_venta(self):
         """Restablecer interfaz para nueva venta"""
-        self.carrito.clear()
-        self.descuento_global = 0.0
-        self.combo_clientes.set("")
-        self.combo_direcciones.set("")
+        self.carrito.limpiar()
+        self._seleccionar_cliente(None)
         self.combo_medios_pago.set("")
         self.factura_var.set(False)
         self._actualizar_carrito()
@@ -4,6 +4,8 @@ from tkinter import ttk
 from datetime import datetime
 from tkinter import messagebox
 from db.db import obtener_datos, ejecutar_query
+from db.ejecutor import ejecutor
+from db.instrumentacion import medir
 from ui.styles import AppTheme
 
 class PantallaTransacciones(ttk.Frame):
@@ -21,10 +23,12 @@ class PantallaTransacciones(ttk.Frame):
         ]
     }
 
+    # Filas que se insertan en el Treeview por cada ciclo de la interfaz
+    TAMANO_LOTE = 500
+
     def __init__(self, parent):
         super().__init__(parent)
         self.theme = AppTheme()
-        self.datos = []
         self.filtros = {
             'tipo': 'Todos',
             'estado': 'Todos',
@@ -34,6 +38,7 @@ class PantallaTransacciones(ttk.Frame):
         
         self._inicializar_ui()
         self._cargar_datos()
+        self.bind("<Destroy>", self._al_destruir)
 
     def _inicializar_ui(self):
         self._crear_controles_filtro()
@@ -162,12 +167,26 @@ class PantallaTransacciones(ttk.Frame):
             if self.filtros['fecha_fin']:
                 parametros.append(self.filtros['fecha_fin'])
                 
-            self.datos = obtener_datos(query, parametros)
-            self._actualizar_tabla()
+            # Reemplaza (y cancela) cualquier carga anterior de esta pantalla
+            self.tabla.delete(*self.tabla.get_children())
+            ejecutor.enviar_lotes(
+                self, query, parametros,
+                al_lote=self._actualizar_tabla,
+                al_error=self._mostrar_error,
+                clave=(id(self), '_cargar_datos'),
+                tamano_lote=self.TAMANO_LOTE
+            )
             
         except Exception as e:
             messagebox.showerror("Error", f"Error cargando datos: {str(e)}")
 
+    def _mostrar_error(self, error):
+        messagebox.showerror("Error", f"Error cargando datos: {str(error)}")
+
+    def _al_destruir(self, event):
+        if event.widget is self:
+            ejecutor.cancelar((id(self), '_cargar_datos'))
+
     def _construir_where(self):
         condiciones = []
         if self.filtros['tipo'] != 'Todos':
@@ -181,20 +200,21 @@ class PantallaTransacciones(ttk.Frame):
             
         return "WHERE " + " AND ".join(condiciones) if condiciones else ""
 
-    def _actualizar_tabla(self):
-        self.tabla.delete(*self.tabla.get_children())
-        for transaccion in self.datos:
-            self.tabla.insert("", tk.END, values=(
-                transaccion[0],  # ID
-                transaccion[1],  # Fecha
-                transaccion[2].capitalize(),  # Tipo
-                transaccion[3],  # Cliente
-                transaccion[4],  # Medio pago
-                f"${transaccion[5]:.2f}",  # Subtotal
-                f"${transaccion[6]:.2f}",  # Impuestos
-                f"${transaccion[7]:.2f}",  # Total
-                transaccion[8].capitalize()  # Estado
-            ), tags=(transaccion[8],))  # Tag para colorear por estado
+    def _actualizar_tabla(self, lote):
+        """Agrega un lote de transacciones al final de la tabla"""
+        with medir("PantallaTransacciones._actualizar_tabla"):
+            for transaccion in lote:
+                self.tabla.insert("", tk.END, values=(
+                    transaccion[0],  # ID
+                    transaccion[1],  # Fecha
+                    transaccion[2].capitalize(),  # Tipo
+                    transaccion[3],  # Cliente
+                    transaccion[4],  # Medio pago
+                    f"${transaccion[5]:.2f}",  # Subtotal
+                    f"${transaccion[6]:.2f}",  # Impuestos
+                    f"${transaccion[7]:.2f}",  # Total
+                    transaccion[8].capitalize()  # Estado
+                ), tags=(transaccion[8],))  # Tag para colorear por estado
 
     def _aplicar_filtros(self, event=None):
         self.filtros.update({
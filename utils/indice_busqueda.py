@@ -0,0 +1,176 @@
+"""
+Índice de búsqueda en memoria por trigramas.
+
+Se construye una sola vez a partir de una lista de registros (tuplas o
+sqlite3.Row) y responde búsquedas por subcadena sin recorrer todo el
+catálogo: cada término de 3 o más caracteres toma como candidatos la lista
+de registros de su trigrama menos frecuente y sólo esos se verifican. Un
+mapa de prefijos de palabra (hasta 3 caracteres) resuelve los términos
+cortos y permite entregar primero las coincidencias al inicio de palabra.
+Cada etapa se detiene al llegar al límite de resultados.
+
+La comparación ignora mayúsculas y acentos ("cafe" encuentra "Café").
+
+Ejemplo:
+    indice = IndiceBusqueda(productos, campos=(0, 1, 3, 4))
+    resultados = indice.buscar("cafe 500")
+"""
+
+import unicodedata
+from itertools import islice
+
+# Máximo de resultados que devuelve una búsqueda
+MAX_RESULTADOS = 100
+
+# Separador entre campos del texto indexado (no aparece en los datos)
+_SEPARADOR = "\x1f"
+
+
+def normalizar(texto):
+    """
+    Convierte un texto a minúsculas y sin acentos.
+
+    Args:
+        texto: Valor a normalizar (se convierte a str; None -> "")
+
+    Returns:
+        str: Texto normalizado
+    """
+    if texto is None:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+class IndiceBusqueda:
+    """
+    Índice de subcadenas con resultados ordenados por relevancia.
+
+    El orden es: coincidencia exacta con un campo completo, luego términos
+    que empiezan palabra y al final coincidencias en medio de una palabra.
+    Dentro de cada grupo se conserva el orden original de los registros.
+
+    Atributos:
+        registros (list): Registros indexados
+        limite (int): Máximo de resultados por búsqueda
+    """
+
+    def __init__(self, registros, campos, limite=None):
+        """
+        Args:
+            registros (list): Tuplas o filas a indexar
+            campos (tuple): Posiciones de los campos de texto a indexar
+            limite (int): Máximo de resultados (MAX_RESULTADOS por defecto)
+        """
+        self.registros = list(registros)
+        self.limite = limite or MAX_RESULTADOS
+        self._textos = []
+        self._trigramas = {}
+        self._prefijos = {}
+        self._exactos = {}
+
+        for i, registro in enumerate(self.registros):
+            valores = [normalizar(registro[c]) for c in campos]
+            texto = _SEPARADOR + _SEPARADOR.join(valores)
+            self._textos.append(texto)
+
+            trigramas = set()
+            prefijos = set()
+            for valor in valores:
+                if not valor:
+                    continue
+                self._exactos.setdefault(valor, []).append(i)
+                for palabra in valor.split():
+                    prefijos.update((palabra[:1], palabra[:2], palabra[:3]))
+                for j in range(len(valor) - 2):
+                    trigramas.add(valor[j:j + 3])
+
+            for trigrama in trigramas:
+                self._trigramas.setdefault(trigrama, []).append(i)
+            for prefijo in prefijos:
+                self._prefijos.setdefault(prefijo, []).append(i)
+
+    def __len__(self):
+        return len(self.registros)
+
+    def _candidatos(self, termino):
+        """
+        Listas (ordenadas) de registros que pueden contener el término.
+
+        Returns:
+            tuple: (candidatos al inicio de palabra, candidatos en cualquier
+                parte); la segunda es la lista del trigrama menos frecuente
+        """
+        prefijo = self._prefijos.get(termino[:3], [])
+        if len(termino) < 3:
+            return prefijo, prefijo
+        menor = None
+        for j in range(len(termino) - 2):
+            lista = self._trigramas.get(termino[j:j + 3])
+            if lista is None:
+                return [], []
+            if menor is None or len(lista) < len(menor):
+                menor = lista
+        return min(prefijo, menor, key=len), menor
+
+    def _recorrer(self, candidatos, coincide, vistos, filtro, resultados, limite):
+        """Agrega a resultados los candidatos que cumplen hasta llegar al límite"""
+        for i in candidatos:
+            if len(resultados) >= limite:
+                return
+            if i in vistos or not coincide(self._textos[i]):
+                continue
+            registro = self.registros[i]
+            if filtro is None or filtro(registro):
+                vistos.add(i)
+                resultados.append(registro)
+
+    def buscar(self, texto, limite=None, filtro=None):
+        """
+        Busca registros que contengan todos los términos del texto.
+
+        Los términos de menos de 3 caracteres sólo coinciden al inicio de
+        una palabra.
+
+        Args:
+            texto (str): Términos separados por espacios
+            limite (int): Máximo de resultados (por defecto self.limite)
+            filtro (function): Predicado opcional sobre cada registro
+
+        Returns:
+            list: Registros ordenados por relevancia
+        """
+        limite = limite or self.limite
+        consulta = normalizar(texto).strip()
+        if not consulta:
+            return list(islice(
+                (r for r in self.registros if filtro is None or filtro(r)), limite
+            ))
+
+        terminos = consulta.split()
+        inicios = [(_SEPARADOR + t, " " + t) for t in terminos]
+
+        def al_inicio(texto_registro):
+            return all(a in texto_registro or b in texto_registro for a, b in inicios)
+
+        def en_cualquier_parte(texto_registro):
+            for termino, (a, b) in zip(terminos, inicios):
+                if a in texto_registro or b in texto_registro:
+                    continue
+                if len(termino) < 3 or termino not in texto_registro:
+                    return False
+            return True
+
+        vistos = set()
+        resultados = []
+        # 1. Campo completo igual a la consulta
+        self._recorrer(self._exactos.get(consulta, []), lambda _: True,
+                       vistos, filtro, resultados, limite)
+        candidatos = [self._candidatos(t) for t in terminos]
+        # 2. Todos los términos al inicio de una palabra
+        self._recorrer(min((c[0] for c in candidatos), key=len), al_inicio,
+                       vistos, filtro, resultados, limite)
+        # 3. Coincidencias dentro de una palabra
+        if len(resultados) < limite:
+            self._recorrer(min((c[1] for c in candidatos), key=len), en_cualquier_parte, vistos, filtro, resultados, limite)
+        return resultados